@@ -25,6 +25,15 @@ class ALU(object):
         OpCode.MUL: lambda x, y: x * y,
         OpCode.SUB: lambda x, y: x - y,
         OpCode.DIV: lambda x, y: x // y,
+        OpCode.AND: lambda x, y: x & y,
+        OpCode.OR: lambda x, y: x | y,
+        OpCode.XOR: lambda x, y: x ^ y,
+        # Like most hardware, shifts use only the low 5 bits
+        # of the count, so a shift is never more than 31 bits
+        OpCode.SHL: lambda x, y: x << (y & 31),
+        OpCode.SHR: lambda x, y: x >> (y & 31),
+        # The CPU does not store the result of a comparison
+        OpCode.CMP: lambda x, y: x - y,
         # For memory access operations load, store, the ALU
         # performs the address calculation
         OpCode.LOAD: lambda x, y: x + y,
@@ -24,7 +24,9 @@ not zero".  If /predicate is not given, it is interpreted
 as /ALWAYS, which is an alias for /NZP.
 target is a register number (r0,r1, ... r15) or one of the
 register aliases ZERO, PC, SP, etc.
-src1 and src2 are likewise register specifiers.
+src1 and src2 are likewise register specifiers.  For LOAD
+and STORE, src1 may be followed by + (e.g., LOAD r1,r2+,r0) to
+add one to it after the memory access.
 [disp] is optional.  If present, it is a 12 bit
 signed integer displacement.  If absent, it is
 treated as [0].
@@ -72,7 +74,7 @@ class SyntaxError(Exception):
 # To simplify client code, we'd like to return a dict with
 # the right fields even if the line is syntactically incorrect.
 DICT_NO_MATCH = { 'label': None, 'opcode': None, 'predicate': None,
-                      'target': None, 'src1': None, 'src2': None,
+                      'target': None, 'src1': None, 'increment': None, 'src2': None,
                       'offset': None, 'comment': None }
 
 
@@ -127,7 +129,8 @@ ASM_FULL_PAT = re.compile(r"""
     (/ (?P<predicate> [a-zA-Z]+) )?   # Predicate (optional)
     \s+
     (?P<target>    r[0-9]+),            # Target register
-    (?P<src1>      r[0-9]+),            # Source register 1
+    (?P<src1>      r[0-9]+)             # Source register 1
+    (?P<increment> \+)?,                # Post-increment (optional)
     (?P<src2>      r[0-9]+)             # Source register 2
     (\[ (?P<offset>[-]?[0-9]+) \])?     # Offset (optional)
    # Optional comment follows # or ; 
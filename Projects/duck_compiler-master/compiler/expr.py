@@ -52,6 +52,15 @@ class Expr(object):
         raise NotImplementedError(
             "No gen method has been defined for class {}".format(type(self)))
 
+    def gen_test(self, context: Context, target: str):
+        """Code generation for a condition:  like gen, but also
+        sets the condition code from the value, so the caller can
+        follow it with JUMP/Z.  Expressions whose last instruction
+        already does that override this to skip the comparison.
+        """
+        self.gen(context, target)
+        context.add_line("\tCMP  {},r0".format(target))
+
 
 class Const(Expr):
     """An expression that is just a constant value, like 5"""
@@ -196,9 +205,8 @@ class While(Control):
         loop_exit = context.new_label("endloop")
         context.add_line("{}:  #While loop".format(loop_head))
         reg = context.alloc_reg()
-        self.cond.gen(context, target=reg)
+        self.cond.gen_test(context, target=reg)
         # Is it zero?
-        context.add_line("\tSUB  r0,{},r0 ".format(reg))
         context.add_line("\tJUMP/Z {}".format(loop_exit))
         context.free_reg(reg)
         self.expr.gen(context, target)
@@ -284,11 +292,10 @@ class If(Control):
         elsepart = context.new_label("else")
         fi = context.new_label("end else")
         reg = context.alloc_reg()
-        self.cond.gen(context, target=reg)          # generate condition
+        self.cond.gen_test(context, target=reg)     # generate condition
 
         # If part
         # Is it zero?
-        context.add_line("\tSUB  r0,{},r0 ".format(reg))
         context.add_line("\tJUMP/Z {}".format(elsepart))
         self.thenpart.gen(context, target)          # generate then part
         context.add_line("JUMP {}".format(fi))
@@ -401,6 +408,12 @@ class BinOp(Expr):
         context.add_line("\t{} {},{},{}".format(self._opcode(), target, target, reg))
         context.free_reg(reg)                       # free the register
 
+    def gen_test(self, context: Context, target: str):
+        """The operation sets the condition code from its result,
+        so a test needs no comparison
+        """
+        self.gen(context, target)
+
 
     def _opcode(self):
         """Each operation that inherits gen must provide the opcode
@@ -465,6 +478,22 @@ class Times(BinOp):
     def _opcode(self):
         return "MUL"
 
+    def gen(self, context: Context, target: str):
+        """Multiplying by a power of two is shifting left,
+        with the shift count in the instruction rather than
+        a constant loaded from memory.
+        """
+        shift = shift_count(self.right)
+        if shift is not None:
+            self.left.gen(context, target)
+        else:
+            shift = shift_count(self.left)
+            if shift is None:
+                super().gen(context, target)
+                return
+            self.right.gen(context, target)
+        context.add_line("\tSHL  {},{},r0[{}]  # * {}".format(target, target, shift, 2 ** shift))
+
 
 class Div(BinOp):
     """Truncating division of two numeric values.
@@ -485,6 +514,32 @@ class Div(BinOp):
     def _opcode(self):
         return "DIV"
 
+    def gen(self, context: Context, target: str):
+        """Dividing by a power of two is an arithmetic shift
+        right, which rounds down just as DIV does.
+        """
+        shift = shift_count(self.right)
+        if shift is None:
+            super().gen(context, target)
+            return
+        self.left.gen(context, target)
+        context.add_line("\tSHR  {},{},r0[{}]  # / {}".format(target, target, shift, 2 ** shift))
+
+    # Division by zero sets V, not Z, so compare the result
+    gen_test = Expr.gen_test
+
+
+def shift_count(exp: Expr):
+    """k if exp is the constant 2^k (for k up to 31, the
+    longest shift), otherwise None
+    """
+    if not isinstance(exp, Const) or not isinstance(exp.val, int):
+        return None
+    value = exp.val
+    if value <= 0 or value & (value - 1) or value.bit_length() > 32:
+        return None
+    return value.bit_length() - 1
+
 
 class UnOp(Expr):
     """Abstract superclass for unary expressions like negation"""
@@ -538,3 +593,7 @@ class Neg(UnOp):
         self.left.gen(context, target)
         context.add_line("\tSUB  {},r0,{}".format(target, target))
         return
+
+    def gen_test(self, context: Context, target: str):
+        """The subtraction sets the condition code"""
+        self.gen(context, target)
@@ -7,6 +7,7 @@ Tests for expr.py,
 import unittest
 from compiler import expr
 from compiler.env import Env
+from compiler.codegen_context import Context
 
 
 class TestExpr(unittest.TestCase):
@@ -86,5 +87,40 @@ class TestExpr(unittest.TestCase):
         self.assertEqual(result, expr.Const(13))
 
 
+class TestGen(unittest.TestCase):
+    """Code generation uses the shift and compare instructions"""
+
+    def gen(self, exp: expr.Expr) -> list:
+        context = Context()
+        target = context.alloc_reg()
+        exp.gen(context, target)
+        return [line.split("#")[0].split() for line in context.assm_lines]
+
+    def test_shifts(self):
+        x = expr.Var('x')
+        self.assertEqual(self.gen(expr.Times(x, expr.Const(8)))[-1],
+                         ["SHL", "r1,r1,r0[3]"])
+        self.assertEqual(self.gen(expr.Times(expr.Const(1), x))[-1],
+                         ["SHL", "r1,r1,r0[0]"])
+        self.assertEqual(self.gen(expr.Div(x, expr.Const(4)))[-1],
+                         ["SHR", "r1,r1,r0[2]"])
+        self.assertEqual(self.gen(expr.Times(x, expr.Const(6)))[-1],
+                         ["MUL", "r1,r1,r2"])
+        self.assertEqual(self.gen(expr.Div(expr.Const(4), x))[-1],
+                         ["DIV", "r1,r1,r2"])
+
+    def test_conditions(self):
+        """A test compares only when the condition code is not
+        already set from the condition's value
+        """
+        x = expr.Var('x')
+        loop = self.gen(expr.While(x, expr.Pass()))
+        self.assertIn(["CMP", "r2,r0"], loop)
+        loop = self.gen(expr.While(expr.Minus(x, expr.Const(1)), expr.Pass()))
+        self.assertNotIn("CMP", [line[0] for line in loop if line])
+        loop = self.gen(expr.While(expr.Div(x, x), expr.Pass()))
+        self.assertIn(["CMP", "r2,r0"], loop)
+
+
 if __name__ == '__main__':
     unittest.main()
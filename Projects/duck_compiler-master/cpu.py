@@ -80,11 +80,19 @@ class CPU(MVCListenable):
             # Load and store are special
             if opcode == OpCode.LOAD:
                 memval = self.memory.get(result)
+                if instr.increment:
+                    # If src1 is also the target, the loaded value wins
+                    self.registers[instr.reg_src1].put(left + 1)
                 target.put(memval)
             elif opcode == OpCode.STORE:
                 self.memory.put(result,target.get())
+                if instr.increment:
+                    self.registers[instr.reg_src1].put(left + 1)
             elif opcode == OpCode.HALT:
                 self.halted = True
+            elif opcode == OpCode.CMP:
+                # Only the condition code changes
+                pass
             else:
                 target.put(result)
         else:
@@ -8,6 +8,12 @@ with the following fields (from high-order to low-order bits).
 All are unsigned except offset, which is a signed value in 
 range -2^11 to 2^11 - 1. 
 
+The reserved high-order bit selects post-increment addressing
+for LOAD and STORE:  after the memory access, src1 is increased
+by one, so a loop can step through an array with no separate
+ADD.  It is written LOAD r1,r2+,r0 in assembly code.  Other
+operations ignore it.
+
 See docs/duck_machine.md for details. 
 """
 
@@ -28,8 +34,9 @@ offset_field = BitField(0, 9)
 # other parts of the CPU.  Only the ALU is modeled in the
 # bitfields project.  The CPU is introduced the following
 # week.
-# ADD, SUB, MUL, DIV, SHL, SHR are ALU-only operations
+# ADD, SUB, MUL, DIV, AND, OR, XOR, SHL, SHR are ALU-only operations
 # HALT, LOAD, STORE involve other parts of the CPU
+# CMP is SUB without storing the result:  it only sets the condition code
 
 class OpCode(Enum):
     """The operation codes specify what the CPU and ALU should do."""
@@ -42,6 +49,12 @@ class OpCode(Enum):
     SUB = 5  # Subtraction
     MUL = 6  # Multiplication
     DIV = 7  # Integer division (like // in Python)
+    AND = 8  # Bitwise and (two's complement, like & in Python)
+    OR = 9   # Bitwise or
+    XOR = 10  # Bitwise exclusive or
+    SHL = 11  # Shift left by 0..31 bits (the low 5 bits of the count)
+    SHR = 12  # Arithmetic shift right (like >> in Python), 0..31 bits
+    CMP = 13  # Compare:  set the condition code from src1 - src2
 
 
 class CondFlag(Flag):
@@ -100,7 +113,8 @@ class Instruction(object):
     def __init__(self, op: OpCode, cond: CondFlag,
                  reg_target: int, reg_src1: int,
                  reg_src2: int,
-                 offset: int):
+                 offset: int,
+                 increment: bool = False):
         """Assemble an instruction from its fields. """
         self.op = op
         self.cond = cond
@@ -108,6 +122,8 @@ class Instruction(object):
         self.reg_src1 = reg_src1
         self.reg_src2 = reg_src2
         self.offset = offset
+        # Post-increment src1 (LOAD and STORE only)
+        self.increment = increment
         return
 
     def __eq__(self, other):
@@ -117,7 +133,8 @@ class Instruction(object):
                 self.reg_target == other.reg_target and
                 self.reg_src1 == other.reg_src1 and
                 self.reg_src2 == other.reg_src2 and
-                self.offset == other.offset)
+                self.offset == other.offset and
+                self.increment == other.increment)
 
     def encode(self) -> int:
         """Encode instruction as 32-bit integer"""
@@ -128,6 +145,8 @@ class Instruction(object):
         word = reg_src1_field.insert(self.reg_src1, word)
         word = reg_src2_field.insert(self.reg_src2, word)
         word = offset_field.insert(self.offset, word)
+        if self.increment:
+            word = reserved.insert(1, word)
         return word
 
     def __str__(self):
@@ -137,9 +156,9 @@ class Instruction(object):
         else:
             cond_codes = "/{}".format(self.cond)
 
-        return "{}{:4}  r{},r{},r{}[{}]".format(
+        return "{}{:4}  r{},r{}{},r{}[{}]".format(
             self.op.name, cond_codes,
-            self.reg_target, self.reg_src1,
+            self.reg_target, self.reg_src1, "+" if self.increment else "",
             self.reg_src2, self.offset)
 
 
@@ -157,7 +176,8 @@ def decode(word: int) -> Instruction:
     reg_src2 = reg_src2_field.extract(word)
     offset = offset_field.extract_signed(word)
     return Instruction(OpCode(op), CondFlag(cond),
-                       reg_target, reg_src1, reg_src2, offset)
+                       reg_target, reg_src1, reg_src2, offset,
+                       reserved.extract(word) == 1)
 
 
 # When we build an assembler, we'll use regular expressions for pattern matching,
@@ -165,18 +185,33 @@ def decode(word: int) -> Instruction:
 # for constructing an instruction from the dict.
 #
 def instruction_from_dict(d: dict) -> Instruction:
-    """Construct an Instruction from a dict containing symbolic fields. """
-    return Instruction(OpCode[d["opcode"]],
-                       CondFlag[d["predicate"]],
-                       NAMED_REGS[d["target"]],
-                       NAMED_REGS[d["src1"]],
-                       NAMED_REGS[d["src2"]],
-                       int(d["offset"]))
+    """Construct an Instruction from a dict containing symbolic fields.
+    If d["increment"] is present and not empty, src1 is post-incremented.
+    """
+    return make_instruction(d["opcode"], d["predicate"], d["target"],
+                            d["src1"], d["src2"], d["offset"],
+                            bool(d.get("increment")))
+
+
+def make_instruction(opcode: str, predicate: str, target: str,
+                     src1: str, src2: str, offset: str,
+                     increment: bool = False) -> Instruction:
+    """Construct an Instruction from symbolic fields, checking
+    that only LOAD and STORE post-increment.
+    """
+    op = OpCode[opcode]
+    if increment and op not in (OpCode.LOAD, OpCode.STORE):
+        raise ValueError("Only LOAD and STORE can post-increment, not {}".format(opcode))
+    return Instruction(op, CondFlag[predicate],
+                       NAMED_REGS[target], NAMED_REGS[src1], NAMED_REGS[src2],
+                       int(offset), increment)
 
 
 # Until we build an assembler, we can construct instructions from
 # a very simple string format like
 #   "ADD Z r1 r2 r3 -14"
+# or, post-incrementing r2,
+#   "LOAD ALWAYS r1 r2+ r0 0"
 #
 def instruction_from_string(s) -> Instruction:
     """Construct an Instruction from a string.
@@ -185,5 +220,6 @@ def instruction_from_string(s) -> Instruction:
     """
     fields = s.split()
     opcode, predicate, targ_name, src1_name, src2_name, offset = fields
-    return Instruction(OpCode[opcode], CondFlag[predicate],
-                       NAMED_REGS[targ_name], NAMED_REGS[src1_name], NAMED_REGS[src2_name], int(offset))
+    increment = src1_name.endswith("+")
+    return make_instruction(opcode, predicate, targ_name, src1_name.rstrip("+"),
+                            src2_name, offset, increment)
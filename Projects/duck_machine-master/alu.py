@@ -6,9 +6,18 @@ logical "arithmetic" such as and, or, and shifting.
 """
 
 from instr_format import OpCode, CondFlag
+from memory import WORD_SIGN, WORD_MASK
 from typing import Tuple
 
 
+# Condition codes as plain integers, and the CondFlag for each
+CC_M = CondFlag.M.value
+CC_Z = CondFlag.Z.value
+CC_P = CondFlag.P.value
+CC_V = CondFlag.V.value
+CC_FLAGS = [CondFlag(value) for value in range(16)]
+
+
 class ALU(object):
     """The arithmetic logic unit (also called a "functional unit"
     in a modern CPU) executes a selected function but does not
@@ -25,6 +34,15 @@ class ALU(object):
         OpCode.MUL: lambda x, y: x * y,
         OpCode.SUB: lambda x, y: x - y,
         OpCode.DIV: lambda x, y: x // y,
+        OpCode.AND: lambda x, y: x & y,
+        OpCode.OR: lambda x, y: x | y,
+        OpCode.XOR: lambda x, y: x ^ y,
+        # Like most hardware, shifts use only the low 5 bits
+        # of the count, so a shift is never more than 31 bits
+        OpCode.SHL: lambda x, y: x << (y & 31),
+        OpCode.SHR: lambda x, y: x >> (y & 31),
+        # The CPU does not store the result of a comparison
+        OpCode.CMP: lambda x, y: x - y,
         # For memory access operations load, store, the ALU
         # performs the address calculation
         OpCode.LOAD: lambda x, y: x + y,
@@ -33,19 +51,45 @@ class ALU(object):
         OpCode.HALT: lambda x, y: 0
     }
 
+    def __init__(self) -> None:
+        # The same operations in a list indexed by the integer
+        # value of the operation code, for exec_int
+        self.int_ops = [None] * 32
+        for op, fn in self.ALU_OPS.items():
+            self.int_ops[op.value] = fn
+
     def exec(self, op, in1: int, in2: int) -> Tuple[int, CondFlag]:
+        result, cc = self.exec_int(op.value, in1, in2)
+        return result, CC_FLAGS[cc]
+
+    def exec_int(self, op: int, in1: int, in2: int) -> Tuple[int, int]:
+        """Like exec, but with the operation code and condition
+        code as plain integers (OpCode.ADD.value, CondFlag.M.value,
+        etc.), so the execution engines need not hash or build
+        enum members on every instruction.
+        """
+        try:
+            result = self.int_ops[op](in1, in2)
+        except (ArithmeticError, ValueError):
+            return 0, CC_V
+        return result, CC_M if result < 0 else CC_Z if result == 0 else CC_P
+
+
+class WrappingALU(ALU):
+    """An ALU for strict 32-bit arithmetic.  Results wrap
+    around to 32-bit two's complement, as they would in hardware,
+    and a result that does not fit (signed overflow) sets condition
+    code V instead of M, Z, or P.  Operands are 32-bit words, so no
+    intermediate result is ever more than 64 bits, and big numbers
+    can't slow the machine down.
+    """
+
+    def exec_int(self, op: int, in1: int, in2: int) -> Tuple[int, int]:
         try:
-            result = self.ALU_OPS[op](in1, in2)
-        except ArithmeticError:
-            return 0, CondFlag.V
-        except ValueError:
-            return 0, CondFlag.V
-        if result < 0:
-            cc = CondFlag.M
-        elif result == 0:
-            cc = CondFlag.Z
-        elif result > 0:
-            cc = CondFlag.P
-        else:
-            assert False, "Shouldn't reach this point"
-        return result, cc
\ No newline at end of file
+            result = self.int_ops[op](in1, in2)
+        except (ArithmeticError, ValueError):
+            return 0, CC_V
+        wrapped = ((result + WORD_SIGN) & WORD_MASK) - WORD_SIGN
+        if wrapped != result:
+            return wrapped, CC_V
+        return result, CC_M if result < 0 else CC_Z if result == 0 else CC_P
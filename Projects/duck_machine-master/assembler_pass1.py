@@ -36,12 +36,18 @@ as /ALWAYS, which is an alias for /NZP.
 target is a register number (r0,r1, ... r15) or one of the
 register aliases ZERO, PC, SP, etc.
 
-src1 and src2 are likewise register specifiers.
+src1 and src2 are likewise register specifiers.  For LOAD
+and STORE, src1 may be followed by + (e.g., LOAD r1,r2+,r0) to
+add one to it after the memory access.
 
 [disp] is optional.  If present, it is a 12 bit
 signed integer displacement.  If absent, it is
 treated as [0].
 
+CMP may be written with just the two registers it compares,
+   CMP/predicate  src1,src2[disp]
+which is short for CMP/predicate r0,src1,src2[disp].
+
 DATA is a pseudo-operation:
    myvar:  DATA   18
 indicates that the integer value 18
@@ -95,7 +101,7 @@ class SyntaxError(Exception):
 # To simplify client code, we'd like to return a dict with
 # the right fields even if the line is syntactically incorrect.
 DICT_NO_MATCH = {'label': None, 'opcode': None, 'predicate': None,
-                 'target': None, 'src1': None, 'src2': None,
+                 'target': None, 'src1': None, 'increment': None, 'src2': None,
                  'offset': None, 'comment': None}
 
 
@@ -119,6 +125,8 @@ class AsmSrcKind(Enum):
     DATA = auto()
     # Add the symbol choice for the new kind of instruction
     SYMBOLIC = auto()
+    # Comparison without a target register
+    COMPARE = auto()
 
 
 # Lines that contain only a comment (and possibly a label).
@@ -152,7 +160,8 @@ ASM_FULL_PAT = re.compile(r"""
     (/ (?P<predicate> [a-zA-Z]+) )?     # Predicate (optional)
     \s+
     (?P<target>    r[0-9]+),            # Target register
-    (?P<src1>      r[0-9]+),            # Source register 1
+    (?P<src1>      r[0-9]+)             # Source register 1
+    (?P<increment> \+)?,                # Post-increment (optional)
     (?P<src2>      r[0-9]+)             # Source register 2
     (\[ (?P<offset>[-]?[0-9]+) \])?     # Offset (optional)
    # Optional comment follows # or ; 
@@ -179,7 +188,7 @@ ASM_DATA_PAT = re.compile(r"""
    # Optional data value
    \s*
    (?P<value>  (0x[a-fA-F0-9]+)
-             | ([0-9]+))?
+             | ([-]?[0-9]+))?
     # Optional comment follows # or ; 
    (
      \s*
@@ -210,10 +219,33 @@ ASM_SYMBOLIC_PAT = re.compile(r"""
    \s*$         
     """, re.VERBOSE)
 
+# CMP with only the registers compared; the target is r0
+ASM_COMPARE_PAT = re.compile(r"""
+    # Optional label
+    (
+      (?P<label>   [a-zA-Z]\w*):
+    )?
+    # The instruction proper
+    \s*
+      (?P<opcode>    CMP)                             # Opcode
+      (/ (?P<predicate> [a-zA-Z]+) )?                 # Predicate (optional)
+    \s+
+    (?P<src1>      r[0-9]+),            # Source register 1
+    (?P<src2>      r[0-9]+)             # Source register 2
+    (\[ (?P<offset>[-]?[0-9]+) \])?     # Offset (optional)
+    # Optional comment follows # or ;
+   (
+     \s*
+     (?P<comment>[\#;].*)
+   )?
+   \s*$
+    """, re.VERBOSE)
+
 PATTERNS = [(ASM_FULL_PAT, AsmSrcKind.FULL),
             (ASM_DATA_PAT, AsmSrcKind.DATA),
             (ASM_COMMENT_PAT, AsmSrcKind.COMMENT),
-            (ASM_SYMBOLIC_PAT, AsmSrcKind.SYMBOLIC)
+            (ASM_SYMBOLIC_PAT, AsmSrcKind.SYMBOLIC),
+            (ASM_COMPARE_PAT, AsmSrcKind.COMPARE)
             ]
 
 
@@ -308,6 +340,8 @@ def transform_lines(lines: List[str], symbol_table: dict) -> None:
                 lines[lnum] = resolve_line(fields, address, symbol_table)
             except KeyError:
                 print("Unresolved symbol: {}".format(fields["symbol"]))
+        elif fields["kind"] == AsmSrcKind.COMPARE:
+            lines[lnum] = expand_compare(fields)
         if fields["kind"] != AsmSrcKind.COMMENT:
             address += 1
 
@@ -352,6 +386,18 @@ def resolve_line(fields: dict, addr: int, symtab: dict) -> str:
         return "{} ADD{} r15,r0,r15[{}] #Jump to {}".format(lab, predicate, distance, sym)
 
 
+def expand_compare(fields: dict) -> str:
+    """
+    The full form of CMP src1,src2[disp], with r0 as its target.
+    """
+    lab = "{}: ".format(fields["label"]) if fields["label"] else ""
+    predicate = "/{}".format(fields["predicate"]) if fields["predicate"] else ""
+    offset = "[{}]".format(fields["offset"]) if fields["offset"] else ""
+    comment = " {}".format(fields["comment"]) if fields["comment"] else ""
+    return "{} CMP{} r0,{},{}{}{}".format(lab, predicate, fields["src1"], fields["src2"],
+                                         offset, comment)
+
+
 def cli() -> object:
     """Get arguments from command line"""
     parser = argparse.ArgumentParser(description="Duck Machine Assembler (pass 2)")
@@ -24,7 +24,9 @@ not zero".  If /predicate is not given, it is interpreted
 as /ALWAYS, which is an alias for /NZP.
 target is a register number (r0,r1, ... r15) or one of the
 register aliases ZERO, PC, SP, etc.
-src1 and src2 are likewise register specifiers.
+src1 and src2 are likewise register specifiers.  For LOAD
+and STORE, src1 may be followed by + (e.g., LOAD r1,r2+,r0) to
+add one to it after the memory access.
 [disp] is optional.  If present, it is a 12 bit
 signed integer displacement.  If absent, it is
 treated as [0].
@@ -36,6 +38,7 @@ a DM2018S instruction.
 """
 from instr_format import Instruction, instruction_from_dict
 import memory
+import objfile
 import argparse
 
 from typing import Union, List
@@ -72,7 +75,7 @@ class SyntaxError(Exception):
 # To simplify client code, we'd like to return a dict with
 # the right fields even if the line is syntactically incorrect.
 DICT_NO_MATCH = { 'label': None, 'opcode': None, 'predicate': None,
-                      'target': None, 'src1': None, 'src2': None,
+                      'target': None, 'src1': None, 'increment': None, 'src2': None,
                       'offset': None, 'comment': None }
 
 
@@ -127,7 +130,8 @@ ASM_FULL_PAT = re.compile(r"""
     (/ (?P<predicate> [a-zA-Z]+) )?   # Predicate (optional)
     \s+
     (?P<target>    r[0-9]+),            # Target register
-    (?P<src1>      r[0-9]+),            # Source register 1
+    (?P<src1>      r[0-9]+)             # Source register 1
+    (?P<increment> \+)?,                # Post-increment (optional)
     (?P<src2>      r[0-9]+)             # Source register 2
     (\[ (?P<offset>[-]?[0-9]+) \])?     # Offset (optional)
    # Optional comment follows # or ; 
@@ -154,7 +158,7 @@ ASM_DATA_PAT = re.compile(r"""
    # Optional data value
    \s*
    (?P<value>  (0x[a-fA-F0-9]+)
-             | ([0-9]+))?
+             | ([-]?[0-9]+))?
     # Optional comment follows # or ; 
    (
      \s*
@@ -204,12 +208,13 @@ def value_parse(int_literal: str) -> int:
         return int(int_literal, 10)
 
 
-def assemble(lines: List[str]) -> List[int]:
+def assemble(lines: List[str], symbols: dict = None) -> List[int]:
     """
     Simple one-pass assembly for now; must be extended to two
     passes to write convenient assembly code with labels; probably
     to three passes with expansion of control flow into standard
-    assembly code.
+    assembly code.  If a symbols dict is given, the address of
+    each label is recorded in it.
     """
     error_count = 0
     instructions = [ ]
@@ -218,6 +223,8 @@ def assemble(lines: List[str]) -> List[int]:
         log.debug("Processing line {}: {}".format(lnum, line))
         try:
             fields = parse_line(line)
+            if symbols is not None and fields["label"]:
+                symbols[fields["label"]] = len(instructions)
             if fields["kind"] == AsmSrcKind.FULL:
                 log.debug("Constructing instruction")
                 fill_defaults(fields)
@@ -252,7 +259,13 @@ def cli() -> object:
     parser.add_argument("objfile", type=argparse.FileType('w'),
                             nargs="?", default=sys.stdout,
                             help="Object file output")
+    parser.add_argument("-b", "--binary", action="store_true",
+                            help="Write binary object format (see objfile.py)")
+    parser.add_argument("-e", "--entry", default=None,
+                            help="Label at which execution starts (binary only)")
     args = parser.parse_args()
+    if args.entry is not None and not args.binary:
+        parser.error("--entry is only used with --binary")
     return args
 
 
@@ -260,8 +273,19 @@ def main():
     """"Assemble a Duck Machine program"""
     args = cli()
     lines = args.sourcefile.readlines()
-    object_code = assemble(lines)
+    symbols = { }
+    object_code = assemble(lines, symbols)
     log.debug("Object code: \n{}".format(object_code))
+    if args.binary:
+        entry = 0
+        if args.entry is not None:
+            if args.entry not in symbols:
+                # Not to stdout, which may be the object file
+                log.error("Entry label {} is not defined".format(args.entry))
+                sys.exit(1)
+            entry = symbols[args.entry]
+        objfile.write_binary(args.objfile.buffer, object_code, entry, symbols)
+        return
     for word in object_code:
         log.debug("Instruction word {}".format(word))
         print(word,file=args.objfile)
@@ -0,0 +1,206 @@
+"""
+Batch simulation:  run one Duck Machine object program against
+many input streams, spread across a pool of worker processes.
+
+Each line of the inputs file is one input stream, a sequence of
+integers separated by white space.  Instead of the console, reads
+of the memory-mapped input address take integers from that stream,
+and writes to the output address are collected.  Results are
+written as JSON lines, in the same order as the inputs, e.g.,
+
+   {"run": 0, "outputs": [120], "steps": 157, "halted": true, "error": null}
+
+Runs that exceed the step or time budget, or are caught in a
+jump-to-self loop, are stopped; their result has "halted": false,
+the error, and the machine "state" when they were stopped.
+With --cache, each result also has the "cache" hits and misses
+of that run (see cache.py).
+
+Usage:
+   python3 duck_machine.py batch programs/max.obj inputs.txt -j 4
+"""
+
+from memory import MemoryMappedIO
+from cpu import CPU, ExecutionLimit
+from translate import TranslatingCPU
+from cache import parse_spec
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+
+from typing import List
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Same memory configuration as duck_machine.main
+MEMORY_SIZE = 512
+IN_ADDR = 510
+OUT_ADDR = 511
+
+# Untrusted programs may never halt
+DEFAULT_MAX_STEPS = 10000000
+
+
+class InputExhausted(Exception):
+    """The program read more input than its stream held"""
+    pass
+
+
+# Each worker process receives the program once, in init_worker,
+# and builds one machine for all its runs.  Every run starts by
+# restoring the machine from _checkpoint, which is much cheaper
+# than building and loading a new memory, and lets a translating
+# CPU keep the blocks it has already translated.
+_cpu = None       # type: CPU
+_run_cpu = None
+_checkpoint = None
+_entry = 0
+_limits = {}
+# Input and output of the current run
+_pending = collections.deque()
+_outputs = []
+
+
+def _read(addr: int) -> int:
+    if not _pending:
+        raise InputExhausted("Input stream exhausted")
+    return _pending.popleft()
+
+
+def _write(addr: int, value: int) -> None:
+    _outputs.append(value)
+
+
+def init_worker(words: List[int], entry: int, engine: str,
+                limits: dict = None, cache: str = None) -> None:
+    global _cpu, _run_cpu, _checkpoint, _entry, _limits
+    mem = MemoryMappedIO(MEMORY_SIZE)
+    mem.map_address_in(IN_ADDR, _read)
+    mem.map_address_out(OUT_ADDR, _write)
+    mem.load_words(words)
+    if engine == "translate":
+        _cpu = TranslatingCPU(mem)
+        _run_cpu = _cpu.run
+    elif engine == "fast":
+        _cpu = CPU(mem)
+        _run_cpu = _cpu.run_fast
+    else:
+        _cpu = CPU(mem)
+        _run_cpu = _cpu.run
+    if cache is not None:
+        _cpu.cache = parse_spec(cache, uncached=(IN_ADDR, OUT_ADDR))
+    _checkpoint = _cpu.snapshot()
+    _entry = entry
+    _limits = limits or {}
+
+
+def run_one(run: int, inputs: List[int]) -> dict:
+    """Run the program on one input stream"""
+    _pending.clear()
+    _pending.extend(inputs)
+    del _outputs[:]
+    _cpu.restore(_checkpoint)
+    if _cpu.cache is not None:
+        _cpu.cache.reset()
+    error = None
+    state = None
+    try:
+        _run_cpu(_entry, detect_loops=True, **_limits)
+    except ExecutionLimit as e:
+        error = "{}: {}".format(type(e).__name__, e)
+        state = e.state
+    except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+    result = {"run": run, "outputs": list(_outputs), "steps": _cpu.step_count,
+              "halted": _cpu.halted, "error": error}
+    if state is not None:
+        result["state"] = state
+    if _cpu.cache is not None:
+        _cpu.cache.flush()
+        result["cache"] = {"hits": sum(_cpu.cache.hits.values()),
+                           "misses": sum(_cpu.cache.misses.values()),
+                           "words_written": _cpu.cache.words_written}
+    return result
+
+
+def read_inputs(file) -> List[List[int]]:
+    """One input stream per line"""
+    return [[int(field) for field in line.split()] for line in file]
+
+
+def run_batch(words: List[int], streams: List[List[int]], entry: int = 0,
+              engine: str = "fast", jobs: int = None,
+              max_steps: int = None, time_limit: float = None,
+              cache: str = None):
+    """Generate results of running the program on each stream,
+    in order.  jobs=1 runs everything in this process.  Each run
+    is limited to max_steps steps and time_limit seconds, and
+    simulates the cache specified by cache (see cache.parse_spec),
+    if given.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    limits = {"max_steps": max_steps, "time_limit": time_limit}
+    if jobs == 1:
+        init_worker(words, entry, engine, limits, cache)
+        for run, inputs in enumerate(streams):
+            yield run_one(run, inputs)
+        return
+    # Several chunks per worker balances load without paying
+    # interprocess overhead on every run
+    chunk = max(1, len(streams) // (4 * jobs))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_worker,
+            initargs=(words, entry, engine, limits, cache)) as pool:
+        yield from pool.map(run_one, range(len(streams)), streams,
+                            chunksize=chunk)
+
+
+def cli(argv: List[str]) -> object:
+    """Get arguments from command line"""
+    parser = argparse.ArgumentParser(prog="duck_machine.py batch",
+                                     description="Duck Machine batch runner")
+    parser.add_argument("objfile", type=argparse.FileType('rb'),
+                        help="Object file (text or binary)")
+    parser.add_argument("inputs", type=argparse.FileType('r'),
+                        help="Input streams, one per line")
+    parser.add_argument("-o", "--output", type=argparse.FileType('w'),
+                        default=sys.stdout, help="JSON lines output")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Worker processes (default: one per core)")
+    parser.add_argument("-e", "--engine", default="fast",
+                        choices=["interp", "fast", "translate"],
+                        help="Execution engine")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help="Stop each run after this many steps")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Stop each run after this many seconds")
+    parser.add_argument("--cache", default=None, metavar="SIZE[,WAYS[,LINE[,wt]]]",
+                        help="Simulate a data cache in each run (see cache.py)")
+    args = parser.parse_args(argv)
+    if args.cache:
+        try:
+            parse_spec(args.cache)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv: List[str]):
+    # Imported here because duck_machine imports this module
+    from duck_machine import load
+    args = cli(argv)
+    image = MemoryMappedIO(MEMORY_SIZE)
+    entry = load(args.objfile, image)
+    words = [image.peek(addr) for addr in range(MEMORY_SIZE)]
+    streams = read_inputs(args.inputs)
+    for result in run_batch(words, streams, entry, args.engine, args.jobs,
+                            args.max_steps, args.timeout, args.cache):
+        print(json.dumps(result), file=args.output)
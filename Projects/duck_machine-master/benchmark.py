@@ -0,0 +1,200 @@
+"""
+Benchmark the Duck Machine simulator on the bundled
+object code programs, reporting simulated steps (executed
+instructions) per second of real time for each way of
+configuring the CPU.
+
+The translate column runs each program with the blocks compiled
+by earlier runs, as a long-lived process would; translate-cold
+compiles them every run, which is what a single short run costs.
+
+Programs that read input get a fixed sequence of integers,
+and output is discarded, so no time is spent waiting on
+the console.  Usage:
+
+   python3 benchmark.py                 # all programs in programs/
+   python3 benchmark.py programs/sum.obj -t 2.0
+   python3 benchmark.py programs/parallel_sum.obj --cores 4
+"""
+
+from memory import MemoryMappedIO, CompactMemoryMappedIO
+from cpu import CPU
+from translate import TranslatingCPU, clear_translations
+from multicore import MultiCore
+
+import argparse
+import glob
+import itertools
+import os
+import time
+
+from typing import Callable, List
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Input fed to programs that read from memory-mapped address 510
+BENCH_INPUT = [5, 7, 3, 0, 2, 9]
+
+
+def no_cache(mem: MemoryMappedIO) -> int:
+    """Original fetch/decode/execute with no decoded-instruction cache"""
+    cpu = CPU(mem, decode_cache=False)
+    cpu.run()
+    return cpu.step_count
+
+
+def decode_cache(mem: MemoryMappedIO) -> int:
+    """Fetch/decode/execute with decoded instructions cached by address"""
+    cpu = CPU(mem)
+    cpu.run()
+    return cpu.step_count
+
+
+def journal(mem: MemoryMappedIO) -> int:
+    """Fetch/decode/execute recording an undo journal of every step"""
+    cpu = CPU(mem)
+    cpu.start_journal(100000)
+    cpu.run()
+    return cpu.step_count
+
+
+def fast(mem: MemoryMappedIO) -> int:
+    """Headless loop with no events, logging, or Register objects"""
+    cpu = CPU(mem)
+    cpu.run_fast()
+    return cpu.step_count
+
+
+def fast_wrap(mem: MemoryMappedIO) -> int:
+    """Headless loop, strict 32-bit arithmetic"""
+    cpu = CPU(mem, wrap=True)
+    cpu.run_fast()
+    return cpu.step_count
+
+
+def translate(mem: MemoryMappedIO) -> int:
+    """Basic blocks translated into Python functions, reusing
+    the code compiled by earlier runs of the same program
+    """
+    cpu = TranslatingCPU(mem)
+    cpu.run()
+    return cpu.step_count
+
+
+def translate_cold(mem: MemoryMappedIO) -> int:
+    """Translated, compiling every block afresh, as the first
+    run of a program does
+    """
+    clear_translations()
+    cpu = TranslatingCPU(mem)
+    cpu.run()
+    return cpu.step_count
+
+
+# Each configuration runs a loaded memory to completion,
+# returning the number of steps it took
+CONFIGS = [("no-cache", no_cache),
+           ("decode-cache", decode_cache),
+           ("journal", journal),
+           ("fast", fast),
+           ("fast-wrap", fast_wrap),
+           ("translate", translate),
+           ("translate-cold", translate_cold)]
+
+
+def read_object(path: str) -> List[int]:
+    with open(path) as f:
+        return [int(line) for line in f]
+
+
+def fresh_memory(words: List[int], memory_class: type) -> MemoryMappedIO:
+    """Memory loaded with the program, with console
+    input and output replaced by cheap stand-ins.
+    """
+    mem = memory_class(512)
+    inputs = itertools.cycle(BENCH_INPUT)
+    mem.map_address_in(510, lambda addr: next(inputs))
+    mem.map_address_out(511, lambda addr, value: None)
+    mem.load_words(words)
+    return mem
+
+
+def measure(words: List[int], config: Callable[[MemoryMappedIO], int],
+            min_time: float, memory_class: type = MemoryMappedIO) -> float:
+    """Steps per second, running the program repeatedly
+    until at least min_time seconds have been spent in it.
+    """
+    steps = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        mem = fresh_memory(words, memory_class)
+        start = time.perf_counter()
+        steps += config(mem)
+        elapsed += time.perf_counter() - start
+    return steps / elapsed
+
+
+def measure_cores(words: List[int], n: int, threaded: bool,
+                  min_time: float, memory_class: type = MemoryMappedIO) -> float:
+    """Steps per second of all cores together, as measure"""
+    steps = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        machine = MultiCore(fresh_memory(words, memory_class), n)
+        start = time.perf_counter()
+        if threaded:
+            machine.run_threaded()
+        else:
+            machine.run_round_robin()
+        elapsed += time.perf_counter() - start
+        steps += machine.step_count()
+    return steps / elapsed
+
+
+def cli() -> object:
+    """Get arguments from command line"""
+    parser = argparse.ArgumentParser(description="Duck Machine benchmark")
+    parser.add_argument("objfiles", nargs="*",
+                        help="Object files (default: programs/*.obj)")
+    parser.add_argument("-t", "--time", type=float, default=0.5,
+                        help="Minimum seconds to run each program per configuration")
+    parser.add_argument("-c", "--compact", action="store_true",
+                        help="Use array-backed CompactMemory")
+    parser.add_argument("--cores", type=int, default=None,
+                        help="Measure multi-core scaling from 1 to this many cores")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = cli()
+    paths = args.objfiles
+    if not paths:
+        here = os.path.dirname(os.path.abspath(__file__))
+        paths = sorted(glob.glob(os.path.join(here, "programs", "*.obj")))
+    memory_class = CompactMemoryMappedIO if args.compact else MemoryMappedIO
+    if args.cores:
+        print("{:16}{:>16}{:>16}".format("steps/sec", "round-robin", "threaded"))
+        for path in paths:
+            words = read_object(path)
+            for n in range(1, args.cores + 1):
+                rates = [measure_cores(words, n, threaded, args.time, memory_class)
+                         for threaded in [False, True]]
+                print("{:16}".format("{} x{}".format(os.path.basename(path), n)) +
+                      "".join("{:>16,.0f}".format(rate) for rate in rates))
+        return
+    names = [name for name, _ in CONFIGS]
+    print("{:16}".format("steps/sec") + "".join("{:>16}".format(name) for name in names))
+    for path in paths:
+        words = read_object(path)
+        rates = [measure(words, config, args.time, memory_class) for _, config in CONFIGS]
+        print("{:16}".format(os.path.basename(path)) +
+              "".join("{:>16,.0f}".format(rate) for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
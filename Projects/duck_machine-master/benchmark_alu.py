@@ -0,0 +1,87 @@
+"""
+Micro-benchmarks of the ALU in isolation:  nanoseconds per
+call, for each operation (including division by zero), of
+
+    original   the ALU as it was before exec_int:  OpCode looked
+               up in ALU_OPS, then a CondFlag chosen by an if chain
+    exec       OpCode in, CondFlag out, now a wrapper on exec_int
+    exec_int   plain integers in and out
+
+The speedup is original over exec_int, i.e., what the execution
+engines gained by calling exec_int.  benchmark.py measures whole
+programs.
+
+   python3 benchmark_alu.py
+   python3 benchmark_alu.py -n 2000000
+"""
+
+from alu import ALU
+from instr_format import OpCode, CondFlag
+
+import argparse
+import timeit
+
+from typing import Callable, Tuple
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Operands for each case: (name, operation, left, right)
+CASES = [(op.name, op, 1234, 56) for op in OpCode] + [("DIV by 0", OpCode.DIV, 1234, 0)]
+
+
+class OriginalALU(ALU):
+    """The baseline:  exec as it was written before exec_int"""
+
+    def exec(self, op, in1: int, in2: int) -> Tuple[int, CondFlag]:
+        try:
+            result = self.ALU_OPS[op](in1, in2)
+        except ArithmeticError:
+            return 0, CondFlag.V
+        except ValueError:
+            return 0, CondFlag.V
+        if result < 0:
+            cc = CondFlag.M
+        elif result == 0:
+            cc = CondFlag.Z
+        elif result > 0:
+            cc = CondFlag.P
+        else:
+            assert False, "Shouldn't reach this point"
+        return result, cc
+
+
+def per_call(fn: Callable, op, left: int, right: int, number: int) -> float:
+    """Nanoseconds per call of fn(op, left, right), best of 5"""
+    timer = timeit.Timer("fn(op, left, right)",
+                         globals={"fn": fn, "op": op, "left": left, "right": right})
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e9
+
+
+def cli() -> object:
+    """Get arguments from command line"""
+    parser = argparse.ArgumentParser(description="ALU micro-benchmark")
+    parser.add_argument("-n", "--number", type=int, default=200000,
+                        help="Calls per timing")
+    return parser.parse_args()
+
+
+def main():
+    args = cli()
+    alu = ALU()
+    original = OriginalALU()
+    print("{:12}{:>12}{:>12}{:>12}{:>10}".format(
+        "ns/call", "original", "exec", "exec_int", "speedup"))
+    for name, op, left, right in CASES:
+        original_time = per_call(original.exec, op, left, right, args.number)
+        enum_time = per_call(alu.exec, op, left, right, args.number)
+        int_time = per_call(alu.exec_int, op.value, left, right, args.number)
+        print("{:12}{:>12.0f}{:>12.0f}{:>12.0f}{:>9.1f}x".format(
+            name, original_time, enum_time, int_time, original_time / int_time))
+
+
+if __name__ == "__main__":
+    main()
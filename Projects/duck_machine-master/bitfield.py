@@ -16,6 +16,8 @@ representation, but we ignore that because we are trying
 to simulate a machine-level representation.
 """
 
+from typing import List, Tuple
+
 import logging
 logging.basicConfig()
 log = logging.getLogger(__name__)
@@ -57,10 +59,7 @@ class BitField(object):
         low-order bits.
         """
         assert width >= 0
-        mask = 0
-        for bit in range(width):
-            mask = (mask << 1) + 1
-        return mask
+        return (1 << width) - 1
 
     def insert(self, field_value: int, word: int) -> int:
         """Insert value of field into word.
@@ -93,11 +92,61 @@ class BitField(object):
         low order bits, sign-extended.
         """
         unsigned = self.extract(word)
-        # Sign extend if negative
-        if unsigned & self.sign_bit:
-            return unsigned - self.comp
-        else:
-            return unsigned
+        # Flipping the sign bit and subtracting it leaves
+        # positive values unchanged and makes negative values
+        # negative.  With no branch, this works equally for a
+        # NumPy array of (signed) words.
+        return (unsigned ^ self.sign_bit) - self.sign_bit
+
+
+class InstructionLayout(object):
+    """A complete word format:  a table of named bit fields,
+    packed and unpacked together.  Rather than calling insert
+    or extract once per field, pack and unpack are generated as
+    straight-line Python functions with every shift and mask
+    written in as a constant, e.g., for a layout with fields
+    ("op", BitField(26, 30), False) and ("offset", BitField(0, 9), True),
+
+        def pack(op, offset):
+            return (op << 26 & 0x7c000000) | (offset << 0 & 0x3ff)
+
+        def unpack(word):
+            return (word >> 26 & 0x1f, ((word >> 0 & 0x3ff) ^ 0x200) - 0x200,)
+    """
+
+    def __init__(self, fields: List[Tuple[str, BitField, bool]]) -> None:
+        """fields are (name, bit field, signed) from high-order to
+        low-order; the names become the arguments of pack and
+        the order of the values returned by unpack.
+        """
+        self.fields = fields
+        self.names = [name for name, _, _ in fields]
+        self.pack_source = self._pack_source()
+        self.unpack_source = self._unpack_source()
+        namespace = {}
+        exec(compile(self.pack_source + self.unpack_source,
+                     "<layout {}>".format(",".join(self.names)), "exec"),
+             namespace)
+        self.pack = namespace["pack"]
+        self.unpack = namespace["unpack"]
+
+    def _pack_source(self) -> str:
+        terms = ["({} << {} & {:#x})".format(name, field.from_bit, field.mask)
+                 for name, field, _ in self.fields]
+        return "def pack({}):\n    return {}\n".format(
+            ", ".join(self.names), " | ".join(terms))
+
+    def _unpack_source(self) -> str:
+        terms = []
+        for name, field, signed in self.fields:
+            low_mask = field.mask >> field.from_bit
+            if signed:
+                # As in extract_signed
+                terms.append("((word >> {} & {:#x}) ^ {:#x}) - {:#x}".format(
+                    field.from_bit, low_mask, field.sign_bit, field.sign_bit))
+            else:
+                terms.append("word >> {} & {:#x}".format(field.from_bit, low_mask))
+        return "def unpack(word):\n    return ({},)\n".format(", ".join(terms))
 
 
 # Sign extension is a little bit wacky in Python, because Python
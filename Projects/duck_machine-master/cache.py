@@ -0,0 +1,231 @@
+"""
+Data cache simulator for the Duck Machine.
+
+A Cache sits between the CPU and memory and watches every
+LOAD and STORE address go by.  It does not hold any data (memory
+still has every word); it only keeps the tags a real cache would,
+so it can tell which accesses would hit and which would miss.
+The configuration is
+
+    size           words the cache holds
+    ways           lines per set:  1 is direct-mapped, and
+                   size // line_size is fully associative
+    line_size      words per line, moved to and from memory together
+    write_back     True:  a store marks the line dirty, and it is
+                   written to memory when it is evicted; a store
+                   that misses brings the line in (write-allocate).
+                   False:  every store goes straight to memory
+                   (write-through) and a store that misses does
+                   not bring the line in (no-write-allocate).
+
+All three sizes are powers of two.  Lines within a set are
+replaced least recently used first.  Memory-mapped I/O addresses
+should be listed in uncached, since a real machine could not keep
+copies of them; accesses to them are not counted at all.
+
+Attach a cache to a CPU before running it, like a profile:
+
+    cpu.cache = Cache(64, ways=2, line_size=4)
+    cpu.run_fast()
+    print("\\n".join(cpu.cache.report()))
+
+Every execution engine counts the same accesses, and the fast
+ones stay fast:  the cache adds one call per load or store and
+nothing else.  Instruction fetches are not simulated (think of
+them as hitting in a separate instruction cache).
+"""
+
+from profiler import Profile
+
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+def _log2(n: int, what: str) -> int:
+    if n < 1 or n & (n - 1):
+        raise ValueError("{} must be a power of two, not {}".format(what, n))
+    return n.bit_length() - 1
+
+
+class Cache(object):
+    """Hit and miss counts for a cache of size words in sets of
+    ways lines of line_size words.  See the module docstring.
+    """
+
+    def __init__(self, size: int, ways: int = 1, line_size: int = 1,
+                 write_back: bool = True, uncached: Iterable[int] = ()) -> None:
+        _log2(size, "Cache size")
+        _log2(ways, "Associativity")
+        self._line_bits = _log2(line_size, "Line size")
+        if ways * line_size > size:
+            raise ValueError("{} ways of {} words do not fit in {} words".format(
+                ways, line_size, size))
+        self.size = size
+        self.ways = ways
+        self.line_size = line_size
+        self.write_back = write_back
+        self.uncached = frozenset(uncached)
+        self.n_sets = size // (ways * line_size)
+        self.reset()
+
+    def reset(self) -> None:
+        """Empty the cache and zero the counts"""
+        # Line numbers held in each set, least recently used first.
+        # The line number is the tag and set index together.
+        self._sets = [[] for _ in range(self.n_sets)]   # type: List[List[int]]
+        self._dirty = set()
+        # Counts by word address
+        self.hits = Counter()
+        self.misses = Counter()
+        self.loads = 0
+        self.stores = 0
+        # Words moved between cache and memory
+        self.words_read = 0
+        self.words_written = 0
+
+    def access(self, addr: int, write: bool = False) -> bool:
+        """Account for a load (or store, if write) at addr, and
+        return True if it hits
+        """
+        if addr in self.uncached:
+            return False
+        if write:
+            self.stores += 1
+        else:
+            self.loads += 1
+        line = addr >> self._line_bits
+        lines = self._sets[line % self.n_sets]
+        if line in lines:
+            self.hits[addr] += 1
+            if lines[-1] != line:
+                lines.remove(line)
+                lines.append(line)
+            if write:
+                if self.write_back:
+                    self._dirty.add(line)
+                else:
+                    self.words_written += 1
+            return True
+        self.misses[addr] += 1
+        if write and not self.write_back:
+            self.words_written += 1
+            return False
+        if len(lines) == self.ways:
+            victim = lines.pop(0)
+            if victim in self._dirty:
+                self._dirty.discard(victim)
+                self.words_written += self.line_size
+        lines.append(line)
+        self.words_read += self.line_size
+        if write:
+            self._dirty.add(line)
+        return False
+
+    def wrap(self, load: Callable[[int], int],
+             store: Callable[[int, int], None]) -> Tuple[Callable, Callable]:
+        """load and store functions (as the fast execution engines
+        use them) that also account for each access
+        """
+        access = self.access
+
+        def cached_load(addr: int) -> int:
+            access(addr)
+            return load(addr)
+
+        def cached_store(addr: int, value: int) -> None:
+            access(addr, True)
+            store(addr, value)
+
+        return cached_load, cached_store
+
+    def flush(self) -> None:
+        """Write every dirty line back, as at the end of a run"""
+        self.words_written += len(self._dirty) * self.line_size
+        self._dirty.clear()
+
+    def accesses(self) -> int:
+        return self.loads + self.stores
+
+    def hit_rate(self) -> float:
+        total = self.accesses()
+        return sum(self.hits.values()) / total if total else 0.0
+
+    def by_label(self, source_lines: List[str]) -> Dict[str, Counter]:
+        """Hits and misses attributed to source labels, e.g., to
+        see which arrays and variables miss.  Each label covers
+        its address and the following addresses up to the next
+        label, as in Profile.by_label.
+        """
+        result = {}
+        label = None
+        for addr, fields, _ in Profile._addressed(source_lines):
+            if fields is not None and fields["label"]:
+                label = fields["label"]
+            if addr is None or label is None:
+                continue
+            counts = result.setdefault(label, Counter())
+            counts["hits"] += self.hits[addr]
+            counts["misses"] += self.misses[addr]
+        return result
+
+    def describe(self) -> str:
+        if self.ways == 1:
+            kind = "direct-mapped"
+        elif self.n_sets == 1:
+            kind = "fully associative"
+        else:
+            kind = "{}-way".format(self.ways)
+        return "{} words, {}, {}-word lines, {}".format(
+            self.size, kind, self.line_size,
+            "write-back" if self.write_back else "write-through")
+
+    def report(self, source_lines: List[str] = None, hot_spots: int = 5) -> List[str]:
+        """Totals, then misses by label (with source) or by address"""
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        lines = ["Cache: {}".format(self.describe()),
+                 "{:20}{:>10}   ({} loads, {} stores)".format(
+                     "Accesses", self.accesses(), self.loads, self.stores),
+                 "{:20}{:>10}   (hit rate {:.1%})".format("Hits", hits, self.hit_rate()),
+                 "{:20}{:>10}".format("Misses", misses),
+                 "{:20}{:>10}".format("Words read", self.words_read),
+                 "{:20}{:>10}".format("Words written", self.words_written)]
+        if source_lines is not None:
+            labels = self.by_label(source_lines)
+            touched = [(label, counts) for label, counts in labels.items()
+                       if counts["hits"] or counts["misses"]]
+            touched.sort(key=lambda item: -item[1]["misses"])
+            if touched:
+                lines.append("{:18}{:>10}{:>10}".format("By label", "hits", "misses"))
+                for label, counts in touched:
+                    lines.append("  {:16}{:>10}{:>10}".format(
+                        label, counts["hits"], counts["misses"]))
+        elif self.misses:
+            lines.append("Most missed addresses:")
+            for addr, count in self.misses.most_common(hot_spots):
+                lines.append("  {:5}:{:>10}".format(addr, count))
+        return lines
+
+
+def parse_spec(spec: str, uncached: Iterable[int] = ()) -> Cache:
+    """A cache from a command line specification
+    SIZE[,WAYS[,LINE[,wt]]], e.g., "64,2,4" or "128,1,8,wt"
+    for write-through.
+    """
+    fields = spec.split(",")
+    write_back = True
+    if len(fields) == 4 and fields[3] in ("wt", "wb"):
+        write_back = fields.pop() == "wb"
+    if not 1 <= len(fields) <= 3:
+        raise ValueError("Cache specification is SIZE[,WAYS[,LINE[,wt]]], not {}".format(spec))
+    try:
+        sizes = [int(field) for field in fields]
+    except ValueError:
+        raise ValueError("Cache specification is SIZE[,WAYS[,LINE[,wt]]], not {}".format(spec))
+    return Cache(*sizes, write_back=write_back, uncached=uncached)
@@ -2,10 +2,16 @@
 Duck Machine model DM2018S CPU
 """
 
-from instr_format import Instruction, OpCode, CondFlag, decode
-from register import Register, ZeroRegister
-from alu import ALU
-from mvc import MVCEvent, MVCListenable
+from instr_format import Instruction, OpCode, CondFlag, LAYOUT, decode
+from register import Register, ZeroRegister, WrappingRegister
+from alu import ALU, WrappingALU
+from memory import MemoryRead, MemoryWrite, MemoryLoaded, MemorySnapshot, wrap_word
+from mvc import MVCEvent, MVCListenable, MVCListener
+from journal import (UndoJournal, PC, CONDITION, TARGET, OLD_TARGET, ADDR, OLD_WORD,
+                     INC_REG, OLD_INC)
+
+import sys
+import time
 
 import logging
 
@@ -14,6 +20,47 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
 
+# Operation codes as plain integers, for run_fast
+OP_HALT = OpCode.HALT.value
+OP_LOAD = OpCode.LOAD.value
+OP_STORE = OpCode.STORE.value
+OP_CMP = OpCode.CMP.value
+# The post-increment bit of LOAD and STORE
+INCREMENT_BIT = 1 << 31
+
+# How often (in steps) run loops look at the clock when
+# enforcing a time limit
+TIME_CHECK_INTERVAL = 4096
+
+
+class ExecutionLimit(Exception):
+    """Execution was stopped before HALT, for unattended runs
+    that must not spin forever.  state is a dict describing the
+    machine when it was stopped (see CPU.machine_state).
+    """
+
+    def __init__(self, message: str, state: dict = None) -> None:
+        super().__init__(message)
+        self.state = state
+
+
+class StepLimitExceeded(ExecutionLimit):
+    """Executed the maximum number of steps without halting"""
+    pass
+
+
+class TimeLimitExceeded(ExecutionLimit):
+    """Ran out of wall-clock time without halting"""
+    pass
+
+
+class InfiniteLoop(ExecutionLimit):
+    """An instruction jumped to itself without changing any
+    register or the condition code, so it will do so forever.
+    """
+    pass
+
+
 class CPUStep(MVCEvent):
     """CPU is beginning step with PC at a given address"""
 
@@ -25,6 +72,63 @@ class CPUStep(MVCEvent):
         self.instr = instr
 
 
+class DecodeCache(MVCListener):
+    """Decoded instructions, keyed by the address they were
+    fetched from.  A loop body is decoded once rather than on
+    every trip around the loop.  The cache listens to the memory
+    it caches, and forgets an address whenever that address is
+    written, so self-modifying code still executes what is
+    actually in memory.
+    """
+
+    def __init__(self, memory) -> None:
+        self._decoded = {}
+        # A memory-mapped input address produces a new word on
+        # every read, so what we fetch there can't be remembered
+        self._uncacheable = getattr(memory, "hooks_read", {})
+        memory.register_listener(self, MemoryWrite, MemoryLoaded)
+
+    def decode(self, addr: int, word: int) -> Instruction:
+        """The decoded form of word, which was fetched from addr"""
+        instr = self._decoded.get(addr)
+        if instr is None:
+            instr = decode(word)
+            if addr not in self._uncacheable:
+                self._decoded[addr] = instr
+        return instr
+
+    def clear(self) -> None:
+        """Forget all decoded instructions"""
+        self._decoded.clear()
+
+    def notify(self, event: MVCEvent) -> None:
+        if isinstance(event, MemoryLoaded):
+            # Forgetting everything is cheaper than a big range
+            if len(event.words) >= len(self._decoded):
+                self._decoded.clear()
+            else:
+                for addr in range(event.addr, event.addr + len(event.words)):
+                    self._decoded.pop(addr, None)
+        else:
+            self._decoded.pop(event.addr, None)
+
+
+class Snapshot(object):
+    """Complete machine state at one moment:  registers,
+    condition code, halted flag, step count, and memory.
+    Restoring a snapshot is cheap, so a harness can run an
+    initialization prefix once and start many runs from there.
+    """
+
+    def __init__(self, registers: tuple, condition: CondFlag, halted: bool,
+                 step_count: int, memory: MemorySnapshot) -> None:
+        self.registers = registers
+        self.condition = condition
+        self.halted = halted
+        self.step_count = step_count
+        self.memory = memory
+
+
 class CPU(MVCListenable):
     """Duck Machine central processing unit (CPU)
     has 16 registers (including r0 that always holds zero
@@ -33,20 +137,46 @@ class CPU(MVCListenable):
     and some logic for sequencing execution.  The CPU
     does not contain the main memory but has a bus connecting
     it to a separate memory.
+
+    With wrap=True the CPU is a strict 32-bit machine:  registers
+    hold 32-bit words, arithmetic wraps around and sets condition
+    code V on overflow (see alu.WrappingALU), and words loaded from
+    memory are cut to 32 bits.  (Pair it with a CompactMemory, which
+    does the same for stores.)
     """
 
-    def __init__(self, memory):
+    def __init__(self, memory, decode_cache: bool = True, wrap: bool = False):
         super().__init__()
         self.memory = memory  # Not part of CPU; what we really have is a connection
-        self.registers = [ ZeroRegister(), Register(), Register(), Register(),
-                           Register(), Register(), Register(), Register(),
-                           Register(), Register(), Register(), Register(),
-                           Register(), Register(), Register(), Register() ]
+        self.wrap = wrap
+        if wrap:
+            self.registers = [ZeroRegister()] + [WrappingRegister() for _ in range(15)]
+            self.alu = WrappingALU()
+        else:
+            self.registers = [ ZeroRegister(), Register(), Register(), Register(),
+                               Register(), Register(), Register(), Register(),
+                               Register(), Register(), Register(), Register(),
+                               Register(), Register(), Register(), Register() ]
+            self.alu = ALU()
         self.condition = CondFlag.ALWAYS
         self.halted = False
-        self.alu = ALU()
         # Convenient aliases
         self.pc = self.registers[15]
+        # Decoding is a pure function of the instruction word,
+        # so we can remember it until the word is overwritten
+        if decode_cache:
+            self.decode_cache = DecodeCache(memory)
+        else:
+            self.decode_cache = None
+        self.step_count = 0
+        # Optional execution counts (see profiler.py), kept by
+        # step directly rather than through events
+        self.profile = None
+        # Optional undo journal (see journal.py)
+        self.journal = None
+        # Optional data cache simulator (see cache.py), told of
+        # every load and store address by every execution engine
+        self.cache = None
 
     def step(self):
         log.debug("Step at PC={}".format(self.pc.get()))
@@ -56,56 +186,357 @@ class CPU(MVCListenable):
         instr_word = self.memory.get(instr_addr)
 
         # Decode
-        instr = decode(instr_word)
+        if self.decode_cache is not None:
+            instr = self.decode_cache.decode(instr_addr, instr_word)
+        else:
+            instr = decode(instr_word)
         log.debug("Instruction: {}".format(instr))
         # Display the CPU state when we have decoded the instruction,
         # before we have executed it
-        self.notify_all(CPUStep(self, instr_addr, instr_word, instr))
+        if self.subscribers[CPUStep]:
+            self.notify_all(CPUStep(self, instr_addr, instr_word, instr))
 
         # Execute
-        predicate = instr.cond
-        if predicate & self.condition:
-            log.debug("Predicate passed")
-            opcode = instr.op
-            # Add code below: Set target, left, and right appropriately
-            target = self.registers[instr.reg_target]
-            left = self.registers[instr.reg_src1].get()
-            right = self.registers[instr.reg_src2].get() + instr.offset
-            # Step program counter after forming operands but before
-            # storing execution result
-            self.pc.put(self.pc.get() + 1)
-            # Now a store into PC will overwrite the stepped value
-            result, cc = self.alu.exec(opcode, left, right)
-            self.condition = cc
-            # Load and store are special
-            if opcode == OpCode.LOAD:
-                memval = self.memory.get(result)
-                target.put(memval)
-            elif opcode == OpCode.STORE:
-                self.memory.put(result,target.get())
-            elif opcode == OpCode.HALT:
-                self.halted = True
+        profile = self.profile
+        journal = self.journal
+        if journal is not None:
+            journal.begin(instr_addr, self.condition, instr.reg_target,
+                          self.registers[instr.reg_target].get())
+        try:
+            predicate = instr.cond
+            if predicate & self.condition:
+                log.debug("Predicate passed")
+                opcode = instr.op
+                # Add code below: Set target, left, and right appropriately
+                target = self.registers[instr.reg_target]
+                left = self.registers[instr.reg_src1].get()
+                right = self.registers[instr.reg_src2].get() + instr.offset
+                # Step program counter after forming operands but before
+                # storing execution result
+                self.pc.put(self.pc.get() + 1)
+                # Now a store into PC will overwrite the stepped value
+                result, cc = self.alu.exec(opcode, left, right)
+                self.condition = cc
+                # Load and store are special
+                if opcode == OpCode.LOAD:
+                    if self.cache is not None:
+                        self.cache.access(result)
+                    memval = self.memory.get(result)
+                    if instr.increment:
+                        self._post_increment(instr.reg_src1, left)
+                    # If src1 is also the target, the loaded value wins
+                    target.put(memval)
+                    if profile is not None:
+                        profile.loads[result] += 1
+                elif opcode == OpCode.STORE:
+                    if self.cache is not None:
+                        self.cache.access(result, True)
+                    self.memory.put(result,target.get())
+                    if instr.increment:
+                        self._post_increment(instr.reg_src1, left)
+                    if profile is not None:
+                        profile.stores[result] += 1
+                elif opcode == OpCode.HALT:
+                    self.halted = True
+                elif opcode == OpCode.CMP:
+                    # Only the condition code changes
+                    pass
+                else:
+                    target.put(result)
+                if profile is not None:
+                    profile.count(instr_addr, predicate, True)
             else:
-                target.put(result)
-        else:
-            # The program counter still moves forward, with no
-            # other computation
-            log.debug("Predicated instruction will not execute")
-            self.pc.put(self.pc.get() + 1)
+                # The program counter still moves forward, with no
+                # other computation
+                log.debug("Predicated instruction will not execute")
+                self.pc.put(self.pc.get() + 1)
+                if profile is not None:
+                    profile.count(instr_addr, predicate, False)
+        finally:
+            # Memory changed after this (e.g., by a device or the
+            # debugger) is not part of the step
+            if journal is not None:
+                journal.end()
+
+    def _post_increment(self, reg: int, old_value: int) -> None:
+        """Add one to src1 after a post-increment LOAD or STORE.
+        old_value is what the instruction read, so for r15 this
+        leaves the program counter at the next instruction.
+        """
+        if self.journal is not None:
+            self.journal.incremented(reg, old_value)
+        self.registers[reg].put(old_value + 1)
+
+    def machine_state(self) -> dict:
+        """A summary of CPU state, e.g., for error reports"""
+        return {"pc": self.pc.get(),
+                "registers": [reg.get() for reg in self.registers],
+                "condition": str(self.condition),
+                "halted": self.halted,
+                "steps": self.step_count}
+
+    def snapshot(self) -> Snapshot:
+        """Capture the state of the CPU and its memory"""
+        return Snapshot(tuple(reg.get() for reg in self.registers),
+                        self.condition, self.halted, self.step_count,
+                        self.memory.snapshot())
 
-    def run(self, from_addr = 0, single_step = False) -> None:
-        """A loop that calls the step method repeatedly"""
+    def restore(self, snapshot: Snapshot) -> None:
+        """Return the CPU and its memory to a captured state.
+        To continue execution from there, cpu.run(cpu.pc.get()).
+        """
+        self.memory.restore(snapshot.memory)
+        for reg, value in zip(self.registers, snapshot.registers):
+            reg.put(value)
+        self.condition = snapshot.condition
+        self.halted = snapshot.halted
+        self.step_count = snapshot.step_count
+        # Steps journaled since the snapshot can't be undone from here
+        if self.journal is not None:
+            self.journal.clear()
 
+    def start_journal(self, max_steps: int = 100000) -> UndoJournal:
+        """Keep an undo journal of the last max_steps steps,
+        so that step_back can undo them.
+        """
+        self.journal = UndoJournal(max_steps)
+        self.memory.journal = self.journal
+        return self.journal
+
+    def stop_journal(self) -> None:
+        self.journal = None
+        self.memory.journal = None
+
+    def step_back(self, n: int = 1) -> int:
+        """Undo the last n steps, or as many as the journal
+        holds.  Returns the number of steps undone.
+        """
+        journal = self.journal
+        if journal is None:
+            raise ValueError("No undo journal; use start_journal")
+        undone = 0
+        # Restoring memory must not itself be journaled
+        self.memory.journal = None
+        try:
+            while undone < n and len(journal) > 0:
+                entry = journal.pop()
+                if entry[ADDR] is not None:
+                    self.memory.load_words([entry[OLD_WORD]], entry[ADDR])
+                if entry[INC_REG] is not None:
+                    self.registers[entry[INC_REG]].put(entry[OLD_INC])
+                self.registers[entry[TARGET]].put(entry[OLD_TARGET])
+                self.pc.put(entry[PC])
+                self.condition = entry[CONDITION]
+                undone += 1
+        finally:
+            self.memory.journal = journal
+        if undone:
+            self.halted = False
+            self.step_count = max(0, self.step_count - undone)
+        return undone
+
+    def _stuck_state(self) -> tuple:
+        """What must repeat for a jump-to-self to be a loop"""
+        return tuple(reg.get() for reg in self.registers) + (self.condition,)
+
+    def run(self, from_addr = 0, single_step = False,
+            max_steps: int = None, time_limit: float = None,
+            detect_loops: bool = False) -> None:
+        """A loop that calls the step method repeatedly.
+        For unattended runs, raises StepLimitExceeded after
+        max_steps steps, TimeLimitExceeded after time_limit
+        seconds, and (if detect_loops) InfiniteLoop when an
+        instruction jumps to itself leaving the registers and
+        condition code as they were the last time it did so.
+        """
         self.halted = False
         self.pc.put(from_addr)
-        step_count = 0
+        self.step_count = 0
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        stuck = None
 
         while not self.halted:
+            if max_steps is not None and self.step_count >= max_steps:
+                raise StepLimitExceeded("No HALT after {} steps".format(max_steps),
+                                        self.machine_state())
+            if (deadline is not None and self.step_count % TIME_CHECK_INTERVAL == 0
+                    and time.monotonic() > deadline):
+                raise TimeLimitExceeded("No HALT after {} seconds".format(time_limit),
+                                        self.machine_state())
+            instr_addr = self.pc.get()
             self.step()
-            step_count += 1
+            self.step_count += 1
+
+            if detect_loops:
+                if self.pc.get() == instr_addr and not self.halted:
+                    state = self._stuck_state()
+                    if state == stuck:
+                        raise InfiniteLoop("Jump to self at {}".format(instr_addr),
+                                           self.machine_state())
+                    stuck = state
+                else:
+                    stuck = None
 
             if single_step:
-                input("Step {}; press enter".format(step_count))
+                self._pause()
+
+    def _pause(self) -> None:
+        """Wait for enter in single-step mode.  With an undo
+        journal, 'b' steps back one step and 'b n' n steps.
+        """
+        if self.journal is None:
+            input("Step {}; press enter".format(self.step_count))
+            return
+        while True:
+            reply = input("Step {}; press enter, or b [n] to step back ".format(
+                self.step_count)).split()
+            if not reply or reply[0] != "b":
+                return
+            n = int(reply[1]) if len(reply) > 1 and reply[1].isdigit() else 1
+            undone = self.step_back(n)
+            print("Back {} to pc={} registers={} condition={}".format(
+                undone, self.pc.get(),
+                [reg.get() for reg in self.registers], self.condition))
+
+    def _unobserved(self) -> bool:
+        """True if nobody wants the events the fast engines
+        don't produce (CPUStep, and MemoryRead from memory), and
+        no profile or undo journal is being kept.  Listeners that
+        want only MemoryWrite, such as the decode cache, still
+        hear about every store.
+        """
+        if self.profile is not None or self.journal is not None:
+            return False
+        return not self.subscribers[CPUStep] and not self.memory.subscribers[MemoryRead]
+
+    def _data_ports(self) -> tuple:
+        """Load and store functions, without events, for the
+        execution engines that keep registers in a list:
+        load(addr) is a word (cut to 32 bits in wrap mode), and
+        store(addr, value) writes one.  Both go through the
+        cache simulator, if there is one.
+        """
+        peek = self.memory.peek
+        if self.wrap:
+            load = lambda addr: wrap_word(peek(addr))
+        else:
+            load = peek
+        store = self.memory.put
+        if self.cache is not None:
+            load, store = self.cache.wrap(load, store)
+        return load, store
+
+    def run_fast(self, from_addr: int = 0, max_steps: int = None,
+                 time_limit: float = None, detect_loops: bool = False) -> None:
+        """Headless execution:  the same machine semantics as run,
+        but in a single loop that builds no CPUStep or MemoryRead
+        events, does no debug logging, and keeps register values
+        in a plain list rather than Register objects.  The CPU
+        state is written back when the loop ends.  If anything
+        wants those events, or we are profiling, we fall back to
+        run, so that nothing is missed.  (Stores still go through
+        memory.put, so MemoryWrite listeners hear of each one.)
+        Limits are as for run.
+        """
+        if not self._unobserved():
+            self.run(from_addr, max_steps=max_steps, time_limit=time_limit,
+                     detect_loops=detect_loops)
+            return
+
+        fetch = self.memory.peek
+        load, store = self._data_ports()
+        wrap = self.wrap
+        alu_exec = self.alu.exec_int
+        unpack = LAYOUT.unpack
+        # Decoded instruction fields by address.  Each entry
+        # holds the word it was decoded from, so a store over
+        # an instruction is noticed when it is next fetched,
+        # and the register a LOAD or STORE post-increments (or 0).
+        decoded = {}
+
+        regs = [reg.get() for reg in self.registers]
+        condition = self.condition.value
+        pc = from_addr
+        steps = 0
+        halted = False
+        # Limits are checked only when steps reaches next_check,
+        # so an unlimited run pays one comparison per step
+        limit = sys.maxsize if max_steps is None else max_steps
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        next_check = limit if deadline is None else min(limit, TIME_CHECK_INTERVAL)
+        stopped = None
+        stuck = None
+        stuck_step = -1
+        try:
+            while not halted:
+                if steps >= next_check:
+                    if steps >= limit:
+                        stopped = StepLimitExceeded("No HALT after {} steps".format(max_steps))
+                        break
+                    if time.monotonic() > deadline:
+                        stopped = TimeLimitExceeded("No HALT after {} seconds".format(time_limit))
+                        break
+                    next_check = min(limit, steps + TIME_CHECK_INTERVAL)
+                word = fetch(pc)
+                fields = decoded.get(pc)
+                if fields is None or fields[0] != word:
+                    fields = unpack(word)
+                    # OpCode raises ValueError for a word that is not an instruction
+                    OpCode(fields[0])
+                    inc = 0
+                    if word & INCREMENT_BIT and fields[0] in (OP_LOAD, OP_STORE):
+                        # r0 can't change, and r15 is already stepped
+                        inc = fields[3] if fields[3] != 15 else 0
+                    fields = (word,) + fields + (inc,)
+                    decoded[pc] = fields
+                _, op, predicate, target, src1, src2, offset, inc = fields
+                if predicate & condition:
+                    regs[15] = pc
+                    left = regs[src1]
+                    right = regs[src2] + offset
+                    pc += 1
+                    result, condition = alu_exec(op, left, right)
+                    if op == OP_LOAD:
+                        result = load(result)
+                        if inc:
+                            regs[inc] = wrap_word(left + 1) if wrap else left + 1
+                    elif op == OP_STORE:
+                        store(result, pc if target == 15 else regs[target])
+                        target = 0
+                        if inc:
+                            regs[inc] = wrap_word(left + 1) if wrap else left + 1
+                    elif op == OP_HALT:
+                        halted = True
+                        target = 0
+                    elif op == OP_CMP:
+                        target = 0
+                    if target == 15:
+                        if detect_loops and result == pc - 1:
+                            # Stuck only if the previous step was the same jump
+                            state = tuple(regs) + (condition,)
+                            if state == stuck and stuck_step == steps - 1:
+                                stopped = InfiniteLoop("Jump to self at {}".format(result))
+                                pc = result
+                                steps += 1
+                                break
+                            stuck = state
+                            stuck_step = steps
+                        pc = result
+                    elif target:
+                        regs[target] = result
+                else:
+                    pc += 1
+                steps += 1
+        finally:
+            regs[15] = pc
+            for reg, value in zip(self.registers, regs):
+                reg.put(value)
+            self.condition = CondFlag(condition)
+            self.halted = halted
+            self.step_count = steps
+        if stopped is not None:
+            stopped.state = self.machine_state()
+            raise stopped
 
 
 # Create a class CPU, subclassing MVCListenable.
@@ -0,0 +1,272 @@
+"""
+Buffered input and output devices for the memory-mapped
+I/O addresses of the Duck Machine.
+
+The console hooks in duck_machine.py prompt for every input
+and print every output, so a program that does a lot of I/O
+runs at the speed of the terminal.  The devices here move that
+work off the CPU's path:  an asyncio event loop, running in its
+own thread, reads input ahead into a buffer and writes output
+in batches, while the CPU only touches the buffers.  A load from
+the input address stalls only if the buffer is actually empty.
+
+Input is integers separated by white space; output is one
+integer per line.  A device may be backed by a file or pipe
+(any binary file object; it is read and written by helper
+threads, so blocking is fine) or by a connected socket, e.g.,
+one end of a socket.socketpair().
+
+    loop = DeviceLoop()
+    source = InputDevice(loop, open("inputs.txt", "rb"))
+    sink = OutputDevice(loop, sys.stdout.buffer)
+    mem.map_address_in(510, source.read)
+    mem.map_address_out(511, sink.write)
+    ...
+    source.close()
+    sink.close()
+    loop.close()
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import socket
+import threading
+
+from typing import BinaryIO, Union
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Stop reading ahead when this many input values are waiting
+INPUT_HIGH_WATER = 4096
+# Values written per batch
+OUTPUT_BATCH = 256
+# Bytes per read from a file or socket
+CHUNK_SIZE = 1 << 16
+
+
+class EndOfInput(Exception):
+    """The program read past the end of its input"""
+    pass
+
+
+class DeviceLoop(object):
+    """An asyncio event loop running in a daemon thread,
+    shared by any number of devices.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        name="duck devices", daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        """Start a coroutine on the loop, from any thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call(self, fn, *args) -> None:
+        """Call fn(*args) in the loop's thread"""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def close(self) -> None:
+        """Cancel whatever the devices are still doing, and stop"""
+        self.submit(_cancel_all()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+async def _cancel_all() -> None:
+    tasks = [task for task in asyncio.all_tasks()
+             if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def in_thread(fn, *args):
+    """Await fn(*args), run in a new daemon thread.  Unlike
+    run_in_executor, a read that never returns (e.g., from a
+    terminal nobody types into) can't keep the program from
+    exiting.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result, error) -> None:
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def work() -> None:
+        result, error = None, None
+        try:
+            result = fn(*args)
+        except Exception as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(settle, result, error)
+        except RuntimeError:
+            # The loop was closed while we were blocked
+            pass
+
+    threading.Thread(target=work, daemon=True).start()
+    return await future
+
+
+async def _read_chunk(stream) -> bytes:
+    """Next chunk from a file object or asyncio StreamReader"""
+    if isinstance(stream, asyncio.StreamReader):
+        return await stream.read(CHUNK_SIZE)
+    return await in_thread(_read_some, stream)
+
+
+def _read_some(file: BinaryIO) -> bytes:
+    """Read what is available (for pipes) up to CHUNK_SIZE"""
+    read = getattr(file, "read1", file.read)
+    return read(CHUNK_SIZE)
+
+
+class InputDevice(object):
+    """Integers read ahead from source into a buffer.  Map
+    read at the input address.
+    """
+
+    def __init__(self, loop: DeviceLoop, source: Union[BinaryIO, socket.socket]) -> None:
+        self._loop = loop
+        self._source = source
+        self._values = collections.deque()
+        self._ready = threading.Condition()
+        self._eof = False
+        self._error = None
+        # Set (in the loop thread) when there is room to read more
+        self._room = None   # type: asyncio.Event
+        self.stalls = 0
+        self._task = loop.submit(self._fill())
+
+    async def _fill(self) -> None:
+        """Read, parse, and buffer integers until end of input"""
+        self._room = asyncio.Event()
+        self._room.set()
+        stream = self._source
+        if isinstance(stream, socket.socket):
+            stream, _ = await asyncio.open_connection(sock=stream)
+        partial = b""
+        try:
+            while True:
+                await self._room.wait()
+                chunk = await _read_chunk(stream)
+                if not chunk:
+                    break
+                fields = (partial + chunk).split()
+                # A number may continue in the next chunk
+                if not chunk[-1:].isspace():
+                    partial = fields.pop() if fields else b""
+                else:
+                    partial = b""
+                values = [int(field) for field in fields]
+                with self._ready:
+                    self._values.extend(values)
+                    if len(self._values) >= INPUT_HIGH_WATER:
+                        self._room.clear()
+                    self._ready.notify_all()
+            if partial:
+                with self._ready:
+                    self._values.append(int(partial))
+        except Exception as e:
+            self._error = e
+        finally:
+            with self._ready:
+                self._eof = True
+                self._ready.notify_all()
+
+    def read(self, addr: int) -> int:
+        """Hook for the input address:  the next integer,
+        waiting only if none has been read ahead.
+        """
+        with self._ready:
+            if not self._values and not self._eof:
+                self.stalls += 1
+                while not self._values and not self._eof:
+                    self._ready.wait()
+            if not self._values:
+                if self._error is not None:
+                    raise EndOfInput("Input failed: {}".format(self._error))
+                raise EndOfInput("End of input")
+            value = self._values.popleft()
+            if len(self._values) == INPUT_HIGH_WATER // 2:
+                self._loop.call(self._room.set)
+            return value
+
+    def close(self) -> None:
+        """Stop reading ahead"""
+        self._task.cancel()
+
+
+class OutputDevice(object):
+    """Integers buffered and written to sink in batches of
+    batch_size.  Map write at the output address, and call
+    close (or flush) when the program is done.
+    """
+
+    def __init__(self, loop: DeviceLoop, sink: Union[BinaryIO, socket.socket],
+                 batch_size: int = OUTPUT_BATCH) -> None:
+        self._loop = loop
+        self._sink = sink
+        self.batch_size = batch_size
+        self._pending = []
+        self._queue = None   # type: asyncio.Queue
+        self._queue_ready = threading.Event()
+        self._task = loop.submit(self._drain())
+        self._queue_ready.wait()
+
+    async def _drain(self) -> None:
+        """Write batches, in order, until None is queued"""
+        self._queue = asyncio.Queue()
+        self._queue_ready.set()
+        writer = None
+        if isinstance(self._sink, socket.socket):
+            _, writer = await asyncio.open_connection(sock=self._sink)
+        while True:
+            data = await self._queue.get()
+            if data is None:
+                break
+            if writer is not None:
+                writer.write(data)
+                await writer.drain()
+            else:
+                await in_thread(self._write_file, data)
+        if writer is not None:
+            writer.close()
+            await writer.wait_closed()
+
+    def _write_file(self, data: bytes) -> None:
+        self._sink.write(data)
+        self._sink.flush()
+
+    def write(self, addr: int, value: int) -> None:
+        """Hook for the output address"""
+        self._pending.append(value)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand buffered output to the writer (without waiting)"""
+        if not self._pending:
+            return
+        data = "".join("{}\n".format(value) for value in self._pending).encode()
+        self._pending = []
+        self._loop.call(self._queue.put_nowait, data)
+
+    def close(self) -> None:
+        """Flush and wait until everything is written"""
+        self.flush()
+        self._loop.call(self._queue.put_nowait, None)
+        self._task.result()
@@ -0,0 +1,387 @@
+"""
+Static disassembler for Duck Machine object code:  from an
+object file back to annotated assembly code, basic blocks, and
+a control-flow graph, without running the program.
+
+Starting at the entry point, the disassembler follows control
+flow as the CPU would.  A write to r15 is a jump; its target is
+known when it is computed from r0, r15, and the offset, as in
+the assembler's JUMP (ADD r15,r0,r15[d], i.e., to this address
+plus d), or loaded from a known address.  A jump through any
+other register goes somewhere we can't tell, marked '?'.  Words
+that are never reached are data, or dead code if they look like
+instructions.
+
+    python3 duck_machine.py disasm programs/max.obj
+    python3 duck_machine.py disasm programs/max.obj --dot max.dot
+    dot -Tpdf max.dot > max.pdf
+
+The listing can be assembled again (with assembler_pass2) to the
+same 32-bit words.  A reached word that the assembler has no way
+to write (a predicate like /MZ that has no name, or an operation
+other than LOAD or STORE with the post-increment bit set) is
+listed as DATA, with what it does in the comment.
+
+Each word of the image is decoded once, all at once with
+decode_many if NumPy is available, so images of hundreds of
+thousands of words take a fraction of a second.
+"""
+
+from alu import ALU
+from instr_format import (OpCode, CondFlag, LAYOUT, decode_many,
+                          is_instruction, np)
+import objfile
+
+import argparse
+import io
+import sys
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+PC = 15
+ALWAYS = CondFlag.ALWAYS.value
+NEVER = 0
+OP_HALT = OpCode.HALT.value
+OP_LOAD = OpCode.LOAD.value
+OP_STORE = OpCode.STORE.value
+OP_CMP = OpCode.CMP.value
+VALID_OPS = frozenset(op.value for op in OpCode)
+# For formatting instructions as Instruction.__str__ does,
+# without building an Instruction for every word
+OP_NAMES = {op.value: op.name for op in OpCode}
+# (except that NEVER, which str leaves blank, is spelled out)
+COND_SUFFIXES = ["" if cond == ALWAYS else "/NEVER" if cond == NEVER
+                 else "/{}".format(CondFlag(cond)) for cond in range(16)]
+# Operations that write r15 when it is their target
+NOT_JUMPS = frozenset([OP_STORE, OP_CMP, OP_HALT])
+# Predicates the assembler can write, i.e., those with names
+NAMED_CONDS = frozenset(flag.value for flag in CondFlag.__members__.values())
+
+
+def decode_fields(words: Sequence[int]) -> Tuple[list, ...]:
+    """Lists of op, cond, target, src1, src2, offset, and
+    increment for every word, and whether it has a valid
+    operation code
+    """
+    if np is not None and len(words):
+        decoded = decode_many(words)
+        columns = tuple(decoded[name].tolist() for name in
+                        ["op", "cond", "target", "src1", "src2", "offset", "increment"])
+        return columns + (is_instruction(decoded).tolist(),)
+    unpack = LAYOUT.unpack
+    columns = tuple(list(column) for column in zip(*[unpack(word) for word in words])) \
+        if len(words) else ([], [], [], [], [], [])
+    increment = [(word >> 31) & 1 == 1 for word in words]
+    return columns + (increment, [op in VALID_OPS for op in columns[0]])
+
+
+class BasicBlock(object):
+    """Instructions at addresses start up to end, entered only
+    at start and left only after the last.  successors are the
+    addresses of the blocks control may go to next; indirect is
+    True if it may also go somewhere we can't tell statically.
+    """
+
+    def __init__(self, start: int, end: int) -> None:
+        self.start = start
+        self.end = end
+        self.successors = []   # type: List[int]
+        self.indirect = False
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return "BasicBlock({}, {})".format(self.start, self.end)
+
+
+class ControlFlowGraph(object):
+    """Basic blocks of the code reachable from entry in words
+    (an object image), keyed by starting address.  symbols (name
+    to address, as in a binary object file) name labels in the
+    listing; other blocks are labeled by address.
+    """
+
+    def __init__(self, words: Sequence[int], entry: int = 0,
+                 symbols: Dict[str, int] = None) -> None:
+        self.words = list(words)
+        self.entry = entry
+        (self._op, self._cond, self._target, self._src1, self._src2,
+         self._offset, self._increment, self._valid) = decode_fields(self.words)
+        self._alu = ALU()
+        # Statically known jump targets, by address of the jump
+        self.jumps = {}           # type: Dict[int, int]
+        # Reached addresses that don't hold an instruction
+        self.bad = set()
+        self.reached = bytearray(len(self.words))
+        self._leaders = set()
+        self._explore()
+        self.blocks = self._build_blocks()   # type: Dict[int, BasicBlock]
+        self.labels = {}          # type: Dict[int, str]
+        for name, addr in sorted((symbols or {}).items(), key=lambda item: item[1]):
+            self.labels.setdefault(addr, name)
+        for start in self.blocks:
+            self.labels.setdefault(start, "L{}".format(start))
+
+    def _value(self, reg: int, addr: int) -> Optional[int]:
+        """Static value of a register operand of the instruction
+        at addr:  r0 is 0 and r15 is addr; others are unknown
+        """
+        if reg == 0:
+            return 0
+        if reg == PC:
+            return addr
+        return None
+
+    def _result(self, addr: int) -> Optional[int]:
+        """Result of the ALU for the instruction at addr (for a
+        LOAD or STORE, the memory address), if static
+        """
+        left = self._value(self._src1[addr], addr)
+        right = self._value(self._src2[addr], addr)
+        if left is None or right is None:
+            return None
+        result, _ = self._alu.exec_int(self._op[addr], left, right + self._offset[addr])
+        return result
+
+    def _jump_target(self, addr: int) -> Optional[int]:
+        """Where the instruction at addr, which writes r15, sends
+        control, if we can tell
+        """
+        result = self._result(addr)
+        if result is None or self._op[addr] != OP_LOAD:
+            return result
+        if 0 <= result < len(self.words):
+            return self.words[result]
+        return None
+
+    def instruction_text(self, addr: int) -> str:
+        """The word at addr as assembly code, e.g., ADD/P r15,r0,r15[-2]
+        (like str(decode(word)), much faster).  Only LOAD and STORE
+        look at the post-increment bit, so only they show it.
+        """
+        op = self._op[addr]
+        return "{}{:4}  r{},r{}{},r{}[{}]".format(
+            OP_NAMES[op], COND_SUFFIXES[self._cond[addr]],
+            self._target[addr], self._src1[addr],
+            "+" if self._increment[addr] and op in (OP_LOAD, OP_STORE) else "",
+            self._src2[addr], self._offset[addr])
+
+    def writable(self, addr: int) -> bool:
+        """The word at addr is an instruction the assembler can
+        write, so that it assembles back to the same word
+        """
+        return (self._valid[addr] and self._cond[addr] in NAMED_CONDS
+                and (not self._increment[addr] or self._op[addr] in (OP_LOAD, OP_STORE)))
+
+    def _ends_block(self, addr: int) -> bool:
+        """Control may not simply go on to addr + 1"""
+        if addr in self.bad:
+            return True
+        op = self._op[addr]
+        if self._cond[addr] == NEVER:
+            return False
+        return op == OP_HALT or (self._target[addr] == PC and op not in NOT_JUMPS)
+
+    def _explore(self) -> None:
+        """Mark every address reachable from the entry point"""
+        size = len(self.words)
+        op, cond, target, valid = self._op, self._cond, self._target, self._valid
+        reached = self.reached
+        work = [self.entry]
+        self._leaders.add(self.entry)
+
+        def follow(to: int) -> None:
+            if 0 <= to < size:
+                self._leaders.add(to)
+                if not reached[to]:
+                    work.append(to)
+
+        while work:
+            addr = work.pop()
+            while 0 <= addr < size and not reached[addr]:
+                reached[addr] = 1
+                if not valid[addr]:
+                    self.bad.add(addr)
+                    break
+                if cond[addr] != NEVER:
+                    if target[addr] == PC and op[addr] not in NOT_JUMPS:
+                        to = self._jump_target(addr)
+                        if to is not None:
+                            self.jumps[addr] = to
+                            follow(to)
+                        if cond[addr] == ALWAYS:
+                            break
+                        self._leaders.add(addr + 1)
+                    elif op[addr] == OP_HALT:
+                        if cond[addr] == ALWAYS:
+                            break
+                        self._leaders.add(addr + 1)
+                addr += 1
+
+    def _build_blocks(self) -> Dict[int, BasicBlock]:
+        """Split the reached addresses into blocks, and link them"""
+        blocks = {}
+        reached = self.reached
+        size = len(self.words)
+        block = None
+        for addr in range(size):
+            if not reached[addr]:
+                block = None
+                continue
+            if block is None or addr in self._leaders:
+                block = BasicBlock(addr, addr + 1)
+                blocks[addr] = block
+            block.end = addr + 1
+            if self._ends_block(addr):
+                block = None
+        for block in blocks.values():
+            last = block.end - 1
+            after = block.end if block.end < size and reached[block.end] else None
+            if last in self.bad:
+                continue
+            if self._cond[last] != NEVER and self._target[last] == PC \
+                    and self._op[last] not in NOT_JUMPS:
+                to = self.jumps.get(last)
+                if to is None or not 0 <= to < size:
+                    block.indirect = True
+                else:
+                    block.successors.append(to)
+                if self._cond[last] != ALWAYS and after is not None:
+                    block.successors.append(after)
+            elif self._op[last] == OP_HALT and self._cond[last] == ALWAYS:
+                pass
+            elif after is not None:
+                block.successors.append(after)
+        return blocks
+
+    def unreached(self) -> List[int]:
+        """Addresses never reached that hold words that look like
+        instructions (not HALT or a predicate that never passes,
+        which is what small data values look like):  dead code,
+        or data that happens to decode
+        """
+        return [addr for addr in range(len(self.words))
+                if not self.reached[addr] and self._valid[addr]
+                and self._cond[addr] != NEVER and self._op[addr] != OP_HALT]
+
+    def _comment(self, addr: int) -> str:
+        notes = [str(addr)]
+        if addr in self.jumps:
+            to = self.jumps[addr]
+            notes.append("-> {}".format(self.labels.get(to, to)))
+        elif self.reached[addr] and self._ends_block(addr) and addr not in self.bad \
+                and self._op[addr] != OP_HALT:
+            notes.append("-> ?")
+        if addr in self.bad:
+            notes.append("reached, but not an instruction")
+        return "# " + " ".join(notes)
+
+    def listing(self) -> List[str]:
+        """Assembly code for every word of the image, with
+        labels at block starts and each address and jump target
+        in a comment
+        """
+        lines = []
+        dead = set(self.unreached())
+        for addr, word in enumerate(self.words):
+            if addr in self.labels:
+                lines.append("{}:".format(self.labels[addr]))
+            comment = self._comment(addr)
+            if self.reached[addr] and addr not in self.bad:
+                if self.writable(addr):
+                    text = self.instruction_text(addr)
+                else:
+                    text = "DATA {}".format(word)
+                    comment += " executes as: {}".format(self.instruction_text(addr))
+            else:
+                text = "DATA {}".format(word)
+                if addr in dead:
+                    comment += " unreached: {}".format(self.instruction_text(addr))
+            lines.append("   {:30} {}".format(text, comment))
+        return lines
+
+    def dot(self, name: str = "duck") -> str:
+        """The graph in Graphviz DOT, one box per block.  Jumps
+        are solid edges, falling through to the next block is
+        dashed, and a jump to an unknown target goes to '?'.
+        """
+        lines = ["digraph {} {{".format(_dot_id(name)),
+                 '  node [shape=box, fontname="monospace"];']
+        indirect = False
+        for start, block in sorted(self.blocks.items()):
+            text = ["{}:".format(self.labels[start])]
+            for addr in range(block.start, block.end):
+                if addr in self.bad:
+                    text.append("DATA {}".format(self.words[addr]))
+                else:
+                    text.append(self.instruction_text(addr))
+            label = "".join(_dot_escape(line) + "\\l" for line in text)
+            lines.append('  {} [label="{}"];'.format(_dot_id(self.labels[start]), label))
+            # The first edge to the jump target is the jump
+            jump_to = self.jumps.get(block.end - 1)
+            for to in block.successors:
+                style = "" if to == jump_to else " [style=dashed]"
+                if to == jump_to:
+                    jump_to = None
+                lines.append("  {} -> {}{};".format(
+                    _dot_id(self.labels[start]), _dot_id(self.labels[to]), style))
+            if block.indirect:
+                indirect = True
+                lines.append('  {} -> "?" [style=dotted];'.format(_dot_id(self.labels[start])))
+        if indirect:
+            lines.append('  "?" [shape=plaintext];')
+        lines.append("}")
+        return "\n".join(lines)
+
+
+def _dot_id(name: str) -> str:
+    return '"{}"'.format(_dot_escape(name))
+
+
+def _dot_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def read_object(file: io.IOBase) -> Tuple[List[int], int, Dict[str, int]]:
+    """Words, entry point, and symbols of an object file (text,
+    or binary as in objfile.py), opened in binary mode
+    """
+    if objfile.is_binary(file):
+        with objfile.ObjectImage(file) as image:
+            return image.words.tolist(), image.entry, image.symbols
+    return [int(line) for line in file if line.strip()], 0, {}
+
+
+def cli(argv: List[str]) -> object:
+    """Get arguments from command line"""
+    parser = argparse.ArgumentParser(prog="duck_machine.py disasm",
+                                     description="Duck Machine disassembler")
+    parser.add_argument("objfile", type=argparse.FileType('rb'),
+                        help="Object file (text or binary)")
+    parser.add_argument("-o", "--output", type=argparse.FileType('w'),
+                        default=sys.stdout, help="Annotated assembly code")
+    parser.add_argument("--dot", type=argparse.FileType('w'), default=None,
+                        help="Write the control-flow graph in Graphviz DOT to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]):
+    args = cli(argv)
+    words, entry, symbols = read_object(args.objfile)
+    graph = ControlFlowGraph(words, entry, symbols)
+    print("\n".join(graph.listing()), file=args.output)
+    if args.dot:
+        print(graph.dot(), file=args.dot)
+    log.info("{} words, {} blocks, {} unreached instructions".format(
+        len(words), len(graph.blocks), len(graph.unreached())))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
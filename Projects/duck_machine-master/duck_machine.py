@@ -5,13 +5,20 @@ a simulated computer.
 Interprets Duck Machine object code. 
 """
 
-from memory import Memory, MemoryMappedIO
-from cpu import CPU
-
-import view
+from memory import (Memory, MemoryMappedIO, CompactMemoryMappedIO, PagedMemory,
+                    PagedMemoryMappedIO, PAGE_SIZE)
+from cpu import CPU, ExecutionLimit
+from multicore import MultiCore
+from devices import DeviceLoop, InputDevice, OutputDevice
+from profiler import Profile
+from pipeline import PipelineModel
+from cache import parse_spec
+from tracefile import TraceRecorder
+import objfile
 
 import argparse
 import io
+import sys
 
 import logging
 
@@ -19,26 +26,105 @@ logging.basicConfig()
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
+# Words of memory, unless --memory gives more
+MEMORY_SIZE = 512
+
 
 def cli() -> object:
     """Get arguments from command line"""
     parser = argparse.ArgumentParser(description="Duck Machine Simulator")
-    parser.add_argument("objfile", type=argparse.FileType('r'),
-                        help="Object file input")
+    parser.add_argument("objfile", type=argparse.FileType('rb'),
+                        help="Object file input (text or binary)")
     parser.add_argument("-d", "--display", help="Graphical display",
                         action="store_true")
+    parser.add_argument("--fps", type=float, default=None,
+                        help="With --display, repaint at most this many times a second")
     parser.add_argument("-s", "--step", help="Single step mode",
                         action="store_true")
+    parser.add_argument("-c", "--compact", help="Array-backed 32-bit memory",
+                        action="store_true")
+    parser.add_argument("-w", "--wrap", action="store_true",
+                        help="Strict 32-bit words: arithmetic wraps around and sets V "
+                             "on overflow (implies --compact)")
+    parser.add_argument("--memory", type=int, default=None, metavar="WORDS",
+                        help="Memory of this many words instead of 512, allocated "
+                             "as the program touches it (all at once with --compact)")
+    parser.add_argument("-f", "--fast", help="Headless mode: no display, no events",
+                        action="store_true")
+    parser.add_argument("--cores", type=int, default=1,
+                        help="Number of CPU cores sharing memory (see multicore.py)")
+    parser.add_argument("--threads", action="store_true",
+                        help="With --cores, run each core in its own thread")
+    parser.add_argument("-i", "--input", type=argparse.FileType('rb'), default=None,
+                        help="Read input integers from this file ('-' for stdin) "
+                             "instead of prompting")
+    parser.add_argument("-o", "--output", type=argparse.FileType('wb'), default=None,
+                        help="Write output integers, one per line, to this file "
+                             "('-' for stdout)")
+    parser.add_argument("--max-steps", type=int, default=None,
+                        help="Stop after this many steps")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Stop after this many seconds")
+    parser.add_argument("--detect-loops", action="store_true",
+                        help="Stop at an instruction that jumps to itself forever")
+    parser.add_argument("--history", type=int, default=None, metavar="STEPS",
+                        help="Keep an undo journal of this many steps (b to step back in --step mode)")
+    parser.add_argument("-t", "--trace", type=argparse.FileType('wb'), default=None,
+                        help="Record an execution trace to this file (see tracefile.py)")
+    parser.add_argument("-p", "--profile", action="store_true",
+                        help="Print execution counts when the program stops")
+    parser.add_argument("--source", type=argparse.FileType('r'), default=None,
+                        help="Assembly source (.asm or .dasm) to annotate with --profile")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Count cycles on a five-stage pipeline (see pipeline.py)")
+    parser.add_argument("--mem-latency", type=int, default=1, metavar="CYCLES",
+                        help="With --pipeline, cycles per load or store")
+    parser.add_argument("--cache", default=None, metavar="SIZE[,WAYS[,LINE[,wt]]]",
+                        help="Simulate a data cache and print hit and miss counts "
+                             "(see cache.py); with --source, by label")
     args = parser.parse_args()
+    if args.fast and (args.display or args.step or args.trace or args.pipeline):
+        parser.error("--fast cannot be combined with --display, --step, --trace, or --pipeline")
+    if args.cores > 1 and (args.display or args.step or args.trace
+                           or args.profile or args.history or args.pipeline or args.cache):
+        parser.error("--cores cannot be combined with --display, --step, --trace, --profile, "
+                     "--history, --pipeline, or --cache")
+    if args.memory is not None and args.memory < MEMORY_SIZE:
+        parser.error("--memory must be at least {} words".format(MEMORY_SIZE))
+    if args.mem_latency != 1 and not args.pipeline:
+        parser.error("--mem-latency is only used with --pipeline")
+    if args.mem_latency < 1:
+        parser.error("--mem-latency must be at least 1")
+    if args.threads and args.cores < 2:
+        parser.error("--threads is only used with --cores")
+    if args.fps is not None and (args.step or not args.display):
+        parser.error("--fps is only used with --display, and not with --step")
+    if args.fps is not None and args.fps <= 0:
+        parser.error("--fps must be positive")
+    if args.source and not (args.profile or args.cache):
+        parser.error("--source is only used with --profile or --cache")
+    if args.cache:
+        try:
+            parse_spec(args.cache)
+        except ValueError as e:
+            parser.error(str(e))
     return args
 
 
-def load(file: io.IOBase, memory: Memory) -> None:
-    addr = 0
-    for line in file:
-        word = int(line)
-        memory.put(addr, word)
-        addr += 1
+def load(file: io.IOBase, memory: Memory) -> int:
+    """Load object code starting at address 0, and return
+    the entry point.  A binary object file (see objfile.py)
+    is mapped and copied into memory in one step; otherwise
+    the file has one integer per line, and the entry point
+    is address 0.  The file should be opened in binary mode.
+    """
+    if objfile.is_binary(file):
+        with objfile.ObjectImage(file) as image:
+            memory.load_words(image.words)
+            return image.entry
+    words = [int(line) for line in file]
+    memory.load_words(words)
+    return 0
 
 
 def duck_out(addr: int, value: int) -> None:
@@ -49,27 +135,161 @@ def duck_in(addr: int) -> int:
     return int(input("Quack! Gimme an int! "))
 
 
+def report_profile(cpu: CPU, memory: Memory, source_lines: list = None) -> None:
+    """Print the annotated listing, if we were profiling"""
+    if cpu.profile is None:
+        return
+    print("\n".join(cpu.profile.listing(memory, source_lines)))
+
+
+def report_memory(mem: Memory) -> None:
+    """Print how much of a paged memory the program touched"""
+    if isinstance(mem, PagedMemory):
+        pages = (mem.capacity + PAGE_SIZE - 1) // PAGE_SIZE
+        print("Memory: {} of {} pages of {} words resident".format(
+            mem.resident_pages(), pages, PAGE_SIZE))
+
+
+def report_cache(cpu: CPU, source_lines: list = None) -> None:
+    """Print hit and miss counts, if we were simulating a cache"""
+    if cpu.cache is None:
+        return
+    cpu.cache.flush()
+    print("\n".join(cpu.cache.report(source_lines)))
+
+
+def report_pipeline(model: PipelineModel) -> None:
+    """Print the cycle count, if we were modeling the pipeline"""
+    if model is not None:
+        print("\n".join(model.report()))
+
+
+def connect_io(args, mem: MemoryMappedIO) -> list:
+    """Map input and output at 510 and 511:  the console, or
+    buffered devices if --input or --output was given.  Returns
+    the devices, to be closed when the program is done.
+    """
+    devices = []
+    if args.input or args.output:
+        loop = DeviceLoop()
+    if args.input:
+        source = InputDevice(loop, args.input)
+        mem.map_address_in(510, source.read)
+        devices.append(source)
+    else:
+        mem.map_address_in(510, duck_in)
+    if args.output:
+        sink = OutputDevice(loop, args.output)
+        mem.map_address_out(511, sink.write)
+        devices.append(sink)
+    else:
+        mem.map_address_out(511, duck_out)
+    if devices:
+        devices.append(loop)
+    return devices
+
+
+def run_multicore(args, mem: MemoryMappedIO) -> None:
+    """Several cores share memory, with I/O as in main and
+    the test-and-set lock at 509.
+    """
+    devices = connect_io(args, mem)
+    machine = MultiCore(mem, args.cores, wrap=args.wrap)
+    entry = load(args.objfile, mem)
+    try:
+        if args.threads:
+            machine.run_threaded(entry, fast=args.fast, max_steps=args.max_steps,
+                                 time_limit=args.timeout, detect_loops=args.detect_loops)
+        else:
+            machine.run_round_robin(entry, max_steps=args.max_steps)
+    except ExecutionLimit as e:
+        print("Stopped: {}".format(e))
+        print("Machine state: {}".format(e.state))
+        sys.exit(1)
+    finally:
+        for device in devices:
+            device.close()
+    print("Halted after {} steps".format(machine.step_count()))
+
+
 def main():
     """" Run a Duck Machine program from
     object code file.
     """
+    if sys.argv[1:2] == ["batch"]:
+        # Many runs of one program; see batch.py
+        import batch
+        batch.main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["disasm"]:
+        # Object code back to assembly code; see disasm.py
+        import disasm
+        disasm.main(sys.argv[2:])
+        return
     args = cli()
-    mem = MemoryMappedIO(512)
+    if args.compact or args.wrap:
+        mem = CompactMemoryMappedIO(args.memory or MEMORY_SIZE)
+    elif args.memory is not None:
+        mem = PagedMemoryMappedIO(args.memory)
+    else:
+        mem = MemoryMappedIO(MEMORY_SIZE)
+    if args.cores > 1:
+        run_multicore(args, mem)
+        return
     # We'd like to make it simple to trigger I/O with
     # a single instruction, so it would be good to fit
     # the memory mapped addresses into the offset field.
     # For that, maximum positive value is 511.  We'll
     # reserve addresses 510 and 511 for input and output
     # respectively.
-    mem.map_address_in(510, duck_in)
-    mem.map_address_out(511, duck_out)
-    cpu = CPU(mem)
+    devices = connect_io(args, mem)
+    cpu = CPU(mem, wrap=args.wrap)
     if args.display:
-        display = view.MachineStateView(cpu, 1500, 1000)
-    load(args.objfile, mem)
-    cpu.run(single_step=args.step)
+        # Imported only when needed, because it opens a window
+        import view
+        display = view.MachineStateView(cpu, 1500, 1000, fps=args.fps)
+    if args.profile:
+        cpu.profile = Profile()
+    if args.history:
+        cpu.start_journal(args.history)
+    pipeline = PipelineModel(cpu, args.mem_latency) if args.pipeline else None
+    if args.cache:
+        # Memory-mapped devices can't be cached
+        cpu.cache = parse_spec(args.cache, uncached=set(mem.hooks_read) | set(mem.hooks_write))
+    source_lines = args.source.readlines() if args.source else None
+    entry = load(args.objfile, mem)
+    recorder = TraceRecorder(cpu, args.trace) if args.trace else None
+    limits = {"max_steps": args.max_steps, "time_limit": args.timeout,
+              "detect_loops": args.detect_loops}
+    try:
+        if args.fast:
+            cpu.run_fast(entry, **limits)
+        else:
+            cpu.run(entry, single_step=args.step, **limits)
+    except ExecutionLimit as e:
+        print("Stopped: {}".format(e))
+        print("Machine state: {}".format(e.state))
+        report_profile(cpu, mem, source_lines)
+        report_pipeline(pipeline)
+        report_cache(cpu, source_lines)
+        report_memory(mem)
+        if args.display:
+            # Show where it stopped, even between frames
+            display.repaint()
+            input("Press enter to end")
+        sys.exit(1)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        for device in devices:
+            device.close()
     print("Halted")
+    report_profile(cpu, mem, source_lines)
+    report_pipeline(pipeline)
+    report_cache(cpu, source_lines)
+    report_memory(mem)
     if args.display:
+        display.repaint()
         input("Press enter to end")
 
 
@@ -8,12 +8,24 @@ with the following fields (from high-order to low-order bits).
 All are unsigned except offset, which is a signed value in 
 range -2^11 to 2^11 - 1. 
 
+The reserved high-order bit selects post-increment addressing
+for LOAD and STORE:  after the memory access, src1 is increased
+by one, so a loop can step through an array with no separate
+ADD.  It is written LOAD r1,r2+,r0 in assembly code.  Other
+operations ignore it.
+
 See docs/duck_machine.md for details. 
 """
 
-from bitfield import BitField
+from bitfield import BitField, InstructionLayout
 from enum import Enum, Flag
 
+# NumPy is needed only for decode_many
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # The field bit positions
 reserved = BitField(31, 31)
 instr_field = BitField(26, 30)
@@ -23,13 +35,24 @@ reg_src1_field = BitField(14, 17)
 reg_src2_field = BitField(10, 13)
 offset_field = BitField(0, 9)
 
+# All the fields of an instruction word (except reserved,
+# which only LOAD and STORE look at),
+# packed and unpacked in one call each
+LAYOUT = InstructionLayout([("op", instr_field, False),
+                            ("cond", cond_field, False),
+                            ("target", reg_target_field, False),
+                            ("src1", reg_src1_field, False),
+                            ("src2", reg_src2_field, False),
+                            ("offset", offset_field, True)])
+
 
 # The following operation codes control both the ALU and some
 # other parts of the CPU.  Only the ALU is modeled in the
 # bitfields project.  The CPU is introduced the following
 # week.
-# ADD, SUB, MUL, DIV, SHL, SHR are ALU-only operations
+# ADD, SUB, MUL, DIV, AND, OR, XOR, SHL, SHR are ALU-only operations
 # HALT, LOAD, STORE involve other parts of the CPU
+# CMP is SUB without storing the result:  it only sets the condition code
 
 class OpCode(Enum):
     """The operation codes specify what the CPU and ALU should do."""
@@ -42,6 +65,12 @@ class OpCode(Enum):
     SUB = 5  # Subtraction
     MUL = 6  # Multiplication
     DIV = 7  # Integer division (like // in Python)
+    AND = 8  # Bitwise and (two's complement, like & in Python)
+    OR = 9   # Bitwise or
+    XOR = 10  # Bitwise exclusive or
+    SHL = 11  # Shift left by 0..31 bits (the low 5 bits of the count)
+    SHR = 12  # Arithmetic shift right (like >> in Python), 0..31 bits
+    CMP = 13  # Compare:  set the condition code from src1 - src2
 
 
 class CondFlag(Flag):
@@ -100,7 +129,8 @@ class Instruction(object):
     def __init__(self, op: OpCode, cond: CondFlag,
                  reg_target: int, reg_src1: int,
                  reg_src2: int,
-                 offset: int):
+                 offset: int,
+                 increment: bool = False):
         """Assemble an instruction from its fields. """
         self.op = op
         self.cond = cond
@@ -108,6 +138,8 @@ class Instruction(object):
         self.reg_src1 = reg_src1
         self.reg_src2 = reg_src2
         self.offset = offset
+        # Post-increment src1 (LOAD and STORE only)
+        self.increment = increment
         return
 
     def __eq__(self, other):
@@ -117,17 +149,16 @@ class Instruction(object):
                 self.reg_target == other.reg_target and
                 self.reg_src1 == other.reg_src1 and
                 self.reg_src2 == other.reg_src2 and
-                self.offset == other.offset)
+                self.offset == other.offset and
+                self.increment == other.increment)
 
     def encode(self) -> int:
         """Encode instruction as 32-bit integer"""
-        word = 0
-        word = instr_field.insert(self.op.value, word)
-        word = cond_field.insert(self.cond.value, word)
-        word = reg_target_field.insert(self.reg_target, word)
-        word = reg_src1_field.insert(self.reg_src1, word)
-        word = reg_src2_field.insert(self.reg_src2, word)
-        word = offset_field.insert(self.offset, word)
+        word = LAYOUT.pack(self.op.value, self.cond.value,
+                           self.reg_target, self.reg_src1,
+                           self.reg_src2, self.offset)
+        if self.increment:
+            word = reserved.insert(1, word)
         return word
 
     def __str__(self):
@@ -137,9 +168,11 @@ class Instruction(object):
         else:
             cond_codes = "/{}".format(self.cond)
 
-        return "{}{:4}  r{},r{},r{}[{}]".format(
+        # Only LOAD and STORE look at the post-increment bit
+        increment = self.increment and self.op in (OpCode.LOAD, OpCode.STORE)
+        return "{}{:4}  r{},r{}{},r{}[{}]".format(
             self.op.name, cond_codes,
-            self.reg_target, self.reg_src1,
+            self.reg_target, self.reg_src1, "+" if increment else "",
             self.reg_src2, self.offset)
 
 
@@ -150,14 +183,53 @@ class Instruction(object):
 #
 def decode(word: int) -> Instruction:
     """Decode a memory word (32 bit int) into a new Instruction"""
-    op = instr_field.extract(word)
-    cond = cond_field.extract(word)
-    reg_target = reg_target_field.extract(word)
-    reg_src1 = reg_src1_field.extract(word)
-    reg_src2 = reg_src2_field.extract(word)
-    offset = offset_field.extract_signed(word)
+    op, cond, reg_target, reg_src1, reg_src2, offset = LAYOUT.unpack(word)
     return Instruction(OpCode(op), CondFlag(cond),
-                       reg_target, reg_src1, reg_src2, offset)
+                       reg_target, reg_src1, reg_src2, offset,
+                       reserved.extract(word) == 1)
+
+
+# Disassemblers and other tools that look at a whole object
+# image at once can decode every word with a handful of
+# array operations instead of a Python call per word.
+#
+def decode_many(words):
+    """Decode a sequence (or NumPy array) of memory words at once.
+    Returns a NumPy structured array with integer fields op, cond,
+    target, src1, src2, and offset (sign-extended), and boolean
+    field increment (the reserved bit), one record per word.
+    Words that are data rather than instructions decode to
+    meaningless records; is_instruction tells them apart.
+    Requires NumPy.
+    """
+    if np is None:
+        raise ImportError("decode_many requires NumPy")
+    # Signed 64-bit arithmetic, so words may be given either as
+    # signed or unsigned 32-bit values
+    words = np.asarray(words, dtype=np.int64) & 0xFFFFFFFF
+    decoded = np.empty(words.shape, dtype=DECODED_DTYPE)
+    decoded["op"] = instr_field.extract(words)
+    decoded["cond"] = cond_field.extract(words)
+    decoded["target"] = reg_target_field.extract(words)
+    decoded["src1"] = reg_src1_field.extract(words)
+    decoded["src2"] = reg_src2_field.extract(words)
+    decoded["offset"] = offset_field.extract_signed(words)
+    decoded["increment"] = reserved.extract(words) == 1
+    return decoded
+
+
+def is_instruction(decoded):
+    """Boolean array:  which records from decode_many have a
+    valid operation code, i.e., which words decode would accept.
+    """
+    return np.isin(decoded["op"], [op.value for op in OpCode])
+
+
+if np is not None:
+    DECODED_DTYPE = np.dtype([("op", np.uint8), ("cond", np.uint8),
+                              ("target", np.uint8), ("src1", np.uint8),
+                              ("src2", np.uint8), ("offset", np.int16),
+                              ("increment", np.bool_)])
 
 
 # When we build an assembler, we'll use regular expressions for pattern matching,
@@ -165,18 +237,33 @@ def decode(word: int) -> Instruction:
 # for constructing an instruction from the dict.
 #
 def instruction_from_dict(d: dict) -> Instruction:
-    """Construct an Instruction from a dict containing symbolic fields. """
-    return Instruction(OpCode[d["opcode"]],
-                       CondFlag[d["predicate"]],
-                       NAMED_REGS[d["target"]],
-                       NAMED_REGS[d["src1"]],
-                       NAMED_REGS[d["src2"]],
-                       int(d["offset"]))
+    """Construct an Instruction from a dict containing symbolic fields.
+    If d["increment"] is present and not empty, src1 is post-incremented.
+    """
+    return make_instruction(d["opcode"], d["predicate"], d["target"],
+                            d["src1"], d["src2"], d["offset"],
+                            bool(d.get("increment")))
+
+
+def make_instruction(opcode: str, predicate: str, target: str,
+                     src1: str, src2: str, offset: str,
+                     increment: bool = False) -> Instruction:
+    """Construct an Instruction from symbolic fields, checking
+    that only LOAD and STORE post-increment.
+    """
+    op = OpCode[opcode]
+    if increment and op not in (OpCode.LOAD, OpCode.STORE):
+        raise ValueError("Only LOAD and STORE can post-increment, not {}".format(opcode))
+    return Instruction(op, CondFlag[predicate],
+                       NAMED_REGS[target], NAMED_REGS[src1], NAMED_REGS[src2],
+                       int(offset), increment)
 
 
 # Until we build an assembler, we can construct instructions from
 # a very simple string format like
 #   "ADD Z r1 r2 r3 -14"
+# or, post-incrementing r2,
+#   "LOAD ALWAYS r1 r2+ r0 0"
 #
 def instruction_from_string(s) -> Instruction:
     """Construct an Instruction from a string.
@@ -185,5 +272,6 @@ def instruction_from_string(s) -> Instruction:
     """
     fields = s.split()
     opcode, predicate, targ_name, src1_name, src2_name, offset = fields
-    return Instruction(OpCode[opcode], CondFlag[predicate],
-                       NAMED_REGS[targ_name], NAMED_REGS[src1_name], NAMED_REGS[src2_name], int(offset))
+    increment = src1_name.endswith("+")
+    return make_instruction(opcode, predicate, targ_name, src1_name.rstrip("+"),
+                            src2_name, offset, increment)
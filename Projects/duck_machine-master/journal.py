@@ -0,0 +1,95 @@
+"""
+Undo journal for reverse stepping through a Duck Machine run.
+
+Rather than a snapshot of the whole machine at every step, the
+journal keeps the least we need to undo each step:  the program
+counter and condition code before the step, the old value of the
+target register (and of src1, if the step post-incremented it), and
+the old value of the memory word a STORE overwrote (if any).  A
+step stores at most one word, so every entry is the same size.
+Entries are kept in a ring buffer, so only the most recent
+max_steps steps can be undone, and the journal never grows
+beyond that.  Memory changed outside a step (by a device, say,
+or by the debugger) is not journaled.
+
+Input and output through memory-mapped addresses are not undone;
+stepping back over a LOAD from the input address does not push
+the value back into the input.
+
+    cpu.start_journal(max_steps=10000)
+    cpu.run()
+    cpu.step_back(5)
+"""
+
+import collections
+
+from typing import List
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Each entry is a list of:
+PC = 0           # Program counter before the step
+CONDITION = 1    # Condition code before the step
+TARGET = 2       # Target register number
+OLD_TARGET = 3   # and its value before the step
+ADDR = 4         # Address stored by the step, or None
+OLD_WORD = 5     # and the word it held before
+INC_REG = 6      # Register post-incremented by the step, or None
+OLD_INC = 7      # and its value before the step
+
+
+class UndoJournal(object):
+    """The last max_steps steps of a run, in order.  An entry
+    takes roughly 150 bytes, so the default of 100,000 steps
+    caps the journal around 15MB.
+    """
+
+    def __init__(self, max_steps: int = 100000) -> None:
+        assert max_steps > 0
+        self.max_steps = max_steps
+        self._entries = collections.deque(maxlen=max_steps)
+        # Entry of the step in progress, if any
+        self._open = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def begin(self, pc: int, condition, target: int, old_target: int) -> None:
+        """Record the state a step is about to change"""
+        self._open = [pc, condition, target, old_target, None, None, None, None]
+        self._entries.append(self._open)
+
+    def end(self) -> None:
+        """The step is over; later stores are not part of it"""
+        self._open = None
+
+    def stored(self, addr: int, old_word: int) -> None:
+        """Record the word a store in the current step overwrites.
+        Ignored between steps.
+        """
+        entry = self._open
+        if entry is not None and entry[ADDR] is None:
+            entry[ADDR] = addr
+            entry[OLD_WORD] = old_word
+
+    def incremented(self, reg: int, old_value: int) -> None:
+        """Record the register a LOAD or STORE in the current
+        step post-increments
+        """
+        entry = self._open
+        if entry is not None:
+            entry[INC_REG] = reg
+            entry[OLD_INC] = old_value
+
+    def pop(self) -> List:
+        """The entry for the most recent step, removed"""
+        self._open = None
+        return self._entries.pop()
+
+    def clear(self) -> None:
+        self._open = None
+        self._entries.clear()
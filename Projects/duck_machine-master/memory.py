@@ -6,7 +6,10 @@ is an array of 32-bit integers.
 
 from mvc import MVCEvent, MVCListenable
 
-from typing import Callable
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+import array
+import itertools
 
 import logging
 
@@ -15,6 +18,29 @@ log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
 
+# Words of a CompactMemory are 32-bit two's complement integers
+WORD_BITS = 32
+WORD_SIGN = 1 << (WORD_BITS - 1)
+WORD_MASK = (1 << WORD_BITS) - 1
+# An array typecode for 4-byte signed integers ('i' on all
+# the usual platforms, but C only promises 'l' is that wide)
+WORD_TYPECODE = "i" if array.array("i").itemsize == 4 else "l"
+
+
+# Snapshots copy memory in pages of 2^PAGE_BITS words, and
+# PagedMemory allocates it in the same pages
+PAGE_BITS = 6
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+
+def wrap_word(value: int) -> int:
+    """The 32-bit two's complement integer with the same
+    low-order 32 bits as value, e.g., 2^31 wraps to -2^31.
+    """
+    return ((value + WORD_SIGN) & WORD_MASK) - WORD_SIGN
+
+
 class SegFault(Exception):
     """Segmentation fault is actually an operating-system 
     level fault, not a hardware fault, but it's what you 
@@ -46,6 +72,53 @@ class MemoryWrite(MemoryEvent):
         self.value = value
 
 
+class MemoryLoaded(MemoryEvent):
+    """The words of a sequence were stored in bulk at consecutive
+    addresses from addr (e.g., a program was loaded), with no
+    MemoryWrite for each.  The sequence may be a view of a file
+    that is closed afterward, so use it only in notify.
+    """
+
+    def __init__(self, subject: "Memory", addr: int, words: Sequence[int]):
+        self.subject = subject
+        self.addr = addr
+        self.words = words
+        self.value = None
+
+
+class MemorySnapshot(object):
+    """The contents of a memory at one moment, as a list of
+    pages (a dict by page number, for a PagedMemory).  Pages
+    that were not written between one snapshot and the next
+    are shared rather than copied again.  Snapshots are never
+    modified, so any number of runs can be restored from the
+    same one.
+    """
+
+    def __init__(self, capacity: int, pages: List[Sequence[int]]) -> None:
+        self.capacity = capacity
+        self.pages = pages
+
+    def words(self) -> Iterator[int]:
+        """Every word, in address order"""
+        pages = self.pages
+        if isinstance(pages, dict):
+            # From a PagedMemory:  missing pages are zero
+            zeros = PAGE_SIZE * [0]
+            pages = (self.pages.get(number, zeros)
+                     for number in range((self.capacity + PAGE_MASK) >> PAGE_BITS))
+        return itertools.islice(itertools.chain.from_iterable(pages), self.capacity)
+
+    def numbered_pages(self) -> Iterator[Tuple[int, Sequence[int]]]:
+        """(page number, words) of every page held, in address
+        order.  Pages of a PagedMemory that were never written are
+        left out, and the last page may be short.
+        """
+        if isinstance(self.pages, dict):
+            return iter(sorted(self.pages.items()))
+        return enumerate(self.pages)
+
+
 class Memory(MVCListenable):
     """Just an array of integers.  Other values are 
     encoded as integers. 
@@ -54,7 +127,17 @@ class Memory(MVCListenable):
     def __init__(self, capacity: int = 1024) -> None:
         super().__init__()  # Make it listenable
         self.capacity = capacity
-        self._mem = capacity * [0]
+        self._mem = self._allocate(capacity)
+        # Memory is equal to the _base snapshot, except
+        # for the pages numbered in _dirty
+        self._base = None    # type: MemorySnapshot
+        self._dirty = set()
+        # Optional record of overwritten words (see journal.py)
+        self.journal = None
+
+    def _allocate(self, capacity: int):
+        """Storage for capacity words, all zero"""
+        return capacity * [0]
 
     def _check_bounds(self, index):
         if index < 0 or index >= self.capacity:
@@ -64,15 +147,272 @@ class Memory(MVCListenable):
         """Fetch a word from memory"""
         log.debug("Fetching word at memory address {}".format(index))
         self._check_bounds(index)
-        self.notify_all(MemoryRead(self, index, self._mem[index]))
+        if self.subscribers[MemoryRead]:
+            self.notify_all(MemoryRead(self, index, self._mem[index]))
+        return self._mem[index]
+
+    def peek(self, index: int) -> int:
+        """Fetch a word from memory without announcing the read
+        to listeners.  For use by clients that know no listener
+        cares about reads.
+        """
+        if index < 0 or index >= self.capacity:
+            raise SegFault("Memory address {} out of bounds".format(index))
         return self._mem[index]
 
     def put(self, index: int, value: int) -> None:
         """Store a word into memory"""
         self._check_bounds(index)
         log.debug("Storing value {} at memory address {}".format(value, index))
+        if self.journal is not None:
+            self.journal.stored(index, self._mem[index])
         self._mem[index] = value
-        self.notify_all(MemoryWrite(self, index, value))
+        self._dirty.add(index >> PAGE_BITS)
+        if self.subscribers[MemoryWrite]:
+            self.notify_all(MemoryWrite(self, index, value))
+
+    def load_words(self, words: Sequence[int], base: int = 0) -> None:
+        """Store a sequence of words at consecutive addresses
+        starting at base, e.g., to load a program.  This goes
+        straight to storage, bypassing any memory-mapped hooks.
+        """
+        if not words:
+            return
+        self._check_bounds(base)
+        self._check_bounds(base + len(words) - 1)
+        self._mem[base:base + len(words)] = words
+        self._announce_words(base, words)
+
+    def _announce_words(self, base: int, words: Sequence[int]) -> None:
+        """Note words stored in bulk as changed since the last
+        snapshot, and tell listeners about them in one event.
+        """
+        last = base + len(words) - 1
+        self._dirty.update(range(base >> PAGE_BITS, (last >> PAGE_BITS) + 1))
+        if self.subscribers[MemoryLoaded]:
+            self.notify_all(MemoryLoaded(self, base, words))
+
+    def _word(self, addr: int) -> int:
+        """The stored word, without bounds checks, hooks, or events"""
+        return self._mem[addr]
+
+    def snapshot(self) -> MemorySnapshot:
+        """Capture the contents of memory.  Only pages written
+        since the last snapshot or restore are copied; the rest
+        are shared with that snapshot.
+        """
+        pages = []
+        base = self._base
+        for page, lo in enumerate(range(0, self.capacity, 1 << PAGE_BITS)):
+            if base is None or page in self._dirty:
+                pages.append(self._mem[lo:lo + (1 << PAGE_BITS)])
+            else:
+                pages.append(base.pages[page])
+        self._base = MemorySnapshot(self.capacity, pages)
+        self._dirty.clear()
+        return self._base
+
+    def restore(self, snapshot: MemorySnapshot) -> None:
+        """Return memory to the contents captured in snapshot,
+        copying only pages that may differ.  Listeners are told
+        of each word that changes (but memory-mapped hooks are
+        not called).
+        """
+        if snapshot.capacity != self.capacity:
+            raise ValueError("Snapshot of {} words cannot be restored into memory of {}"
+                             .format(snapshot.capacity, self.capacity))
+        base = self._base
+        for page, saved in enumerate(snapshot.pages):
+            if (base is not None and page not in self._dirty
+                    and saved is base.pages[page]):
+                continue
+            lo = page << PAGE_BITS
+            hi = lo + len(saved)
+            if self.subscribers[MemoryWrite]:
+                changed = [addr for addr, old, new in
+                           zip(range(lo, hi), self._mem[lo:hi], saved) if old != new]
+            self._mem[lo:hi] = saved
+            if self.subscribers[MemoryWrite]:
+                for addr in changed:
+                    self.notify_all(MemoryWrite(self, addr, self._mem[addr]))
+        self._base = snapshot
+        self._dirty.clear()
+
+
+class CompactMemory(Memory):
+    """Memory as an array of 32-bit words, rather than a list
+    of Python integers:  about 4 bytes per word instead of a
+    pointer plus an integer object.  Values wrap around to
+    32 bits when stored, as they would in a real memory.
+    """
+
+    def _allocate(self, capacity: int):
+        return array.array(WORD_TYPECODE, bytes(4 * capacity))
+
+    def get(self, index: int) -> int:
+        """Fetch a word from memory"""
+        if index < 0 or index >= self.capacity:
+            raise SegFault("Memory address {} out of bounds".format(index))
+        value = self._mem[index]
+        if self.subscribers[MemoryRead]:
+            self.notify_all(MemoryRead(self, index, value))
+        return value
+
+    def put(self, index: int, value: int) -> None:
+        """Store a word into memory, wrapped to 32 bits"""
+        if index < 0 or index >= self.capacity:
+            raise SegFault("Memory address {} out of bounds".format(index))
+        value = ((value + WORD_SIGN) & WORD_MASK) - WORD_SIGN  # wrap_word
+        if self.journal is not None:
+            self.journal.stored(index, self._mem[index])
+        self._mem[index] = value
+        self._dirty.add(index >> PAGE_BITS)
+        if self.subscribers[MemoryWrite]:
+            self.notify_all(MemoryWrite(self, index, value))
+
+    def load_words(self, words: Sequence[int], base: int = 0) -> None:
+        """Store a sequence of words at consecutive addresses
+        starting at base with a single slice assignment.
+        """
+        if not words:
+            return
+        self._check_bounds(base)
+        self._check_bounds(base + len(words) - 1)
+        if isinstance(words, memoryview) and words.format == WORD_TYPECODE:
+            # Straight copy from the buffer, e.g., a mapped object file
+            memoryview(self._mem)[base:base + len(words)] = words
+        else:
+            if not isinstance(words, array.array):
+                words = array.array(WORD_TYPECODE, [wrap_word(w) for w in words])
+            self._mem[base:base + len(words)] = words
+        self._announce_words(base, words)
+
+
+class PagedMemory(Memory):
+    """Memory for large address spaces, allocated a page
+    (2^PAGE_BITS words) at a time:  a page springs into existence,
+    all zeros, the first time a word in it is written.  Reading
+    a page that was never written returns zeros without allocating
+    it.  A machine of millions of words starts instantly and takes
+    space in proportion to the pages its program actually uses.
+    Snapshots share this memory's pages by page number, in a dict
+    rather than a list, and hold only resident pages.
+    """
+
+    def __init__(self, capacity: int = 1 << 20) -> None:
+        super().__init__(capacity)
+
+    def _allocate(self, capacity: int) -> Dict[int, List[int]]:
+        # Resident pages by page number
+        return {}
+
+    def resident_pages(self) -> int:
+        """Number of pages allocated so far"""
+        return len(self._mem)
+
+    def _word(self, addr: int) -> int:
+        page = self._mem.get(addr >> PAGE_BITS)
+        return 0 if page is None else page[addr & PAGE_MASK]
+
+    def get(self, index: int) -> int:
+        """Fetch a word from memory"""
+        if index < 0 or index >= self.capacity:
+            raise SegFault("Memory address {} out of bounds".format(index))
+        page = self._mem.get(index >> PAGE_BITS)
+        value = 0 if page is None else page[index & PAGE_MASK]
+        if self.subscribers[MemoryRead]:
+            self.notify_all(MemoryRead(self, index, value))
+        return value
+
+    def peek(self, index: int) -> int:
+        """Fetch a word from memory without announcing the read"""
+        if index < 0 or index >= self.capacity:
+            raise SegFault("Memory address {} out of bounds".format(index))
+        page = self._mem.get(index >> PAGE_BITS)
+        return 0 if page is None else page[index & PAGE_MASK]
+
+    def _page(self, number: int) -> List[int]:
+        """The page, allocated if it isn't already"""
+        page = self._mem.get(number)
+        if page is None:
+            page = self._mem[number] = PAGE_SIZE * [0]
+        return page
+
+    def put(self, index: int, value: int) -> None:
+        """Store a word into memory"""
+        if index < 0 or index >= self.capacity:
+            raise SegFault("Memory address {} out of bounds".format(index))
+        number = index >> PAGE_BITS
+        page = self._page(number)
+        offset = index & PAGE_MASK
+        if self.journal is not None:
+            self.journal.stored(index, page[offset])
+        page[offset] = value
+        self._dirty.add(number)
+        if self.subscribers[MemoryWrite]:
+            self.notify_all(MemoryWrite(self, index, value))
+
+    def load_words(self, words: Sequence[int], base: int = 0) -> None:
+        """Store a sequence of words at consecutive addresses
+        starting at base, a page-sized slice at a time.
+        """
+        if not words:
+            return
+        self._check_bounds(base)
+        self._check_bounds(base + len(words) - 1)
+        done = 0
+        while done < len(words):
+            addr = base + done
+            offset = addr & PAGE_MASK
+            count = min(PAGE_SIZE - offset, len(words) - done)
+            self._page(addr >> PAGE_BITS)[offset:offset + count] = words[done:done + count]
+            done += count
+        self._announce_words(base, words)
+
+    def snapshot(self) -> MemorySnapshot:
+        """Capture the contents of memory.  Only resident pages
+        written since the last snapshot or restore are copied.
+        """
+        pages = {}
+        base = self._base
+        for number, page in self._mem.items():
+            if base is None or number in self._dirty or number not in base.pages:
+                pages[number] = page[:]
+            else:
+                pages[number] = base.pages[number]
+        self._base = MemorySnapshot(self.capacity, pages)
+        self._dirty.clear()
+        return self._base
+
+    def restore(self, snapshot: MemorySnapshot) -> None:
+        """Return memory to the contents captured in snapshot.
+        Pages the snapshot doesn't hold are zero, so they are
+        given back.  Listeners are told of each word that changes.
+        """
+        if snapshot.capacity != self.capacity:
+            raise ValueError("Snapshot of {} words cannot be restored into memory of {}"
+                             .format(snapshot.capacity, self.capacity))
+        base = self._base
+        for number in set(self._mem) | set(snapshot.pages):
+            saved = snapshot.pages.get(number)
+            if (base is not None and number not in self._dirty
+                    and saved is base.pages.get(number)):
+                continue
+            if self.subscribers[MemoryWrite]:
+                old = self._mem.get(number) or PAGE_SIZE * [0]
+                new = saved or PAGE_SIZE * [0]
+                lo = number << PAGE_BITS
+                changed = [lo + offset for offset in range(PAGE_SIZE)
+                           if old[offset] != new[offset]]
+            if saved is None:
+                self._mem.pop(number, None)
+            else:
+                self._mem[number] = list(saved)
+            if self.subscribers[MemoryWrite]:
+                for addr in changed:
+                    self.notify_all(MemoryWrite(self, addr, self._word(addr)))
+        self._base = snapshot
+        self._dirty.clear()
 
 
 class MemoryMappedIO(Memory):
@@ -105,6 +445,13 @@ class MemoryMappedIO(Memory):
             return hook(index)
         return super().get(index)
 
+    def peek(self, index: int) -> int:
+        """Hook OR Fetch a word without announcing the read"""
+        if index in self.hooks_read:
+            hook = self.hooks_read[index]
+            return hook(index)
+        return super().peek(index)
+
     def put(self, index: int, value: int) -> None:
         """Hook OR Store a word into memory"""
         if index in self.hooks_write:
@@ -112,3 +459,16 @@ class MemoryMappedIO(Memory):
             hook(index, value)
             return
         super().put(index, value)
+
+
+class CompactMemoryMappedIO(MemoryMappedIO, CompactMemory):
+    """Memory-mapped input/output over array-backed memory"""
+    pass
+
+
+class PagedMemoryMappedIO(MemoryMappedIO, PagedMemory):
+    """Memory-mapped input/output over paged memory"""
+
+    def __init__(self, capacity: int = 1 << 20) -> None:
+        # As large by default as a PagedMemory, not a MemoryMappedIO
+        super().__init__(capacity)
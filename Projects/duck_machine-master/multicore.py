@@ -0,0 +1,157 @@
+"""
+Multi-core Duck Machine:  several CPUs sharing one memory bus.
+
+Each core is an ordinary CPU connected to the same
+MemoryMappedIO, so every core sees every other core's stores.
+Before starting, core k holds k in r14 and the number of
+cores in r13, so a single program can divide its work among
+the cores; all cores start at the same entry point.
+
+Cores synchronize through a test-and-set address (509 in the
+standard configuration).  Reading it returns its value and sets
+it to 1 in one indivisible operation; storing to it sets its
+value.  A lock is acquired by reading until the result is 0,
+and released by storing 0, e.g.,
+
+    lock:  LOAD r4,r0,r0[509]
+           SUB  r0,r4,r0        # LOAD set the condition from the address
+           JUMP/P lock          # another core holds it
+           ...                  # critical section
+           STORE r0,r0,r0[509]  # release
+
+The round-robin scheduler runs the cores in turn, a quantum of
+steps each, so every run of a program interleaves its cores in
+exactly the same way.  The threaded mode runs each core in its
+own thread and lets the interleaving fall where it may.  (In
+CPython only one thread runs Python code at a time, so threads
+do not make the simulation faster, but they do exercise
+synchronization the way real parallel hardware would.)
+"""
+
+from memory import MemoryMappedIO
+from cpu import CPU, StepLimitExceeded
+
+import threading
+
+from typing import List
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Memory-mapped address of the test-and-set lock
+TEST_AND_SET_ADDR = 509
+
+# Registers initialized with the core number and core count
+CORE_ID_REG = 14
+CORE_COUNT_REG = 13
+
+
+class TestAndSet(object):
+    """A word of memory with an atomic read-and-set-to-1,
+    to be mapped at an address with map_address_in and
+    map_address_out.
+    """
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def read(self, addr: int) -> int:
+        with self._lock:
+            old = self.value
+            self.value = 1
+            return old
+
+    def write(self, addr: int, value: int) -> None:
+        with self._lock:
+            self.value = value
+
+
+class MultiCore(object):
+    """n CPUs sharing memory, with a test-and-set lock
+    mapped at lock_addr.  With wrap=True the cores are strict
+    32-bit machines (see CPU).
+    """
+
+    def __init__(self, memory: MemoryMappedIO, n: int,
+                 lock_addr: int = TEST_AND_SET_ADDR, wrap: bool = False) -> None:
+        assert n >= 1
+        self.memory = memory
+        self.lock = TestAndSet()
+        memory.map_address_in(lock_addr, self.lock.read)
+        memory.map_address_out(lock_addr, self.lock.write)
+        self.cores = [CPU(memory, wrap=wrap) for _ in range(n)]  # type: List[CPU]
+        for core_id, core in enumerate(self.cores):
+            core.registers[CORE_ID_REG].put(core_id)
+            core.registers[CORE_COUNT_REG].put(n)
+
+    @property
+    def halted(self) -> bool:
+        return all(core.halted for core in self.cores)
+
+    def step_count(self) -> int:
+        """Total steps executed by all cores"""
+        return sum(core.step_count for core in self.cores)
+
+    def run_round_robin(self, from_addr: int = 0, quantum: int = 1,
+                        max_steps: int = None) -> None:
+        """Run every core from from_addr until all have halted,
+        switching cores after each quantum of steps.  Raises
+        StepLimitExceeded if the cores together take more than
+        max_steps steps.
+        """
+        for core in self.cores:
+            core.pc.put(from_addr)
+            core.halted = False
+            core.step_count = 0
+        running = list(self.cores)
+        total = 0
+        while running:
+            for core in list(running):
+                for _ in range(quantum):
+                    if max_steps is not None and total >= max_steps:
+                        raise StepLimitExceeded("No HALT after {} steps".format(max_steps),
+                                                self.machine_state())
+                    core.step()
+                    core.step_count += 1
+                    total += 1
+                    if core.halted:
+                        running.remove(core)
+                        break
+
+    def run_threaded(self, from_addr: int = 0, fast: bool = True,
+                     **limits) -> None:
+        """Run each core in its own thread from from_addr until
+        all have halted.  Limits (see CPU.run) apply to each core.
+        An exception in any core is raised again here, after
+        the other cores have stopped.  A core waiting for one that
+        failed may wait forever, so give limits when running
+        programs that might fail.
+        """
+        errors = []
+
+        def run_core(core: CPU) -> None:
+            try:
+                if fast:
+                    core.run_fast(from_addr, **limits)
+                else:
+                    core.run(from_addr, **limits)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run_core, args=(core,),
+                                    name="duck core {}".format(core_id))
+                   for core_id, core in enumerate(self.cores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def machine_state(self) -> dict:
+        """State of every core, e.g., for error reports"""
+        return {"cores": [core.machine_state() for core in self.cores]}
@@ -1,7 +1,27 @@
 """
 Base components for connecting model to view.
+
+A listener registers with a model object for all of its events,
+or only for some classes of event:
+
+    memory.register_listener(view)                  # everything
+    memory.register_listener(decode_cache, MemoryWrite)
+
+Each model keeps, for each class of event it announces, the
+tuple of notify methods that want it, computed the first time
+that class is announced.  A model that nobody wants a class of
+event from can skip building those events at all:
+
+    if self.subscribers[MemoryRead]:
+        self.notify_all(MemoryRead(self, addr, value))
+
+Registering replaces the table rather than changing it, so a
+model announcing events in one thread never sees a half-updated
+table while a listener registers in another.
 """
 
+from typing import Callable, Dict, Tuple, Type
+
 
 class MVCEvent(object):
     """Abstract base class for events"""
@@ -23,15 +43,46 @@ class MVCListener(object):
         raise NotImplementedError("The notify method should be overridden in {}".format(self.__class__))
 
 
+class _Dispatch(dict):
+    """Notify methods by event class, filled in on first lookup
+    from a fixed tuple of (listener, event classes) subscriptions
+    """
+
+    def __init__(self, subscriptions: tuple) -> None:
+        super().__init__()
+        self.subscriptions = subscriptions
+
+    def __missing__(self, event_class: Type[MVCEvent]) -> Tuple[Callable, ...]:
+        targets = tuple(listener.notify for listener, classes in self.subscriptions
+                        if not classes or issubclass(event_class, classes))
+        self[event_class] = targets
+        return targets
+
+
 class MVCListenable(object):
     """A model object that a view object can listen to"""
 
     def __init__(self):
-        self.listeners = []
+        self.subscribers = _Dispatch(())   # type: Dict[Type[MVCEvent], Tuple[Callable, ...]]
+
+    @property
+    def listeners(self) -> tuple:
+        """Every registered listener, whatever events it wants"""
+        return tuple(listener for listener, _ in self.subscribers.subscriptions)
+
+    def register_listener(self, listener: MVCListener, *event_classes: Type[MVCEvent]) -> None:
+        """Call listener.notify with each event that is an instance
+        of one of event_classes, or with every event if none are given
+        """
+        subscriptions = self.subscribers.subscriptions + ((listener, event_classes),)
+        self.subscribers = _Dispatch(subscriptions)
 
-    def register_listener(self, listener: MVCListener) -> None:
-        self.listeners.append(listener)
+    def unregister_listener(self, listener: MVCListener) -> None:
+        """Stop notifying listener"""
+        subscriptions = tuple(sub for sub in self.subscribers.subscriptions
+                              if sub[0] is not listener)
+        self.subscribers = _Dispatch(subscriptions)
 
     def notify_all(self, event: MVCEvent) -> None:
-        for listener in self.listeners:
-            listener.notify(event)
+        for notify in self.subscribers[type(event)]:
+            notify(event)
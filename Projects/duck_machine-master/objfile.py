@@ -0,0 +1,137 @@
+"""
+Binary object files for the Duck Machine.
+
+The standard Duck Machine object code format is a text file
+with one decimal integer per line.  That is easy to read and
+to produce, but loading a large program means parsing every
+line.  The binary format packs the same words as little-endian
+32-bit two's complement integers after a small header, so a
+loader can map the file into memory and copy the words into
+simulated memory in one step.
+
+Layout (all fields little-endian):
+
+   magic         4 bytes   b"DUCK"
+   version       uint16    currently 1
+   flags         uint16    reserved, 0
+   entry         uint32    address at which execution starts
+   size          uint32    number of words
+   symbol count  uint32
+   words         size x int32
+   symbols       symbol count x (int32 address, uint16 name length,
+                 name in UTF-8)
+"""
+
+from memory import WORD_TYPECODE, wrap_word
+
+from typing import BinaryIO, Dict, Optional, Sequence
+
+import array
+import mmap
+import struct
+import sys
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+MAGIC = b"DUCK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII")
+SYMBOL = struct.Struct("<iH")
+WORD = struct.Struct("<i")
+
+
+class ObjectFileError(Exception):
+    """The file is not a well-formed binary object file"""
+    pass
+
+
+def write_binary(file: BinaryIO, words: Sequence[int], entry: int = 0,
+                 symbols: Optional[Dict[str, int]] = None) -> None:
+    """Write object code in the binary format"""
+    symbols = symbols or {}
+    file.write(HEADER.pack(MAGIC, VERSION, 0, entry, len(words), len(symbols)))
+    file.write(struct.pack("<{}i".format(len(words)),
+                           *[wrap_word(w) for w in words]))
+    for name, addr in symbols.items():
+        encoded = name.encode("utf-8")
+        file.write(SYMBOL.pack(addr, len(encoded)))
+        file.write(encoded)
+
+
+def is_binary(file: BinaryIO) -> bool:
+    """Does this (seekable or peekable) file start with the
+    binary object file magic number?  Does not consume input.
+    """
+    if hasattr(file, "peek"):
+        return file.peek(len(MAGIC))[:len(MAGIC)] == MAGIC
+    pos = file.tell()
+    start = file.read(len(MAGIC))
+    file.seek(pos)
+    return start == MAGIC
+
+
+class ObjectImage(object):
+    """A binary object file, opened for loading.  words is a
+    memoryview of 32-bit integers, backed directly by a memory
+    mapping of the file when possible, so it must be closed
+    (or used in a 'with' statement) when loading is done.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._mapping = None
+        try:
+            self._mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            data = memoryview(self._mapping)
+        except (AttributeError, OSError, ValueError):
+            # Not a regular file (e.g., a pipe); read it instead
+            data = memoryview(file.read())
+        self._data = data
+        if len(data) < HEADER.size:
+            raise ObjectFileError("Object file too short for header")
+        magic, version, flags, entry, size, n_symbols = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ObjectFileError("Not a binary Duck Machine object file")
+        if version != VERSION:
+            raise ObjectFileError("Unsupported object file version {}".format(version))
+        self.entry = entry
+        words_end = HEADER.size + WORD.size * size
+        if len(data) < words_end:
+            raise ObjectFileError("Object file truncated: expected {} words".format(size))
+        raw = data[HEADER.size:words_end]
+        if sys.byteorder == "little" and struct.calcsize(WORD_TYPECODE) == WORD.size:
+            self.words = raw.cast(WORD_TYPECODE)
+        else:
+            # Byte order or word size differs; we have to copy
+            unpacked = struct.unpack("<{}i".format(size), raw)
+            self.words = memoryview(array.array(WORD_TYPECODE, unpacked))
+        raw.release()
+        self.symbols = self._read_symbols(data, words_end, n_symbols)
+
+    @staticmethod
+    def _read_symbols(data: memoryview, offset: int, count: int) -> Dict[str, int]:
+        symbols = {}
+        for _ in range(count):
+            addr, length = SYMBOL.unpack_from(data, offset)
+            offset += SYMBOL.size
+            name = bytes(data[offset:offset + length]).decode("utf-8")
+            offset += length
+            symbols[name] = addr
+        return symbols
+
+    def close(self) -> None:
+        """Release the memory mapping"""
+        self.words.release()
+        self._data.release()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self) -> "ObjectImage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
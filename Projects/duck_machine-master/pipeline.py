@@ -0,0 +1,140 @@
+"""
+Timing model of a pipelined Duck Machine:  how many clock
+cycles a run would take on a simple five-stage pipeline,
+
+    IF  fetch    ID  decode, read registers    EX  ALU
+    MEM load or store                          WB  write register
+
+rather than one step per instruction.  In the ideal case one
+instruction finishes every cycle; the model counts the cycles
+lost to hazards:
+
+    load-use   an instruction that reads a register loaded by
+               the instruction just before it waits one cycle,
+               because the value arrives only at the end of MEM
+               (other results are forwarded from EX with no wait)
+    branch     a write to r15 is known only at the end of EX
+               (MEM, for a LOAD), so the instructions fetched
+               behind it are flushed:  2 cycles (3 for a LOAD)
+    memory     a LOAD or STORE holds the pipeline in MEM for
+               memory_latency cycles instead of one
+
+Instructions whose predicate fails still pass through the
+pipeline (the predicate is tested in EX) but do nothing else.
+Instruction fetch is assumed to hit in an instruction cache.
+
+The model listens to the CPU, like the graphical view, so the
+program runs exactly as it would otherwise, just not on the
+fast path:
+
+    model = PipelineModel(cpu, memory_latency=3)
+    cpu.run()
+    print("\\n".join(model.report()))
+"""
+
+from instr_format import OpCode
+from mvc import MVCEvent, MVCListener
+from cpu import CPU, CPUStep
+
+from collections import Counter
+from typing import List
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+STAGES = 5
+
+# Cycles lost to each kind of hazard
+LOAD_USE_PENALTY = 1
+BRANCH_PENALTY = 2        # Resolved at the end of EX
+LOAD_BRANCH_PENALTY = 3   # Resolved at the end of MEM
+
+# Kinds of stall, as keys of PipelineModel.stalls
+LOAD_USE = "load-use"
+BRANCH = "branch"
+MEMORY = "memory"
+
+# Operations that write r15 when it is their target
+NOT_JUMPS = (OpCode.STORE, OpCode.CMP, OpCode.HALT)
+
+
+class PipelineModel(MVCListener):
+    """Count the cycles cpu would take on the five-stage
+    pipeline, from the instructions it executes.  Register
+    before the CPU starts running.
+    """
+
+    def __init__(self, cpu: CPU, memory_latency: int = 1) -> None:
+        assert memory_latency >= 1
+        self.cpu = cpu
+        self.memory_latency = memory_latency
+        self.instructions = 0
+        # Cycles lost, by kind of stall and by instruction address
+        self.stalls = Counter({LOAD_USE: 0, BRANCH: 0, MEMORY: 0})
+        self.stalls_at = Counter()
+        # Register loaded by the previous instruction, if any
+        self._loaded = None
+        cpu.register_listener(self, CPUStep)
+
+    def notify(self, event: MVCEvent) -> None:
+        self.issue(event.pc_addr, event.instr)
+
+    def issue(self, addr: int, instr) -> None:
+        """Account for one instruction entering the pipeline.
+        Called before the CPU executes it, so the condition code
+        tells whether its predicate will pass.
+        """
+        self.instructions += 1
+        loaded, self._loaded = self._loaded, None
+        # The interlock is in ID, before the predicate is tested
+        if loaded is not None and loaded in (instr.reg_src1, instr.reg_src2):
+            self._stall(LOAD_USE, addr, LOAD_USE_PENALTY)
+        if not instr.cond & self.cpu.condition:
+            return
+        op = instr.op
+        if op is OpCode.LOAD or op is OpCode.STORE:
+            self._stall(MEMORY, addr, self.memory_latency - 1)
+        target = instr.reg_target
+        if target == 15 and op not in NOT_JUMPS:
+            self._stall(BRANCH, addr,
+                        LOAD_BRANCH_PENALTY if op is OpCode.LOAD else BRANCH_PENALTY)
+        elif op is OpCode.LOAD and target != 0:
+            self._loaded = target
+
+    def _stall(self, kind: str, addr: int, cycles: int) -> None:
+        if cycles:
+            self.stalls[kind] += cycles
+            self.stalls_at[addr] += cycles
+
+    def cycles(self) -> int:
+        """Cycles from the first fetch until the last instruction
+        leaves the pipeline
+        """
+        if self.instructions == 0:
+            return 0
+        return self.instructions + (STAGES - 1) + sum(self.stalls.values())
+
+    def cpi(self) -> float:
+        """Cycles per instruction"""
+        return self.cycles() / self.instructions if self.instructions else 0.0
+
+    def report(self, hot_spots: int = 5) -> List[str]:
+        """Cycle count, CPI, and where the cycles were lost"""
+        lines = ["{:20}{:>10}".format("Instructions", self.instructions),
+                 "{:20}{:>10}   (CPI {:.2f}, memory latency {})".format(
+                     "Cycles", self.cycles(), self.cpi(), self.memory_latency),
+                 "  {:18}{:>10}".format("pipeline fill", STAGES - 1 if self.instructions else 0)]
+        for kind in [LOAD_USE, BRANCH, MEMORY]:
+            lines.append("  {:18}{:>10}".format(kind + " stalls", self.stalls[kind]))
+        if self.stalls_at:
+            lines.append("Most stalled addresses:")
+            for addr, cycles in self.stalls_at.most_common(hot_spots):
+                lines.append("  {:5}:{:>10}".format(addr, cycles))
+        return lines
+
+    def close(self) -> None:
+        """Stop listening"""
+        self.cpu.unregister_listener(self)
@@ -0,0 +1,144 @@
+"""
+Execution profile of a Duck Machine program:  which instructions
+dominate the run time, and which memory cells are used most.
+
+Attach a Profile to a CPU before running it:
+
+    cpu.profile = Profile()
+    cpu.run()
+    print("\\n".join(cpu.profile.listing(mem, source_lines)))
+
+The CPU counts directly into the profile in its step method,
+rather than through MVC events, so profiling costs a few
+dictionary updates per step.  The listing joins the counts back
+to the lines of the assembly language source (.asm, .dasm) that
+produced the object code, using the same address assignment as
+the assembler, or to disassembled instructions if no source is
+available.
+"""
+
+from instr_format import CondFlag, decode
+from assembler_pass1 import parse_line, AsmSrcKind, SyntaxError
+
+from collections import Counter
+from typing import Dict, List, Optional
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+class Profile(object):
+    """Counts by address:  instructions executed (fetched, whether
+    or not the predicate passed), predicated instructions taken and
+    not taken, and loads and stores of each memory address.
+    """
+
+    def __init__(self) -> None:
+        self.executed = Counter()
+        self.taken = Counter()
+        self.not_taken = Counter()
+        self.loads = Counter()
+        self.stores = Counter()
+
+    def count(self, addr: int, predicate: CondFlag, taken: bool) -> None:
+        """Record one step executing the instruction at addr"""
+        self.executed[addr] += 1
+        if predicate is not CondFlag.ALWAYS:
+            if taken:
+                self.taken[addr] += 1
+            else:
+                self.not_taken[addr] += 1
+
+    def total_steps(self) -> int:
+        return sum(self.executed.values())
+
+    def hot_spots(self, n: int = 10) -> List[tuple]:
+        """The n most executed (address, count) pairs"""
+        return self.executed.most_common(n)
+
+    def listing(self, memory, source_lines: Optional[List[str]] = None) -> List[str]:
+        """Annotated listing, one line per source line (or per
+        touched address if there is no source), with execution
+        counts, share of all steps, taken/not-taken counts for
+        predicated instructions, and load and store counts.
+        """
+        total = self.total_steps() or 1
+        if source_lines is None:
+            annotated = self._disassemble(memory)
+        else:
+            annotated = [(addr, line) for addr, _, line in self._addressed(source_lines)]
+        lines = ["{:>9} {:>6} {:>11} {:>7} {:>7} {:>5}  {}".format(
+            "count", "%", "taken/not", "loads", "stores", "addr", "source")]
+        for addr, text in annotated:
+            if addr is None:
+                lines.append("{:>50}  {}".format("", text))
+                continue
+            count = self.executed[addr]
+            if addr in self.taken or addr in self.not_taken:
+                branch = "{}/{}".format(self.taken[addr], self.not_taken[addr])
+            else:
+                branch = ""
+            lines.append("{:>9} {:>6.1%} {:>11} {:>7} {:>7} {:>5}  {}".format(
+                count or "", count / total, branch,
+                self.loads[addr] or "", self.stores[addr] or "", addr, text))
+        return lines
+
+    def by_label(self, source_lines: List[str]) -> Dict[str, Counter]:
+        """Counts attributed to source labels, e.g., to see which
+        variables are used most.  Each label covers its address
+        and the following addresses up to the next label.
+        """
+        result = {}
+        label = None
+        for addr, fields, _ in self._addressed(source_lines):
+            if fields is not None and fields["label"]:
+                label = fields["label"]
+            if addr is None or label is None:
+                continue
+            counts = result.setdefault(label, Counter())
+            counts["executed"] += self.executed[addr]
+            counts["loads"] += self.loads[addr]
+            counts["stores"] += self.stores[addr]
+        return result
+
+    @staticmethod
+    def _addressed(source_lines: List[str]):
+        """Generate (address, fields, line) for each source line,
+        with address None for lines that occupy no memory and
+        fields None for lines that don't parse.  Addresses are
+        assigned as assembler_pass1.build_table does.
+        """
+        address = 0
+        for line in source_lines:
+            line = line.rstrip()
+            try:
+                fields = parse_line(line)
+            except SyntaxError:
+                yield None, None, line
+                continue
+            if fields["kind"] == AsmSrcKind.COMMENT:
+                yield None, fields, line
+            else:
+                yield address, fields, line
+                address += 1
+
+    def _disassemble(self, memory) -> List[tuple]:
+        """(address, text) for every address the program touched"""
+        touched = set(self.executed) | set(self.loads) | set(self.stores)
+        hooked = getattr(memory, "hooks_read", {})
+        lines = []
+        for addr in sorted(touched):
+            if addr in hooked:
+                text = "(memory-mapped input)"
+            elif addr in self.executed:
+                try:
+                    text = str(decode(memory.peek(addr)))
+                except ValueError:
+                    text = "DATA {}".format(memory.peek(addr))
+            else:
+                text = "DATA {}".format(memory.peek(addr))
+            lines.append((addr, text))
+        return lines
@@ -0,0 +1,41 @@
+# Sum the integers from 1 to n on several cores (see
+# multicore.py).  Core k (in r14) of c cores (in r13) adds
+# k+1, k+1+c, k+1+2c, ... and then, holding the lock at 509,
+# adds its part to the total.  Core 0 waits for the other
+# cores to finish and prints the total.  On a single CPU
+# (not a MultiCore) r13 is 0, and the program runs as one core.
+   SUB  r0,r13,r0      # no core count?
+   ADD/Z r13,r0,r0[1]  # then c = 1
+   ADD  r1,r14,r0[1]   # r1 = first term
+   ADD  r2,r0,r0       # r2 = 0
+   LOAD r3,n
+loop:
+   SUB  r0,r1,r3       # past n?
+   JUMP/P done
+   ADD  r2,r2,r1
+   ADD  r1,r1,r13      # next term for this core
+   JUMP loop
+done:
+   LOAD r4,r0,r0[509]  # test and set
+   SUB  r0,r4,r0
+   JUMP/P done         # another core holds the lock
+   LOAD r4,total
+   ADD  r4,r4,r2
+   STORE r4,total
+   LOAD r4,finished
+   ADD  r4,r4,r0[1]
+   STORE r4,finished
+   STORE r0,r0,r0[509] # release the lock
+   SUB  r0,r14,r0      # only core 0 goes on
+   JUMP/P stop
+wait:
+   LOAD r4,finished
+   SUB  r0,r4,r13
+   JUMP/M wait
+   LOAD r4,total
+   STORE r4,r0,r0[511] # Print
+stop:
+   HALT r0,r0,r0
+n: DATA 10000
+total: DATA 0
+finished: DATA 0
@@ -0,0 +1,12 @@
+# Sum the integers from n down to 1.  The loop body is
+# only three instructions, so this program is mostly
+# useful for measuring simulator speed (benchmark.py).
+   LOAD r1,n
+   ADD  r2,r0,r0       # r2 = 0
+loop:
+   ADD  r2,r2,r1       # r2 = r2 + r1
+   SUB  r1,r1,r0[1]    # r1 = r1 - 1
+   JUMP/P loop
+   STORE r2,r0,r0[511] # Print
+   HALT r0,r0,r0
+n: DATA 10000
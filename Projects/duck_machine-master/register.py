@@ -3,6 +3,8 @@ A Duck Machine register holds a 32 bit integer.
 The Zero register is special: It always holds 0. 
 """
 
+from memory import wrap_word
+
 
 class Register(object):
     """Holds a 32-bit integer"""
@@ -22,3 +24,12 @@ class ZeroRegister(Register):
 
     def put(self, value) -> None:
         pass
+
+
+class WrappingRegister(Register):
+    """A register that keeps only the low-order 32 bits of
+    what is put in it, for the strict 32-bit machine
+    """
+
+    def put(self, value) -> None:
+        self.value = wrap_word(value)
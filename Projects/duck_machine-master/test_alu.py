@@ -0,0 +1,46 @@
+"""
+Tests for alu.py:  The integer interface agrees with the
+enum interface.
+"""
+
+import unittest
+from alu import ALU, WrappingALU
+from instr_format import OpCode, CondFlag
+
+
+class TestALU(unittest.TestCase):
+
+    def test_exec(self):
+        alu = ALU()
+        self.assertEqual(alu.exec(OpCode.SUB, 3, 5), (-2, CondFlag.M))
+        self.assertEqual(alu.exec(OpCode.MUL, 3, 0), (0, CondFlag.Z))
+        self.assertEqual(alu.exec(OpCode.DIV, 7, 2), (3, CondFlag.P))
+        self.assertEqual(alu.exec(OpCode.DIV, 7, 0), (0, CondFlag.V))
+
+    def test_exec_int(self):
+        alu = ALU()
+        for op in OpCode:
+            for left, right in [(7, 2), (-7, 2), (3, -3), (0, 0), (5, 0)]:
+                result, cc = alu.exec(op, left, right)
+                self.assertEqual(alu.exec_int(op.value, left, right),
+                                 (result, cc.value))
+
+
+class TestWrappingALU(unittest.TestCase):
+
+    def test_overflow(self):
+        alu = WrappingALU()
+        self.assertEqual(alu.exec(OpCode.ADD, 2 ** 31 - 1, 1), (-2 ** 31, CondFlag.V))
+        self.assertEqual(alu.exec(OpCode.SUB, -2 ** 31, 1), (2 ** 31 - 1, CondFlag.V))
+        self.assertEqual(alu.exec(OpCode.MUL, 1 << 16, 1 << 16), (0, CondFlag.V))
+        self.assertEqual(alu.exec(OpCode.DIV, -2 ** 31, -1), (-2 ** 31, CondFlag.V))
+
+    def test_in_range(self):
+        alu = WrappingALU()
+        self.assertEqual(alu.exec(OpCode.ADD, 2 ** 31 - 2, 1), (2 ** 31 - 1, CondFlag.P))
+        self.assertEqual(alu.exec(OpCode.MUL, -(1 << 15), 1 << 16), (-2 ** 31, CondFlag.M))
+        self.assertEqual(alu.exec(OpCode.DIV, 7, 0), (0, CondFlag.V))
+
+
+if __name__ == "__main__":
+    unittest.main()
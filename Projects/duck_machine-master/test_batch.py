@@ -0,0 +1,40 @@
+"""
+Tests for batch.py:  many input streams, in order, with
+the same results in and out of a process pool.
+"""
+
+import unittest
+import batch
+from test_cpu import assemble
+
+# Print the larger of two inputs (like programs/max.asm)
+MAX = assemble("LOAD ALWAYS r1 r0 r0 510",
+               "LOAD ALWAYS r2 r0 r0 510",
+               "SUB ALWAYS r0 r1 r2 0",
+               "ADD P r15 r0 r15 3",
+               "STORE ALWAYS r2 r0 r0 511",
+               "HALT ALWAYS r0 r0 r0 0",
+               "STORE ALWAYS r1 r0 r0 511",
+               "HALT ALWAYS r0 r0 r0 0")
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_in_process(self):
+        streams = [[3, 9], [12, -4], [1]]
+        for engine in ["interp", "fast", "translate"]:
+            results = list(batch.run_batch(MAX, streams, engine=engine, jobs=1))
+            self.assertEqual([r["outputs"] for r in results], [[9], [12], []])
+            self.assertEqual([r["halted"] for r in results], [True, True, False])
+            self.assertEqual(results[0]["steps"], 6)
+            self.assertTrue(results[2]["error"].startswith("InputExhausted"))
+
+    def test_pool(self):
+        streams = [[n, 10 - n] for n in range(20)]
+        serial = list(batch.run_batch(MAX, streams, jobs=1))
+        pooled = list(batch.run_batch(MAX, streams, jobs=2))
+        self.assertEqual(serial, pooled)
+
+
+if __name__ == "__main__":
+    unittest.main()
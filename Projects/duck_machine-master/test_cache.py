@@ -0,0 +1,105 @@
+"""
+Tests for cache.py:  Hits and misses for small access
+patterns, and the same counts from every execution engine.
+"""
+
+import unittest
+from cpu import CPU
+from translate import TranslatingCPU
+from cache import Cache, parse_spec
+from test_cpu import ARRAY_SUM, ARRAY, assemble, loaded_memory
+from test_profiler import FACT_SOURCE
+
+
+def pattern(cache: Cache, *accesses) -> list:
+    """Hit (True) or miss for each access, an address or
+    ("w", address) for a store
+    """
+    results = []
+    for access in accesses:
+        if isinstance(access, tuple):
+            results.append(cache.access(access[1], True))
+        else:
+            results.append(cache.access(access))
+    return results
+
+
+class TestCache(unittest.TestCase):
+
+    def test_lines(self):
+        """Neighbors of a missed word come in with its line"""
+        cache = Cache(16, line_size=4)
+        self.assertEqual(pattern(cache, 8, 9, 11, 12, 8), [False, True, True, False, True])
+        self.assertEqual(cache.words_read, 8)
+
+    def test_conflicts(self):
+        """Two addresses that share a set evict each other unless
+        there are ways enough for both; LRU picks the victim
+        """
+        direct = Cache(4)
+        self.assertEqual(pattern(direct, 0, 4, 0), [False, False, False])
+        two_way = Cache(4, ways=2)
+        self.assertEqual(pattern(two_way, 0, 4, 0, 8, 0, 4), [False, False, True, False, True, False])
+        self.assertEqual(two_way.misses[4], 2)
+        self.assertEqual(two_way.hits[0], 2)
+
+    def test_write_policies(self):
+        back = Cache(4)
+        self.assertEqual(pattern(back, ("w", 0), 0, 4), [False, True, False])
+        self.assertEqual(back.words_written, 1)    # evicting dirty 0
+        through = Cache(4, write_back=False)
+        self.assertEqual(pattern(through, ("w", 0), 0, ("w", 0)), [False, False, True])
+        self.assertEqual(through.words_written, 2)
+        back.access(8, True)
+        back.flush()
+        self.assertEqual(back.words_written, 2)
+
+    def test_uncached(self):
+        cache = Cache(4, uncached=[510, 511])
+        cache.access(510)
+        self.assertEqual(cache.accesses(), 0)
+        self.assertFalse(cache.misses)
+
+    def test_configuration(self):
+        with self.assertRaises(ValueError):
+            Cache(12)
+        with self.assertRaises(ValueError):
+            Cache(4, ways=2, line_size=4)
+        with self.assertRaises(ValueError):
+            parse_spec("64,2,x")
+        cache = parse_spec("64,2,4,wt")
+        self.assertEqual((cache.size, cache.ways, cache.line_size, cache.n_sets), (64, 2, 4, 8))
+        self.assertFalse(cache.write_back)
+        self.assertEqual(Cache(8, ways=8).describe(), "8 words, fully associative, 1-word lines, write-back")
+
+    def test_engines(self):
+        """Interpreter, fast loop, and translator all count the
+        four loads and the store of ARRAY_SUM
+        """
+        for cpu_class, fast in [(CPU, False), (CPU, True), (TranslatingCPU, False)]:
+            mem = loaded_memory(assemble(*ARRAY_SUM) + ARRAY)
+            cpu = cpu_class(mem)
+            cpu.cache = Cache(8, line_size=4)
+            if fast:
+                cpu.run_fast()
+            else:
+                cpu.run()
+            self.assertEqual(mem.get(12), 26)
+            cache = cpu.cache
+            self.assertEqual((cache.loads, cache.stores), (4, 1))
+            self.assertEqual(sorted(cache.misses), [8, 12])
+            self.assertEqual(sum(cache.hits.values()), 3)
+
+    def test_by_label(self):
+        cache = Cache(4)
+        cache.hits[6] = 2
+        cache.misses.update({6: 1, 7: 1})
+        by_label = cache.by_label(FACT_SOURCE)
+        self.assertEqual(by_label["n"]["hits"], 2)
+        self.assertEqual(by_label["result"]["misses"], 1)
+        report = cache.report(FACT_SOURCE)
+        self.assertTrue(any(line.split()[0] == "n" for line in report))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,397 @@
+"""
+Tests for cpu.py:  Run small programs to completion and
+check the registers and memory they leave behind.
+"""
+
+import glob
+import os
+import unittest
+from memory import MemoryMappedIO, MemoryWrite
+from cpu import CPU, StepLimitExceeded, TimeLimitExceeded, InfiniteLoop
+from instr_format import CondFlag, decode, instruction_from_string
+from duck_machine import load
+from test_memory import Recorder
+
+
+LOOP = ["ADD ALWAYS r1 r0 r0 5",
+        "ADD ALWAYS r2 r2 r0 2",
+        "SUB ALWAYS r1 r1 r0 1",
+        "ADD P r15 r0 r15 -2",
+        "HALT ALWAYS r0 r0 r0 0"]
+
+SELF_MODIFYING = ["ADD ALWAYS r1 r1 r0 1",        # 0: r1 += 1
+                  "SUB ALWAYS r0 r1 r0 2",        # 1: compare r1 to 2
+                  "ADD Z r15 r0 r15 4",           # 2: second time, go to 6
+                  "LOAD ALWAYS r2 r0 r15 4",      # 3: r2 = word at 7
+                  "STORE ALWAYS r2 r0 r0 0",      # 4: overwrite word 0
+                  "ADD ALWAYS r15 r0 r0 0",       # 5: jump to 0
+                  "HALT ALWAYS r0 r0 r0 0",       # 6
+                  "HALT ALWAYS r0 r0 r0 0"]       # 7: replaces word 0
+
+# Sum an array with post-increment loads, and store the sum
+# just past the array
+ARRAY_SUM = ["ADD ALWAYS r1 r0 r15 8",         # 0: r1 = address of ARRAY
+             "ADD ALWAYS r3 r0 r0 4",          # 1: count
+             "LOAD ALWAYS r2 r1+ r0 0",        # 2: r2 = next element
+             "ADD ALWAYS r4 r4 r2 0",          # 3
+             "SUB ALWAYS r3 r3 r0 1",          # 4
+             "ADD P r15 r0 r15 -3",            # 5: loop to 2
+             "STORE ALWAYS r4 r1+ r0 0",       # 6
+             "HALT ALWAYS r0 r0 r0 0"]         # 7
+ARRAY = [5, 6, 7, 8, 0]                        # 8..12
+
+# Results that don't fit in 32 bits; 2^30 is at word 6
+OVERFLOW = ["LOAD ALWAYS r1 r0 r15 6",        # 0: r1 = 2^30
+            "ADD ALWAYS r2 r1 r1 0",          # 1: 2^31
+            "MUL ALWAYS r3 r1 r0 4",          # 2: 2^32
+            "ADD ALWAYS r4 r2 r0 -1",         # 3: r2 - 1
+            "ADD V r5 r0 r0 1",               # 4: r5 = 1 if that overflowed
+            "HALT ALWAYS r0 r0 r0 0"]         # 5
+
+
+def assemble(*instrs: str) -> list:
+    """Instruction words from strings like 'ADD ALWAYS r1 r0 r0 5'"""
+    return [instruction_from_string(s).encode() for s in instrs]
+
+
+def loaded_memory(words: list, capacity: int = 64) -> MemoryMappedIO:
+    mem = MemoryMappedIO(capacity)
+    for addr, word in enumerate(words):
+        mem.put(addr, word)
+    return mem
+
+
+class TestDecodeCache(unittest.TestCase):
+    """Decoded instructions are reused, but never stale"""
+
+    def test_loop(self):
+        """Count r1 down from 5, adding 2 to r2 each time"""
+        words = assemble(*LOOP)
+        for cached in [True, False]:
+            cpu = CPU(loaded_memory(words), decode_cache=cached)
+            cpu.run()
+            self.assertEqual(cpu.registers[2].get(), 10)
+            self.assertEqual(cpu.step_count, 17)
+
+    def test_self_modifying(self):
+        """A store over an already-decoded instruction takes effect"""
+        words = assemble(*SELF_MODIFYING)
+        cpu = CPU(loaded_memory(words))
+        cpu.run()
+        self.assertTrue(cpu.halted)
+        self.assertEqual(cpu.registers[1].get(), 1)
+        self.assertEqual(cpu.pc.get(), 1)
+
+    def test_reload(self):
+        """Loading a program over decoded code takes effect,
+        for a short load and one that covers all of memory
+        """
+        for size in [8, 64]:
+            cpu = CPU(loaded_memory(assemble(*LOOP)))
+            cpu.run()
+            program = assemble("ADD ALWAYS r2 r0 r0 7", "HALT ALWAYS r0 r0 r0 0")
+            cpu.memory.load_words(program + [0] * (size - len(program)))
+            cpu.run(0)
+            self.assertEqual(cpu.registers[2].get(), 7)
+
+
+
+class TestRunFast(unittest.TestCase):
+    """The headless loop leaves the machine in the same state as run"""
+
+    def check_same(self, words: list):
+        slow_mem = loaded_memory(words)
+        slow = CPU(slow_mem)
+        slow.run()
+        fast_mem = loaded_memory(words)
+        fast = CPU(fast_mem)
+        fast.run_fast()
+        self.assertEqual([r.get() for r in fast.registers],
+                         [r.get() for r in slow.registers])
+        self.assertEqual(fast.condition, slow.condition)
+        self.assertEqual(fast.halted, slow.halted)
+        self.assertEqual(fast.step_count, slow.step_count)
+        self.assertEqual(fast_mem._mem, slow_mem._mem)
+
+    def test_loop(self):
+        self.check_same(assemble(*LOOP))
+
+    def test_self_modifying(self):
+        self.check_same(assemble(*SELF_MODIFYING))
+
+    def test_io(self):
+        """Memory-mapped input and output hooks still fire"""
+        mem = loaded_memory(assemble("LOAD ALWAYS r1 r0 r0 60",
+                                     "MUL ALWAYS r1 r1 r1 0",
+                                     "STORE ALWAYS r1 r0 r0 61",
+                                     "HALT ALWAYS r0 r0 r0 0"))
+        out = []
+        mem.map_address_in(60, lambda addr: 9)
+        mem.map_address_out(61, lambda addr, value: out.append(value))
+        CPU(mem).run_fast()
+        self.assertEqual(out, [81])
+
+    def test_write_listener(self):
+        """A listener that wants only stores keeps the fast path"""
+        mem = loaded_memory(assemble(*SELF_MODIFYING))
+        cpu = CPU(mem)
+        recorder = Recorder()
+        mem.register_listener(recorder, MemoryWrite)
+        self.assertTrue(cpu._unobserved())
+        cpu.run_fast()
+        self.assertEqual([e.addr for e in recorder.events], [0])
+        mem.register_listener(Recorder())
+        self.assertFalse(cpu._unobserved())
+
+    def test_snapshot(self):
+        """Runs forked from a snapshot don't see each other"""
+        mem = loaded_memory(assemble(*SELF_MODIFYING))
+        cpu = CPU(mem)
+        cpu.registers[1].put(1)
+        start = cpu.snapshot()
+        cpu.run_fast()
+        self.assertEqual((cpu.pc.get(), cpu.registers[1].get()), (7, 2))
+        cpu.restore(start)
+        self.assertEqual(cpu.registers[1].get(), 1)
+        self.assertEqual(mem.get(0), assemble(SELF_MODIFYING[0])[0])
+        cpu.run()
+        self.assertEqual((cpu.pc.get(), cpu.registers[1].get()), (7, 2))
+
+
+class TestExtendedOps(unittest.TestCase):
+    """Bitwise operations, shifts, and compare"""
+
+    def test_ops(self):
+        words = assemble("ADD ALWAYS r1 r0 r0 12",        # 0b1100
+                         "AND ALWAYS r2 r1 r0 10",        # 0b1000
+                         "OR ALWAYS r3 r1 r0 3",          # 0b1111
+                         "XOR ALWAYS r4 r1 r0 10",        # 0b0110
+                         "SHL ALWAYS r5 r1 r0 33",        # count is 33 & 31
+                         "SUB ALWAYS r6 r0 r1 0",
+                         "SHR ALWAYS r6 r6 r0 3",         # -12 >> 3 rounds down
+                         "CMP ALWAYS r1 r1 r0 13",        # r1 unchanged
+                         "ADD M r7 r0 r0 1",              # r7 = 1 if r1 < 13
+                         "HALT ALWAYS r0 r0 r0 0")
+        for fast in [False, True]:
+            cpu = CPU(loaded_memory(words))
+            if fast:
+                cpu.run_fast()
+            else:
+                cpu.run()
+            self.assertEqual([reg.get() for reg in cpu.registers[1:8]],
+                             [12, 8, 15, 6, 24, -2, 1])
+
+
+class TestPostIncrement(unittest.TestCase):
+    """LOAD and STORE with src1+ step through memory"""
+
+    def test_array_sum(self):
+        for fast in [False, True]:
+            mem = loaded_memory(assemble(*ARRAY_SUM) + ARRAY)
+            cpu = CPU(mem)
+            if fast:
+                cpu.run_fast()
+            else:
+                cpu.run()
+            self.assertEqual(mem.get(12), 26)
+            self.assertEqual(cpu.registers[1].get(), 13)
+
+    def test_encoding(self):
+        instr = instruction_from_string("LOAD ALWAYS r1 r2+ r0 3")
+        self.assertEqual(decode(instr.encode()), instr)
+        self.assertTrue(decode(instr.encode() - (1 << 32)).increment)
+        self.assertEqual(str(instr), "LOAD      r1,r2+,r0[3]")
+        with self.assertRaises(ValueError):
+            instruction_from_string("ADD ALWAYS r1 r2+ r0 3")
+        # Other operations ignore the bit, and don't show it
+        add = assemble("ADD ALWAYS r1 r2 r0 3")[0] | (1 << 31)
+        self.assertEqual(str(decode(add)), "ADD      r1,r2,r0[3]")
+
+    def test_target_wins(self):
+        """Loading into src1 itself leaves the loaded value"""
+        words = assemble("ADD ALWAYS r1 r0 r0 3",
+                         "LOAD ALWAYS r1 r1+ r0 0",
+                         "HALT ALWAYS r0 r0 r0 0", "HALT ALWAYS r0 r0 r0 0")
+        for fast in [False, True]:
+            cpu = CPU(loaded_memory(words + [42]))
+            if fast:
+                cpu.run_fast()
+            else:
+                cpu.run()
+            self.assertEqual(cpu.registers[1].get(), assemble("HALT ALWAYS r0 r0 r0 0")[0])
+
+    def test_step_back(self):
+        mem = loaded_memory(assemble(*ARRAY_SUM) + ARRAY)
+        cpu = CPU(mem)
+        cpu.start_journal()
+        cpu.run()
+        cpu.step_back(100)
+        self.assertEqual([r.get() for r in cpu.registers], [0] * 16)
+        self.assertEqual(mem.get(12), 0)
+
+
+class TestWrap(unittest.TestCase):
+    """The strict 32-bit machine wraps and sets V"""
+
+    def run_overflow(self, wrap: bool, fast: bool) -> list:
+        mem = loaded_memory(assemble(*OVERFLOW) + [1 << 30])
+        cpu = CPU(mem, wrap=wrap)
+        if fast:
+            cpu.run_fast()
+        else:
+            cpu.run()
+        return [reg.get() for reg in cpu.registers[2:6]]
+
+    def test_wrap(self):
+        for fast in [False, True]:
+            self.assertEqual(self.run_overflow(True, fast),
+                             [-2 ** 31, 0, 2 ** 31 - 1, 1])
+
+    def test_no_wrap(self):
+        for fast in [False, True]:
+            self.assertEqual(self.run_overflow(False, fast),
+                             [2 ** 31, 2 ** 32, 2 ** 31 - 1, 0])
+
+    def test_load(self):
+        """Words loaded from memory are cut to 32 bits"""
+        words = assemble("LOAD ALWAYS r1 r0 r15 2", "HALT ALWAYS r0 r0 r0 0")
+        for fast in [False, True]:
+            cpu = CPU(loaded_memory(words + [2 ** 32 + 5]), wrap=True)
+            if fast:
+                cpu.run_fast()
+            else:
+                cpu.run()
+            self.assertEqual(cpu.registers[1].get(), 5)
+
+
+class TestJournal(unittest.TestCase):
+    """Stepping back undoes steps exactly"""
+
+    def test_step_back_to_start(self):
+        mem = loaded_memory(assemble(*SELF_MODIFYING))
+        cpu = CPU(mem)
+        cpu.start_journal()
+        start = [mem.get(a) for a in range(8)]
+        cpu.run()
+        # Back over the HALT and the jump, to just after the store
+        self.assertEqual(cpu.step_back(2), 2)
+        self.assertFalse(cpu.halted)
+        self.assertEqual(cpu.pc.get(), 5)
+        self.assertNotEqual(mem.get(0), start[0])
+        self.assertEqual(cpu.step_back(100), cpu_steps(SELF_MODIFYING) - 2)
+        self.assertEqual(cpu.pc.get(), 0)
+        self.assertEqual([r.get() for r in cpu.registers], [0] * 16)
+        self.assertEqual(cpu.condition, CondFlag.ALWAYS)
+        self.assertEqual([mem.get(a) for a in range(8)], start)
+        # And forward again, with the overwritten word decoded afresh
+        cpu.run()
+        self.assertEqual(cpu.registers[1].get(), 1)
+
+    def test_cap(self):
+        cpu = CPU(loaded_memory(assemble(*LOOP)))
+        cpu.start_journal(max_steps=4)
+        cpu.run()
+        self.assertEqual(cpu.step_back(10), 4)
+        self.assertEqual(cpu.pc.get(), 1)
+        self.assertEqual(cpu.registers[1].get(), 1)
+        self.assertEqual(cpu.registers[2].get(), 8)
+
+    def test_between_steps(self):
+        """Stores from outside a step are not undone with it"""
+        mem = loaded_memory(assemble(*LOOP))
+        cpu = CPU(mem)
+        cpu.start_journal()
+        mem.put(40, 1)             # before any step
+        cpu.run()
+        mem.put(41, 2)             # after the HALT
+        cpu.step_back(100)
+        self.assertEqual((mem.get(40), mem.get(41)), (1, 2))
+
+    def test_restore(self):
+        """Steps before a restored snapshot can't be undone"""
+        cpu = CPU(loaded_memory(assemble(*LOOP)))
+        cpu.start_journal()
+        snapshot = cpu.snapshot()
+        cpu.run()
+        cpu.restore(snapshot)
+        self.assertEqual(cpu.step_back(10), 0)
+        self.assertEqual(cpu.pc.get(), 0)
+
+
+def cpu_steps(program: list) -> int:
+    cpu = CPU(loaded_memory(assemble(*program)))
+    cpu.run()
+    return cpu.step_count
+
+
+class TestLimits(unittest.TestCase):
+    """Unattended runs stop instead of spinning forever"""
+
+    def run_cpu(self, words: list, **limits) -> CPU:
+        cpu = CPU(loaded_memory(words))
+        cpu.run(**limits)
+        return cpu
+
+    def test_step_limit(self):
+        words = assemble(*LOOP)
+        cpu = self.run_cpu(words, max_steps=17)
+        self.assertTrue(cpu.halted)
+        with self.assertRaises(StepLimitExceeded) as caught:
+            self.run_cpu(words, max_steps=16)
+        self.assertEqual(caught.exception.state["steps"], 16)
+        self.assertEqual(caught.exception.state["pc"], 4)
+
+    def test_time_limit(self):
+        words = assemble("ADD ALWAYS r1 r1 r0 1",
+                         "ADD ALWAYS r15 r0 r0 0")
+        with self.assertRaises(TimeLimitExceeded):
+            self.run_cpu(words, time_limit=0.05)
+
+    def test_jump_to_self(self):
+        words = assemble("ADD ALWAYS r1 r0 r0 3",
+                         "ADD ALWAYS r15 r0 r15 0")
+        with self.assertRaises(InfiniteLoop) as caught:
+            self.run_cpu(words, detect_loops=True)
+        self.assertEqual(caught.exception.state["pc"], 1)
+        self.assertEqual(caught.exception.state["registers"][1], 3)
+
+    def test_not_stuck(self):
+        """A loop that makes progress is not stuck"""
+        words = assemble("ADD ALWAYS r1 r1 r0 1",
+                         "SUB ALWAYS r0 r1 r0 5",
+                         "ADD M r15 r0 r0 0",
+                         "HALT ALWAYS r0 r0 r0 0")
+        self.assertTrue(self.run_cpu(words, detect_loops=True).halted)
+
+
+class TestLimitsFast(TestLimits):
+    """The same limits in the headless loop"""
+
+    def run_cpu(self, words: list, **limits) -> CPU:
+        cpu = CPU(loaded_memory(words))
+        cpu.run_fast(**limits)
+        return cpu
+
+
+
+class TestPrograms(unittest.TestCase):
+    """Every program in programs/ halts on a single CPU"""
+
+    def test_programs_halt(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        paths = sorted(glob.glob(os.path.join(here, "programs", "*.obj")))
+        self.assertTrue(paths)
+        for path in paths:
+            with self.subTest(program=os.path.basename(path)):
+                mem = MemoryMappedIO(512)
+                mem.map_address_in(510, lambda addr: 5)
+                mem.map_address_out(511, lambda addr, value: None)
+                with open(path, "rb") as f:
+                    entry = load(f, mem)
+                cpu = CPU(mem)
+                cpu.run_fast(entry, max_steps=1000000)
+                self.assertTrue(cpu.halted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests for devices.py:  buffered input and output through
+files, pipes, and sockets.
+"""
+
+import io
+import os
+import socket
+import unittest
+import devices
+from devices import DeviceLoop, InputDevice, OutputDevice, EndOfInput
+from memory import MemoryMappedIO
+from cpu import CPU
+from test_cpu import assemble
+
+# Copy input to output until a 0
+ECHO = assemble("LOAD ALWAYS r1 r0 r0 62",
+                "STORE ALWAYS r1 r0 r0 63",
+                "SUB ALWAYS r0 r1 r0 0",
+                "ADD Z r15 r0 r15 2",
+                "ADD ALWAYS r15 r0 r0 0",
+                "HALT ALWAYS r0 r0 r0 0")
+
+
+class TestDevices(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = DeviceLoop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def echo(self, source, sink) -> None:
+        mem = MemoryMappedIO(64)
+        mem.load_words(ECHO)
+        source = InputDevice(self.loop, source)
+        sink = OutputDevice(self.loop, sink, batch_size=7)
+        mem.map_address_in(62, source.read)
+        mem.map_address_out(63, sink.write)
+        CPU(mem).run_fast()
+        sink.close()
+
+    def test_file(self):
+        numbers = list(range(-50, 50)) + [0]
+        out = io.BytesIO()
+        self.echo(io.BytesIO(" ".join(map(str, numbers)).encode()), out)
+        self.assertEqual(out.getvalue().decode().split(), [str(n) for n in range(-50, 1)])
+
+    def test_split_numbers(self):
+        """A number split between chunks is read whole"""
+        old_chunk = devices.CHUNK_SIZE
+        devices.CHUNK_SIZE = 3
+        try:
+            out = io.BytesIO()
+            self.echo(io.BytesIO(b"12345 -678\n9 0"), out)
+        finally:
+            devices.CHUNK_SIZE = old_chunk
+        self.assertEqual(out.getvalue(), b"12345\n-678\n9\n0\n")
+
+    def test_pipe_and_socket(self):
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(write_fd, "wb") as writer:
+            writer.write(b"4 5 6 0")
+        ours, theirs = socket.socketpair()
+        with os.fdopen(read_fd, "rb") as reader:
+            self.echo(reader, ours)
+        theirs.settimeout(5)
+        received = b""
+        while not received.endswith(b"0\n"):
+            received += theirs.recv(100)
+        theirs.close()
+        self.assertEqual(received, b"4\n5\n6\n0\n")
+
+    def test_end_of_input(self):
+        source = InputDevice(self.loop, io.BytesIO(b"1"))
+        self.assertEqual(source.read(62), 1)
+        with self.assertRaises(EndOfInput):
+            source.read(62)
+
+
+if __name__ == "__main__":
+    unittest.main()
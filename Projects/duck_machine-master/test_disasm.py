@@ -0,0 +1,99 @@
+"""
+Tests for disasm.py:  Basic blocks and edges of small
+programs, and listings that assemble back to the same words.
+"""
+
+import io
+import unittest
+from unittest import mock
+
+import assembler_pass2
+import objfile
+from disasm import ControlFlowGraph, read_object
+from test_cpu import LOOP, SELF_MODIFYING, ARRAY_SUM, ARRAY, assemble
+
+
+def spans(graph: ControlFlowGraph) -> dict:
+    """(end, successors) of each block, by start"""
+    return {start: (block.end, block.successors) for start, block in graph.blocks.items()}
+
+
+class TestControlFlowGraph(unittest.TestCase):
+
+    def test_loop(self):
+        graph = ControlFlowGraph(assemble(*LOOP))
+        self.assertEqual(spans(graph), {0: (1, [1]), 1: (4, [1, 4]), 4: (5, [])})
+        self.assertEqual(graph.jumps, {3: 1})
+
+    def test_absolute_and_loaded_jumps(self):
+        """ADD r15,r0,r0[k] goes to k; LOAD r15 goes where the
+        word it loads says
+        """
+        graph = ControlFlowGraph(assemble(*SELF_MODIFYING))
+        self.assertEqual(graph.jumps[5], 0)
+        self.assertEqual(graph.jumps[2], 6)
+        words = assemble("LOAD ALWAYS r15 r0 r15 3", "HALT ALWAYS r0 r0 r0 0",
+                         "HALT ALWAYS r0 r0 r0 0") + [1]
+        self.assertEqual(ControlFlowGraph(words).jumps, {0: 1})
+
+    def test_dead_code_and_data(self):
+        words = assemble("ADD ALWAYS r15 r0 r15 2",
+                         "ADD ALWAYS r1 r0 r0 1",       # jumped over
+                         "HALT ALWAYS r0 r0 r0 0") + [5, 0]
+        graph = ControlFlowGraph(words)
+        self.assertEqual(graph.unreached(), [1])
+        listing = graph.listing()
+        self.assertIn("DATA 5", listing[-2])
+        self.assertIn("unreached: ADD", [line for line in listing if "# 1 " in line][0])
+
+    def test_indirect(self):
+        graph = ControlFlowGraph(assemble("ADD ALWAYS r15 r1 r0 0", "HALT ALWAYS r0 r0 r0 0"))
+        self.assertTrue(graph.blocks[0].indirect)
+        self.assertEqual(graph.blocks[0].successors, [])
+        self.assertIn('"L0" -> "?" [style=dotted];', graph.dot())
+
+    def test_listing_assembles(self):
+        """Labels from symbols, and every word back as it was"""
+        words = assemble(*ARRAY_SUM) + ARRAY
+        graph = ControlFlowGraph(words, symbols={"loop": 2, "array": 8})
+        listing = graph.listing()
+        self.assertIn("loop:", listing)
+        self.assertIn("-> loop", listing[[i for i, line in enumerate(listing)
+                                          if "# 5 " in line][0]])
+        self.assertEqual(assembler_pass2.assemble(listing), words)
+        dot = graph.dot()
+        self.assertIn('"loop" -> "loop";', dot)
+        self.assertIn('"loop" -> "L6" [style=dashed];', dot)
+
+    def test_round_trip(self):
+        """Negative data, and reached words the assembler can't
+        write as instructions, come back as DATA
+        """
+        add, mz, halt = assemble("ADD ALWAYS r1 r0 r0 1", "SUB M r2 r0 r0 1",
+                                 "HALT ALWAYS r0 r0 r0 0")
+        mz |= 2 << 22            # predicate MZ
+        words = [add | 1 << 31, mz, halt, -5, -1]
+        listing = ControlFlowGraph(words).listing()
+        self.assertIn("DATA -5", listing[-2])
+        self.assertIn("executes as: ADD      r1,r0,r0[1]", listing[1])
+        self.assertIn("executes as: SUB/MZ", listing[2])
+        self.assertEqual([word & 0xFFFFFFFF for word in assembler_pass2.assemble(listing)],
+                         [word & 0xFFFFFFFF for word in words])
+
+    def test_without_numpy(self):
+        words = assemble(*ARRAY_SUM, *SELF_MODIFYING) + ARRAY
+        fast = ControlFlowGraph(words)
+        with mock.patch("disasm.np", None):
+            slow = ControlFlowGraph(words)
+        self.assertEqual(slow.listing(), fast.listing())
+        self.assertEqual(spans(slow), spans(fast))
+
+    def test_read_binary(self):
+        file = io.BytesIO()
+        objfile.write_binary(file, [1, -2, 3], entry=1, symbols={"start": 1})
+        file.seek(0)
+        self.assertEqual(read_object(file), ([1, -2, 3], 1, {"start": 1}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests for instr_format.py:  Packing and unpacking whole
+instruction words, and bulk decoding, agree with handling
+one field or one word at a time.
+"""
+
+import unittest
+from bitfield import BitField
+from instr_format import (LAYOUT, decode, decode_many, is_instruction, np,
+                          instr_field, offset_field, reg_src2_field)
+from test_cpu import LOOP, SELF_MODIFYING, assemble
+
+
+class TestLayout(unittest.TestCase):
+    """Generated pack and unpack agree with BitField"""
+
+    def test_pack_matches_insert(self):
+        for values in [(3, 15, 1, 2, 3, -5), (7, 0, 15, 15, 15, 511),
+                       (31, 8, 0, 0, 0, -512)]:
+            word = 0
+            word = instr_field.insert(values[0], word)
+            word = reg_src2_field.insert(values[4], word)
+            word = offset_field.insert(values[5], word)
+            for field, value in zip(LAYOUT.fields[1:4], values[1:4]):
+                word = field[1].insert(value, word)
+            self.assertEqual(LAYOUT.pack(*values), word)
+            self.assertEqual(LAYOUT.unpack(word), values)
+
+    def test_unpack_signed_word(self):
+        """Memory may hold the word as a negative integer"""
+        word = LAYOUT.pack(2, 15, 1, 0, 15, -1) | (1 << 31)
+        self.assertEqual(LAYOUT.unpack(word - (1 << 32)), LAYOUT.unpack(word))
+
+    def test_mask(self):
+        self.assertEqual(BitField(4, 7).mask, 0xf0)
+        self.assertEqual(BitField(0, 31).mask, 0xffffffff)
+
+
+@unittest.skipIf(np is None, "decode_many requires NumPy")
+class TestDecodeMany(unittest.TestCase):
+
+    def test_matches_decode(self):
+        words = assemble(*LOOP, *SELF_MODIFYING, "STORE M r3 r4+ r5 -512",
+                         "ADD ALWAYS r1 r2 r3 511")
+        decoded = decode_many(words)
+        self.assertEqual(len(decoded), len(words))
+        for word, record in zip(words, decoded):
+            instr = decode(word)
+            self.assertEqual(
+                (instr.op.value, instr.cond.value, instr.reg_target,
+                 instr.reg_src1, instr.reg_src2, instr.offset, instr.increment),
+                tuple(record.tolist()))
+
+    def test_signed_words_and_data(self):
+        """Words from signed 32-bit memory decode the same as
+        unsigned; data words are flagged as not instructions.
+        """
+        word = assemble("DIV V r15 r14 r13 -1")[0] | (1 << 31)
+        signed = word - (1 << 32)
+        decoded = decode_many(np.array([word, signed, 4 << 26, 0], dtype=np.int64))
+        self.assertEqual(decoded[0], decoded[1])
+        self.assertEqual(decoded["offset"][1], -1)
+        self.assertEqual(list(is_instruction(decoded)), [True, True, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Tests for memory.py:  bounds checking, events, the
+array-backed CompactMemory, the lazily allocated PagedMemory,
+and snapshots.
+"""
+
+import unittest
+from memory import (Memory, CompactMemory, CompactMemoryMappedIO, PagedMemory,
+                    PagedMemoryMappedIO, MemoryEvent, MemoryRead, MemoryWrite, MemoryLoaded,
+                    SegFault, wrap_word)
+from mvc import MVCListener
+
+
+class Recorder(MVCListener):
+    """Remember every event"""
+
+    def __init__(self):
+        self.events = []
+
+    def notify(self, event):
+        self.events.append(event)
+
+
+class TestMemory(unittest.TestCase):
+
+    def test_get_put(self):
+        for mem in [Memory(16), CompactMemory(16), PagedMemory(16)]:
+            mem.put(3, 42)
+            mem.put(15, -7)
+            self.assertEqual(mem.get(3), 42)
+            self.assertEqual(mem.get(15), -7)
+            self.assertEqual(mem.get(0), 0)
+
+    def test_bounds(self):
+        for mem in [Memory(16), CompactMemory(16), PagedMemory(16)]:
+            with self.assertRaises(SegFault):
+                mem.get(16)
+            with self.assertRaises(SegFault):
+                mem.get(-1)
+            with self.assertRaises(SegFault):
+                mem.put(-1, 0)
+
+    def test_wraparound(self):
+        mem = CompactMemory(4)
+        mem.put(0, 2 ** 31)
+        mem.put(1, 2 ** 32 + 5)
+        mem.put(2, -2 ** 31 - 1)
+        self.assertEqual(mem.get(0), -2 ** 31)
+        self.assertEqual(mem.get(1), 5)
+        self.assertEqual(mem.get(2), 2 ** 31 - 1)
+        self.assertEqual(wrap_word(2 ** 31 - 1), 2 ** 31 - 1)
+
+    def test_load_words(self):
+        for mem in [Memory(8), CompactMemory(8), PagedMemory(8)]:
+            recorder = Recorder()
+            mem.register_listener(recorder)
+            mem.load_words([1, 2, 3], 4)
+            self.assertEqual([mem.get(a) for a in range(8)],
+                             [0, 0, 0, 0, 1, 2, 3, 0])
+            # One event for the whole load, not a write per word
+            stores = [e for e in recorder.events if not isinstance(e, MemoryRead)]
+            self.assertEqual(len(stores), 1)
+            loaded = stores[0]
+            self.assertIsInstance(loaded, MemoryLoaded)
+            self.assertEqual((loaded.addr, list(loaded.words)), (4, [1, 2, 3]))
+            with self.assertRaises(SegFault):
+                mem.load_words([1, 2, 3], 6)
+
+    def test_subscriptions(self):
+        """Listeners get only the classes of event they asked for"""
+        mem = Memory(8)
+        everything, writes, both = Recorder(), Recorder(), Recorder()
+        mem.register_listener(everything)
+        mem.register_listener(writes, MemoryWrite)
+        mem.register_listener(both, MemoryEvent)
+        mem.put(1, 5)
+        mem.get(1)
+        self.assertEqual(len(everything.events), 2)
+        self.assertEqual(len(both.events), 2)
+        self.assertEqual([type(e) for e in writes.events], [MemoryWrite])
+        self.assertEqual(mem.subscribers[MemoryRead], (everything.notify, both.notify))
+        mem.unregister_listener(everything)
+        mem.unregister_listener(both)
+        self.assertEqual(mem.listeners, (writes,))
+        self.assertEqual(mem.subscribers[MemoryRead], ())
+
+    def test_compact_io(self):
+        mem = CompactMemoryMappedIO(8)
+        out = []
+        mem.map_address_in(6, lambda addr: 99)
+        mem.map_address_out(7, lambda addr, value: out.append(value))
+        mem.put(7, 12)
+        self.assertEqual(out, [12])
+        self.assertEqual(mem.get(6), 99)
+        self.assertEqual(mem.get(7), 0)
+
+    def test_snapshot_restore(self):
+        for mem in [Memory(200), CompactMemory(200), PagedMemory(200)]:
+            mem.load_words(list(range(200)))
+            first = mem.snapshot()
+            mem.put(5, -5)
+            mem.put(199, -199)
+            second = mem.snapshot()
+            # Only the written pages were copied again
+            self.assertIs(second.pages[1], first.pages[1])
+            self.assertIsNot(second.pages[0], first.pages[0])
+            mem.put(100, 0)
+            mem.restore(first)
+            self.assertEqual([mem.get(a) for a in [5, 100, 199]], [5, 100, 199])
+            mem.restore(second)
+            self.assertEqual([mem.get(a) for a in [5, 100, 199]], [-5, 100, -199])
+            with self.assertRaises(ValueError):
+                Memory(100).restore(first)
+
+    def test_restore_events(self):
+        """Listeners hear about exactly the words that change"""
+        mem = Memory(200)
+        saved = mem.snapshot()
+        mem.put(3, 1)
+        mem.put(4, 0)
+        mem.put(150, 2)
+        recorder = Recorder()
+        mem.register_listener(recorder)
+        mem.restore(saved)
+        self.assertEqual([e.addr for e in recorder.events], [3, 150])
+        self.assertEqual(mem.get(150), 0)
+
+    def test_paged(self):
+        """Pages are allocated when first written, and given
+        back when a snapshot without them is restored
+        """
+        mem = PagedMemoryMappedIO(1 << 24)
+        mem.map_address_in(5, lambda addr: 99)
+        self.assertEqual(mem.get((1 << 24) - 1), 0)
+        self.assertEqual(mem.resident_pages(), 0)
+        empty = mem.snapshot()
+        mem.load_words([1, 2, 3], 62)           # Straddles pages 0 and 1
+        mem.put(1 << 23, 7)
+        self.assertEqual(mem.resident_pages(), 3)
+        self.assertEqual([mem.get(a) for a in [5, 63, 64, 1 << 23]], [99, 2, 3, 7])
+        full = mem.snapshot()
+        self.assertEqual(list(PagedMemory(130).snapshot().words()), 130 * [0])
+        mem.restore(empty)
+        self.assertEqual(mem.resident_pages(), 0)
+        mem.restore(full)
+        self.assertEqual(mem.get(1 << 23), 7)
+        with self.assertRaises(SegFault):
+            mem.put(1 << 24, 0)
+        # Large by default, like PagedMemory
+        self.assertEqual(PagedMemoryMappedIO().capacity, PagedMemory().capacity)
+
+
+if __name__ == "__main__":
+    unittest.main()
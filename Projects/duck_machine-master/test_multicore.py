@@ -0,0 +1,78 @@
+"""
+Tests for multicore.py:  Cores share memory and take turns
+on a lock, deterministically or in threads.
+"""
+
+import os
+import unittest
+from memory import MemoryMappedIO
+import multicore
+from multicore import MultiCore
+from cpu import StepLimitExceeded
+from test_cpu import assemble
+
+PROGRAM = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "programs", "parallel_sum.obj")
+
+
+def parallel_sum(n: int, cores: int) -> (MultiCore, list):
+    """programs/parallel_sum.obj, summing 1..n"""
+    with open(PROGRAM) as f:
+        words = [int(line) for line in f]
+    words[-3] = n   # n: DATA ...
+    mem = MemoryMappedIO(512)
+    out = []
+    mem.map_address_out(511, lambda addr, value: out.append(value))
+    mem.load_words(words)
+    return MultiCore(mem, cores), out
+
+
+class TestMultiCore(unittest.TestCase):
+
+    def test_test_and_set(self):
+        lock = multicore.TestAndSet()
+        self.assertEqual(lock.read(509), 0)
+        self.assertEqual(lock.read(509), 1)
+        lock.write(509, 0)
+        self.assertEqual(lock.read(509), 0)
+
+    def test_round_robin(self):
+        """The same interleaving every time"""
+        counts = set()
+        for _ in range(2):
+            machine, out = parallel_sum(100, 3)
+            machine.run_round_robin(quantum=2)
+            self.assertEqual(out, [5050])
+            self.assertTrue(machine.halted)
+            counts.add(tuple(core.step_count for core in machine.cores))
+        self.assertEqual(len(counts), 1)
+
+    def test_threaded(self):
+        for fast in [True, False]:
+            machine, out = parallel_sum(1000, 4)
+            machine.run_threaded(fast=fast, max_steps=10 ** 6)
+            self.assertEqual(out, [500500])
+
+    def test_shared_stores(self):
+        """A store by one core is seen by the others"""
+        mem = MemoryMappedIO(64)
+        mem.load_words(assemble("SUB ALWAYS r0 r14 r0 0",     # core 0?
+                                "ADD P r15 r0 r15 4",         # no: go to 5
+                                "ADD ALWAYS r1 r0 r0 7",
+                                "STORE ALWAYS r1 r0 r0 40",
+                                "HALT ALWAYS r0 r0 r0 0",
+                                "LOAD ALWAYS r1 r0 r0 40",    # 5: wait for 7
+                                "SUB ALWAYS r0 r1 r0 0",
+                                "ADD Z r15 r0 r15 -2",
+                                "HALT ALWAYS r0 r0 r0 0"))
+        machine = MultiCore(mem, 2)
+        machine.run_round_robin()
+        self.assertEqual(machine.cores[1].registers[1].get(), 7)
+        # Alone, core 1 waits forever
+        mem.put(40, 0)
+        with self.assertRaises(StepLimitExceeded):
+            MultiCore(mem, 2).cores[1].run(5, max_steps=100)
+
+
+if __name__ == "__main__":
+    unittest.main()
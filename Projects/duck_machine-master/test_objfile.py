@@ -0,0 +1,54 @@
+"""
+Tests for objfile.py:  binary object files survive a round
+trip and load into either kind of memory.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+import objfile
+from memory import Memory, CompactMemory
+
+WORDS = [130300935, 264765440, -5, 0, 2 ** 31 - 1]
+SYMBOLS = {"start": 0, "loop": 2, "n": 4}
+
+
+class TestObjfile(unittest.TestCase):
+
+    def test_round_trip_mapped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prog.dobj")
+            with open(path, "wb") as f:
+                objfile.write_binary(f, WORDS, 2, SYMBOLS)
+            for memory_class in [Memory, CompactMemory]:
+                mem = memory_class(8)
+                with open(path, "rb") as f:
+                    self.assertTrue(objfile.is_binary(f))
+                    with objfile.ObjectImage(f) as image:
+                        self.assertEqual(image.entry, 2)
+                        self.assertEqual(image.symbols, SYMBOLS)
+                        mem.load_words(image.words)
+                self.assertEqual([mem.get(a) for a in range(5)], WORDS)
+
+    def test_round_trip_unmapped(self):
+        buf = io.BytesIO()
+        objfile.write_binary(buf, WORDS)
+        buf.seek(0)
+        self.assertTrue(objfile.is_binary(buf))
+        with objfile.ObjectImage(buf) as image:
+            self.assertEqual(list(image.words), WORDS)
+            self.assertEqual(image.entry, 0)
+
+    def test_not_binary(self):
+        text = io.BytesIO(b"130300935\n264765440\n")
+        self.assertFalse(objfile.is_binary(text))
+        self.assertEqual(text.read(), b"130300935\n264765440\n")
+        with self.assertRaises(objfile.ObjectFileError):
+            objfile.ObjectImage(io.BytesIO(b"DUCK\x01\x00\x00\x00\x00\x00\x00\x00\x09"
+                                           b"\x00\x00\x00\x00\x00\x00\x00"))
+
+
+if __name__ == "__main__":
+    unittest.main()
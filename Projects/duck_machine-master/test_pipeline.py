@@ -0,0 +1,54 @@
+"""
+Tests for pipeline.py:  Cycle counts of small programs
+on the five-stage pipeline model.
+"""
+
+import unittest
+from cpu import CPU
+from pipeline import PipelineModel, LOAD_USE, BRANCH, MEMORY
+from test_cpu import LOOP, assemble, loaded_memory
+
+
+def model_run(words: list, memory_latency: int = 1) -> PipelineModel:
+    cpu = CPU(loaded_memory(words))
+    model = PipelineModel(cpu, memory_latency)
+    cpu.run()
+    model.close()
+    return model
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_straight_line(self):
+        """One cycle per instruction, after filling the pipeline"""
+        model = model_run(assemble("ADD ALWAYS r1 r0 r0 1",
+                                   "ADD ALWAYS r2 r1 r1 0",   # forwarded
+                                   "HALT ALWAYS r0 r0 r0 0"))
+        self.assertEqual(model.cycles(), 3 + 4)
+        self.assertEqual(sum(model.stalls.values()), 0)
+
+    def test_load_use(self):
+        words = assemble("LOAD ALWAYS r1 r0 r15 4",
+                         "ADD ALWAYS r2 r1 r0 0",             # waits for r1
+                         "LOAD ALWAYS r3 r0 r15 2",
+                         "HALT ALWAYS r0 r0 r0 0") + [7]
+        model = model_run(words)
+        self.assertEqual(model.stalls[LOAD_USE], 1)
+        self.assertEqual(model.stalls_at[1], 1)
+        slow = model_run(words, memory_latency=3)
+        self.assertEqual(slow.stalls[MEMORY], 4)
+        self.assertEqual(slow.cycles(), model.cycles() + 4)
+
+    def test_branches(self):
+        """Each taken jump back flushes two instructions; the
+        predicated jump that falls through costs nothing
+        """
+        model = model_run(assemble(*LOOP))
+        self.assertEqual(model.instructions, 17)
+        self.assertEqual(model.stalls[BRANCH], 2 * 4)
+        self.assertEqual(model.cycles(), 17 + 4 + 8)
+        self.assertAlmostEqual(model.cpi(), 29 / 17)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Tests for profiler.py:  Count a small program's execution
+and join the counts to its source.
+"""
+
+import unittest
+from cpu import CPU
+from translate import TranslatingCPU
+from profiler import Profile
+from test_cpu import LOOP, SELF_MODIFYING, assemble, loaded_memory
+
+FACT_SOURCE = """# Three factorial
+    LOAD r1,n
+    ADD  r2,r0,r0[1]
+loop:
+    MUL  r2,r2,r1
+    SUB  r1,r1,r0[1]
+    ADD/P r15,r0,loop
+    STORE r2,result
+    HALT r0,r0,r0
+n:  DATA 3
+result: DATA 0
+""".splitlines()
+
+
+class TestProfile(unittest.TestCase):
+
+    def test_counts(self):
+        """Steps, and predicated instructions taken and not taken"""
+        cpu = CPU(loaded_memory(assemble(*LOOP)))
+        cpu.profile = Profile()
+        cpu.run()
+        profile = cpu.profile
+        self.assertEqual(profile.total_steps(), cpu.step_count)
+        self.assertEqual(profile.executed[1], 5)
+        self.assertEqual((profile.taken[3], profile.not_taken[3]), (4, 1))
+        self.assertNotIn(1, profile.taken)
+        self.assertEqual(profile.hot_spots(1), [(1, 5)])
+
+    def test_profiling_disables_fast_paths(self):
+        """Other engines interpret, so every step is counted"""
+        cpu = TranslatingCPU(loaded_memory(assemble(*SELF_MODIFYING)))
+        cpu.profile = Profile()
+        cpu.run()
+        self.assertEqual(cpu.profile.total_steps(), cpu.step_count)
+        self.assertEqual(cpu.profile.stores[0], 1)
+        self.assertEqual(cpu.profile.loads[7], 1)
+
+    def test_source_listing(self):
+        """Counts line up with the assembler's addresses"""
+        profile = Profile()
+        profile.executed.update({0: 1, 2: 3, 4: 3})
+        profile.loads[6] = 1
+        listing = profile.listing(loaded_memory([]), FACT_SOURCE)
+        self.assertEqual(len(listing), len(FACT_SOURCE) + 1)
+        mul = [line for line in listing if "MUL" in line][0]
+        self.assertEqual(mul.split()[0], "3")
+        self.assertIn("    2  ", mul)
+        self.assertIn("n:  DATA 3", [line for line in listing if line.endswith("DATA 3")][0])
+        by_label = profile.by_label(FACT_SOURCE)
+        self.assertEqual(by_label["loop"]["executed"], 6)
+        self.assertEqual(by_label["n"]["loads"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
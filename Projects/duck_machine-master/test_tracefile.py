@@ -0,0 +1,103 @@
+"""
+Tests for tracefile.py:  A replayed trace ends in the same
+state as the run that recorded it.
+"""
+
+import io
+import unittest
+from cpu import CPU
+from memory import PagedMemory
+from tracefile import (TraceRecorder, TraceReader, TraceReplay,
+                       TraceFormatError, zigzag, unzigzag, put_varint, get_varint)
+from test_cpu import LOOP, SELF_MODIFYING, ARRAY_SUM, ARRAY, assemble, loaded_memory
+from test_memory import Recorder
+
+
+def record(words: list) -> (CPU, bytes):
+    cpu = CPU(loaded_memory(words))
+    out = io.BytesIO()
+    recorder = TraceRecorder(cpu, out)
+    cpu.run()
+    recorder.close()
+    return cpu, out.getvalue()
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_varint(self):
+        for value in [0, 1, -1, 63, -64, 64, 2 ** 31 - 1, -2 ** 31, 2 ** 40]:
+            self.assertEqual(unzigzag(zigzag(value)), value)
+            buf = bytearray()
+            put_varint(buf, zigzag(value))
+            self.assertEqual(get_varint(bytes(buf), 0), (zigzag(value), len(buf)))
+
+    def test_replay(self):
+        for words in [assemble(*LOOP), assemble(*SELF_MODIFYING),
+                      assemble(*ARRAY_SUM) + ARRAY]:
+            cpu, data = record(words)
+            replay = TraceReplay(TraceReader(io.BytesIO(data)))
+            steps = []
+            while not replay.halted:
+                step = replay.step()
+                if step is not None:
+                    steps.append(step)
+            self.assertEqual(len(steps), cpu.step_count)
+            self.assertEqual([r.get() for r in replay.registers[:15]],
+                             [r.get() for r in cpu.registers[:15]])
+            self.assertEqual(replay.condition, cpu.condition)
+            self.assertEqual(replay.memory._mem, cpu.memory._mem)
+
+    def test_replay_events(self):
+        """Listeners see a CPUStep per step, and each memory write"""
+        cpu, data = record(assemble(*SELF_MODIFYING))
+        replay = TraceReplay(TraceReader(io.BytesIO(data)))
+        listener = Recorder()
+        replay.register_listener(listener)
+        replay.memory.register_listener(listener)
+        while replay.step() is not None:
+            pass
+        self.assertEqual([e.pc_addr for e in listener.events if hasattr(e, "pc_addr")],
+                         [0, 1, 2, 3, 4, 5, 0])
+        self.assertEqual([e.addr for e in listener.events if hasattr(e, "value")
+                          and e.addr is not None], [0])
+
+    def test_compact(self):
+        """A step that writes a small change to one register
+        takes a few bytes, not the words and registers in full
+        """
+        cpu, data = record(assemble(*LOOP))
+        header = TraceReader(io.BytesIO(data))._steps_start
+        self.assertLessEqual(len(data) - header, 5 * cpu.step_count)
+
+    def test_large_memory(self):
+        """Only pages with something in them go in the header,
+        and a large memory is replayed into a paged one
+        """
+        mem = PagedMemory(1 << 20)
+        mem.load_words(assemble(*ARRAY_SUM))
+        mem.load_words(ARRAY, 8)
+        mem.put(700000, 42)
+        cpu = CPU(mem)
+        out = io.BytesIO()
+        recorder = TraceRecorder(cpu, out)
+        cpu.run()
+        recorder.close()
+        data = out.getvalue()
+        self.assertLess(len(data), 500)
+        replay = TraceReplay(TraceReader(io.BytesIO(data)))
+        self.assertIsInstance(replay.memory, PagedMemory)
+        while replay.step() is not None:
+            pass
+        self.assertEqual(replay.step_count, cpu.step_count)
+        self.assertEqual([replay.memory.get(a) for a in [12, 700000]], [26, 42])
+        self.assertEqual(replay.memory.resident_pages(), 2)
+
+    def test_not_a_trace(self):
+        with self.assertRaises(TraceFormatError):
+            TraceReader(io.BytesIO(b"DUCK\x01"))
+        with self.assertRaises(TraceFormatError):
+            TraceReader(io.BytesIO(b"DTRC\x02"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Tests for translate.py:  The block-translating CPU must leave
+the machine in exactly the state the interpreter would.
+"""
+
+import unittest
+from memory import SegFault
+from cpu import CPU
+from translate import TranslatingCPU, clear_translations
+import test_cpu
+from test_cpu import (LOOP, SELF_MODIFYING, OVERFLOW, ARRAY_SUM, ARRAY,
+                      assemble, loaded_memory)
+
+
+class TestTranslatingCPU(unittest.TestCase):
+    """Translated blocks match CPU.run"""
+
+    def run_both(self, words: list, inputs: list = None, wrap: bool = False):
+        """Run the program with both CPUs and compare final states"""
+        results = []
+        for cpu_class in [CPU, TranslatingCPU]:
+            mem = loaded_memory(words)
+            feed = iter(inputs or [])
+            out = []
+            mem.map_address_in(60, lambda addr: next(feed))
+            mem.map_address_out(61, lambda addr, value: out.append(value))
+            cpu = cpu_class(mem, wrap=wrap)
+            cpu.run()
+            results.append(cpu)
+            results.append(mem)
+            results.append(out)
+        interp, interp_mem, interp_out, trans, trans_mem, trans_out = results
+        self.assertEqual([r.get() for r in trans.registers],
+                         [r.get() for r in interp.registers])
+        self.assertEqual(trans.condition, interp.condition)
+        self.assertEqual(trans.halted, interp.halted)
+        self.assertEqual(trans.step_count, interp.step_count)
+        self.assertEqual(trans_mem._mem, interp_mem._mem)
+        self.assertEqual(trans_out, interp_out)
+        return trans
+
+    def test_loop(self):
+        self.run_both(assemble(*LOOP))
+
+    def test_self_modifying(self):
+        self.run_both(assemble(*SELF_MODIFYING))
+
+    def test_store_into_own_block(self):
+        """A store over a later instruction of the running block"""
+        words = assemble("LOAD ALWAYS r1 r0 r15 4",      # 0: r1 = word at 4
+                         "STORE ALWAYS r1 r0 r15 1",     # 1: overwrite word 2
+                         "ADD ALWAYS r2 r0 r0 7",        # 2: replaced by halt
+                         "HALT ALWAYS r0 r0 r0 0",       # 3
+                         "HALT ALWAYS r0 r0 r0 0")       # 4
+        cpu = self.run_both(words)
+        self.assertEqual(cpu.registers[2].get(), 0)
+
+    def test_io_and_conditions(self):
+        """Input, output, division by zero, and predicated stores"""
+        words = assemble("LOAD ALWAYS r1 r0 r0 60",      # read
+                         "LOAD ALWAYS r2 r0 r0 60",      # read
+                         "DIV ALWAYS r3 r1 r2 0",        # maybe V
+                         "STORE V r1 r0 r0 61",          # print if V
+                         "SUB ALWAYS r0 r1 r2 0",
+                         "STORE M r2 r0 r0 61",          # print if r1 < r2
+                         "STORE ALWAYS r15 r0 r0 61",    # print pc
+                         "HALT ALWAYS r0 r0 r0 0")
+        self.run_both(words, [12, 0])
+        self.run_both(words, [3, 4])
+
+    def test_extended_ops(self):
+        words = assemble("LOAD ALWAYS r1 r0 r0 60",
+                         "SHL ALWAYS r2 r1 r0 4",
+                         "SHR ALWAYS r3 r2 r0 2",
+                         "XOR ALWAYS r4 r3 r1 0",
+                         "AND ALWAYS r5 r4 r0 -1",
+                         "OR ALWAYS r5 r5 r2 0",
+                         "CMP ALWAYS r15 r5 r0 0",       # no jump
+                         "STORE P r5 r0 r0 61",
+                         "HALT ALWAYS r0 r0 r0 0")
+        self.run_both(words, [5])
+        self.run_both(words, [-5])
+        self.run_both(words, [1 << 30], wrap=True)
+
+    def test_post_increment(self):
+        self.run_both(assemble(*ARRAY_SUM) + ARRAY)
+        self.run_both(assemble(*ARRAY_SUM) + ARRAY, wrap=True)
+
+    def test_wrap(self):
+        cpu = self.run_both(assemble(*OVERFLOW) + [1 << 30], wrap=True)
+        self.assertEqual(cpu.registers[5].get(), 1)
+
+    def test_segfault(self):
+        """A bad address raises SegFault with the same state"""
+        words = assemble("ADD ALWAYS r1 r0 r0 5",
+                         "LOAD ALWAYS r2 r0 r0 -1",
+                         "HALT ALWAYS r0 r0 r0 0")
+        for cpu_class in [CPU, TranslatingCPU]:
+            cpu = cpu_class(loaded_memory(words))
+            with self.assertRaises(SegFault):
+                cpu.run()
+            self.assertEqual(cpu.registers[1].get(), 5)
+            self.assertEqual(cpu.pc.get(), 2)
+            self.assertEqual(cpu.step_count, 1)
+
+    def test_reuse(self):
+        """A new CPU running the same program uses the code
+        compiled before; a changed block is compiled again
+        """
+        clear_translations()
+        words = assemble(*LOOP)
+        first = TranslatingCPU(loaded_memory(words))
+        first.run()
+        again = TranslatingCPU(loaded_memory(words))
+        again.run()
+        self.assertIs(again.block_cache.blocks[0].__code__,
+                      first.block_cache.blocks[0].__code__)
+        words[2] = assemble("SUB ALWAYS r1 r1 r0 5")[0]
+        changed = self.run_both(words)
+        self.assertIsNot(changed.block_cache.blocks[0].__code__,
+                         first.block_cache.blocks[0].__code__)
+        self.assertEqual(changed.registers[2].get(), 2)
+
+    def test_fetch_faults(self):
+        """A jump out of memory, or to a word that is not an
+        instruction, counts the steps before it as CPU.run does
+        """
+        jumps = [assemble("XOR ALWAYS r2 r9 r9 17",
+                          "OR ALWAYS r15 r1 r15 -5"),        # to -4
+                 assemble("ADD ALWAYS r1 r0 r0 1",
+                          "ADD ALWAYS r15 r0 r15 1") + [-1]]  # to 2, data
+        for words in jumps:
+            results = []
+            for cpu_class in [CPU, TranslatingCPU]:
+                cpu = cpu_class(loaded_memory(words))
+                with self.assertRaises((SegFault, ValueError)):
+                    cpu.run()
+                results.append(([r.get() for r in cpu.registers], cpu.step_count))
+            self.assertEqual(results[1], results[0])
+            self.assertEqual(results[0][1], 2)
+
+    def test_device_raises(self):
+        """A device that raises partway through a block leaves
+        the same registers and step count as in the interpreter
+        """
+        words = assemble("ADD ALWAYS r1 r0 r0 5",
+                         "STORE ALWAYS r1 r0 r0 61",     # printed
+                         "ADD ALWAYS r2 r0 r0 6",
+                         "STORE ALWAYS r2 r0 r0 61",     # printer jams
+                         "ADD ALWAYS r3 r0 r0 7",
+                         "HALT ALWAYS r0 r0 r0 0")
+        states = []
+        for cpu_class in [CPU, TranslatingCPU]:
+            mem = loaded_memory(words)
+            out = []
+
+            def jam(addr: int, value: int) -> None:
+                if out:
+                    raise IOError("Printer jammed")
+                out.append(value)
+
+            mem.map_address_out(61, jam)
+            cpu = cpu_class(mem)
+            with self.assertRaises(IOError):
+                cpu.run()
+            states.append(([r.get() for r in cpu.registers], cpu.step_count, out))
+        self.assertEqual(states[1], states[0])
+        self.assertEqual(states[0][1], 3)
+
+
+class TestLimitsTranslated(test_cpu.TestLimits):
+    """The same limits in the block dispatcher"""
+
+    def run_cpu(self, words: list, **limits) -> CPU:
+        cpu = TranslatingCPU(loaded_memory(words))
+        cpu.run(**limits)
+        return cpu
+
+
+if __name__ == "__main__":
+    unittest.main()
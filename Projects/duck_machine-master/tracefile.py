@@ -0,0 +1,415 @@
+"""
+Execution traces of the Duck Machine, recorded to a compact
+binary file and replayed offline.
+
+A TraceRecorder listens to a CPU and its memory, like the
+graphical view does, and writes one record per step:  the
+program counter, the instruction word, the register the step
+wrote and the memory words it stored, and the condition code.
+Records are written as the program runs, so a long run is never
+held in memory.  A TraceReplay reads the file back into a stand-in
+for the CPU that announces the same CPUStep and MemoryWrite events,
+so the graphical view or an analysis tool can step through the run
+at its own pace, long after the program itself ran at full speed.
+
+Layout:
+
+   header        b"DTRC", version (1 byte), memory capacity,
+                 the 16 initial register values, then the initial
+                 contents of memory:  the number of pages (of
+                 PAGE_SIZE words) that are not all zero, and for
+                 each its page number, relative to the previous
+                 one + 1, and its words
+   steps         one record per step, until end of file
+
+Every integer is a varint (7 bits per byte, low-order first,
+high bit set on all but the last byte); signed integers are
+zigzag-encoded first, so small negative numbers are small too.
+Each step record is
+
+   flags         bits 0..3 condition code after the step,
+                 4: instruction word follows, 5: register write
+                 follows, 6: memory writes follow, 7: post-increment
+                 follows
+   pc            signed, relative to the previous pc + 1, so
+                 straight-line code takes one byte
+   word          only if the word executed differs from the word
+                 the header and earlier memory writes put at pc
+   register      register number, then its new value relative
+                 to its old value (signed)
+   memory        count, then for each write the address relative
+                 to pc and the value (both signed)
+   increment     like register, for the src1 register of a
+                 post-increment LOAD or STORE (when it is not
+                 the register already written)
+
+Writes to memory-mapped output and reads of memory-mapped
+input go to their hooks, not to memory, so they are not traced.
+
+Usage:
+   python3 duck_machine.py --trace fact.trace programs/fact.obj
+   python3 tracefile.py fact.trace            # print the steps
+   python3 tracefile.py fact.trace --display  # replay in the view
+"""
+
+from instr_format import CondFlag, decode
+from memory import Memory, PagedMemory, MemoryWrite, PAGE_BITS, PAGE_SIZE
+from register import Register, ZeroRegister
+from mvc import MVCEvent, MVCListenable, MVCListener
+from cpu import CPU, CPUStep
+
+import argparse
+
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+MAGIC = b"DTRC"
+VERSION = 1
+
+# A replay of a larger memory than this is paged, so it takes
+# space only for the pages the trace touches
+FLAT_REPLAY_LIMIT = 1 << 16
+
+# Bits of the flags byte of each step
+COND_MASK = 0x0f
+HAS_WORD = 0x10
+HAS_REG = 0x20
+HAS_MEM = 0x40
+HAS_INC = 0x80
+
+
+class TraceFormatError(Exception):
+    """The file is not a well-formed trace"""
+    pass
+
+
+def zigzag(value: int) -> int:
+    """Signed to unsigned:  0, -1, 1, -2, ... become 0, 1, 2, 3, ..."""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if value & 1 == 0 else -((value + 1) >> 1)
+
+
+def put_varint(buf: bytearray, value: int) -> None:
+    """Append unsigned value to buf as a varint"""
+    while value >= 0x80:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def get_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """The varint starting at data[pos], and the position after it"""
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise TraceFormatError("Trace ends in the middle of a number")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class TraceStep(object):
+    """One step of a trace.  reg_write and inc_write (the
+    post-increment of src1) are (register, new value) or None;
+    mem_writes is a list of (address, value).
+    """
+
+    def __init__(self, pc: int, word: int, condition: CondFlag,
+                 reg_write: Optional[Tuple[int, int]],
+                 mem_writes: List[Tuple[int, int]],
+                 inc_write: Optional[Tuple[int, int]] = None) -> None:
+        self.pc = pc
+        self.word = word
+        self.condition = condition
+        self.reg_write = reg_write
+        self.mem_writes = mem_writes
+        self.inc_write = inc_write
+
+    def __str__(self):
+        effects = []
+        if self.inc_write is not None:
+            effects.append("r{}={}".format(*self.inc_write))
+        if self.reg_write is not None:
+            effects.append("r{}={}".format(*self.reg_write))
+        for addr, value in self.mem_writes:
+            effects.append("[{}]={}".format(addr, value))
+        return "{:5}: {:30} {:4} {}".format(
+            self.pc, str(decode(self.word)), str(self.condition), " ".join(effects))
+
+
+class TraceRecorder(MVCListener):
+    """Write a trace of everything cpu executes to file (opened
+    in binary mode) until close is called.  Register before
+    the CPU starts running, e.g.,
+
+        with open("run.trace", "wb") as f:
+            recorder = TraceRecorder(cpu, f)
+            cpu.run()
+            recorder.close()
+    """
+
+    def __init__(self, cpu: CPU, file: BinaryIO) -> None:
+        self.cpu = cpu
+        self.file = file
+        self.steps = 0
+        self._registers = [reg.get() for reg in cpu.registers]
+        # Words as the replay will see them (missing ones are
+        # zero), so each instruction word is written only if it
+        # isn't already known there
+        self._words = {}        # type: Dict[int, int]
+        self._prev_pc = -1
+        self._pending = None    # type: Tuple[int, int, int, int]
+        self._mem_writes = []   # type: List[Tuple[int, int]]
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        memory = cpu.memory
+        put_varint(header, memory.capacity)
+        for value in self._registers:
+            put_varint(header, zigzag(value))
+        # From a snapshot rather than peek, which would call
+        # input hooks.  Pages of zeros are left out.
+        pages = [(number, page) for number, page in memory.snapshot().numbered_pages()
+                 if any(page)]
+        put_varint(header, len(pages))
+        previous = -1
+        for number, page in pages:
+            put_varint(header, number - previous - 1)
+            previous = number
+            base = number << PAGE_BITS
+            for offset, value in enumerate(page):
+                if value:
+                    self._words[base + offset] = value
+                put_varint(header, zigzag(value))
+        file.write(header)
+        cpu.register_listener(self, CPUStep)
+        memory.register_listener(self, MemoryWrite)
+
+    def notify(self, event: MVCEvent) -> None:
+        if isinstance(event, CPUStep):
+            self._finish_step()
+            instr = event.instr
+            src1 = instr.reg_src1 if instr.increment else None
+            self._pending = (event.pc_addr, event.instr_word, instr.reg_target, src1)
+        elif self._pending is not None:
+            self._mem_writes.append((event.addr, event.value))
+
+    def _finish_step(self) -> None:
+        """Write the record of the step in progress, now that
+        its effects are known.
+        """
+        if self._pending is None:
+            return
+        pc, word, target, src1 = self._pending
+        record = bytearray(1)
+        flags = self.cpu.condition.value
+        put_varint(record, zigzag(pc - self._prev_pc - 1))
+        self._prev_pc = pc
+        if self._words.get(pc, 0) != word:
+            self._words[pc] = word
+            flags |= HAS_WORD
+            put_varint(record, zigzag(word))
+        # The program counter is implied by the next record
+        new_value = self.cpu.registers[target].get()
+        if target != 15 and new_value != self._registers[target]:
+            flags |= HAS_REG
+            record.append(target)
+            put_varint(record, zigzag(new_value - self._registers[target]))
+            self._registers[target] = new_value
+        if self._mem_writes:
+            flags |= HAS_MEM
+            put_varint(record, len(self._mem_writes))
+            for addr, value in self._mem_writes:
+                put_varint(record, zigzag(addr - pc))
+                put_varint(record, zigzag(value))
+                self._words[addr] = value
+            self._mem_writes = []
+        if src1 is not None and src1 != 15:
+            new_value = self.cpu.registers[src1].get()
+            if new_value != self._registers[src1]:
+                flags |= HAS_INC
+                record.append(src1)
+                put_varint(record, zigzag(new_value - self._registers[src1]))
+                self._registers[src1] = new_value
+        record[0] = flags
+        self.file.write(record)
+        self.steps += 1
+        self._pending = None
+
+    def close(self) -> None:
+        """Write the last step and stop listening.  The file is
+        flushed but left open.
+        """
+        self._finish_step()
+        self.cpu.unregister_listener(self)
+        self.cpu.memory.unregister_listener(self)
+        self.file.flush()
+
+
+class TraceReader(object):
+    """Read a trace file:  initial state, then steps"""
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._data = file.read()
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise TraceFormatError("Not a Duck Machine trace")
+        if self._data[len(MAGIC)] != VERSION:
+            raise TraceFormatError("Unsupported trace version {}".format(self._data[len(MAGIC)]))
+        pos = len(MAGIC) + 1
+        self.capacity, pos = get_varint(self._data, pos)
+        self.registers = []
+        for _ in range(16):
+            value, pos = get_varint(self._data, pos)
+            self.registers.append(unzigzag(value))
+        # Initial contents of the pages that are not all zero
+        self.pages = {}         # type: Dict[int, List[int]]
+        count, pos = get_varint(self._data, pos)
+        number = -1
+        for _ in range(count):
+            skip, pos = get_varint(self._data, pos)
+            number += skip + 1
+            size = min(PAGE_SIZE, self.capacity - (number << PAGE_BITS))
+            if size <= 0:
+                raise TraceFormatError("Page {} is beyond the end of memory".format(number))
+            page = []
+            for _ in range(size):
+                value, pos = get_varint(self._data, pos)
+                page.append(unzigzag(value))
+            self.pages[number] = page
+        self._steps_start = pos
+
+    def steps(self) -> Iterator[TraceStep]:
+        data = self._data
+        pos = self._steps_start
+        registers = list(self.registers)
+        words = {}
+        for number, page in self.pages.items():
+            base = number << PAGE_BITS
+            for offset, value in enumerate(page):
+                if value:
+                    words[base + offset] = value
+        pc = -1
+        while pos < len(data):
+            flags = data[pos]
+            pos += 1
+            delta, pos = get_varint(data, pos)
+            pc = pc + 1 + unzigzag(delta)
+            if flags & HAS_WORD:
+                word, pos = get_varint(data, pos)
+                words[pc] = unzigzag(word)
+            reg_write = None
+            if flags & HAS_REG:
+                target = data[pos]
+                delta, pos = get_varint(data, pos + 1)
+                registers[target] += unzigzag(delta)
+                reg_write = (target, registers[target])
+            mem_writes = []
+            if flags & HAS_MEM:
+                count, pos = get_varint(data, pos)
+                for _ in range(count):
+                    offset, pos = get_varint(data, pos)
+                    value, pos = get_varint(data, pos)
+                    addr = pc + unzigzag(offset)
+                    mem_writes.append((addr, unzigzag(value)))
+                    words[addr] = unzigzag(value)
+            inc_write = None
+            if flags & HAS_INC:
+                src1 = data[pos]
+                delta, pos = get_varint(data, pos + 1)
+                registers[src1] += unzigzag(delta)
+                inc_write = (src1, registers[src1])
+            yield TraceStep(pc, words.get(pc, 0), CondFlag(flags & COND_MASK),
+                            reg_write, mem_writes, inc_write)
+
+
+class TraceReplay(MVCListenable):
+    """Stands in for a CPU, stepping through a recorded trace
+    instead of executing.  Listeners (e.g., view.MachineStateView)
+    get the same CPUStep and memory events they would from the CPU,
+    except that memory reads are not replayed.
+    """
+
+    def __init__(self, reader: TraceReader) -> None:
+        super().__init__()
+        if reader.capacity > FLAT_REPLAY_LIMIT:
+            self.memory = PagedMemory(reader.capacity)
+        else:
+            self.memory = Memory(reader.capacity)
+        for number, page in reader.pages.items():
+            self.memory.load_words(page, number << PAGE_BITS)
+        self.registers = [ZeroRegister()] + [Register() for _ in range(15)]
+        for reg, value in zip(self.registers, reader.registers):
+            reg.put(value)
+        self.pc = self.registers[15]
+        self.condition = CondFlag.ALWAYS
+        self.step_count = 0
+        self._steps = reader.steps()
+        self.halted = False
+
+    def step(self) -> Optional[TraceStep]:
+        """Replay the next step; None at the end of the trace"""
+        step = next(self._steps, None)
+        if step is None:
+            self.halted = True
+            return None
+        self.pc.put(step.pc)
+        if self.subscribers[CPUStep]:
+            self.notify_all(CPUStep(self, step.pc, step.word, decode(step.word)))
+        if step.inc_write is not None:
+            src1, value = step.inc_write
+            self.registers[src1].put(value)
+        if step.reg_write is not None:
+            target, value = step.reg_write
+            self.registers[target].put(value)
+        for addr, value in step.mem_writes:
+            self.memory.put(addr, value)
+        self.condition = step.condition
+        self.step_count += 1
+        return step
+
+
+def cli() -> object:
+    """Get arguments from command line"""
+    parser = argparse.ArgumentParser(description="Duck Machine trace replay")
+    parser.add_argument("tracefile", type=argparse.FileType('rb'),
+                        help="Trace recorded with duck_machine.py --trace")
+    parser.add_argument("-d", "--display", action="store_true",
+                        help="Replay in the graphical display")
+    parser.add_argument("-s", "--step", action="store_true",
+                        help="Wait for enter after each step")
+    return parser.parse_args()
+
+
+def main():
+    args = cli()
+    replay = TraceReplay(TraceReader(args.tracefile))
+    if args.display:
+        # Imported only when needed, because it opens a window
+        import view
+        view.MachineStateView(replay, 1500, 1000)
+    while True:
+        step = replay.step()
+        if step is None:
+            break
+        if not args.display:
+            print(step)
+        if args.step:
+            input("Step {}; press enter".format(replay.step_count))
+    print("{} steps".format(replay.step_count))
+    if args.display:
+        input("Press enter to end")
+
+
+if __name__ == "__main__":
+    main()
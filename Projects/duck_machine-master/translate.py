@@ -0,0 +1,395 @@
+"""
+Block-translating execution engine for the Duck Machine DM2018S.
+
+Instead of decoding and interpreting one instruction at a
+time, TranslatingCPU splits the program in memory into basic
+blocks (straight-line runs of instructions) and translates each
+block into Python source code for a function that performs the
+whole block.  The function is compiled once, the first time
+execution reaches the block, and a dispatcher loop then runs
+blocks until the program halts.
+
+A block ends at an instruction that writes the program counter
+(r15), at a predicated instruction (anything but /ALWAYS), at
+HALT, or at an address that cannot be translated (out of bounds,
+memory-mapped input, or not a valid instruction).  A store into
+a translated block discards the translation, so self-modifying
+code behaves just as it does in the interpreter.
+
+Compiling a block costs far more than interpreting it once, so
+a short run of a program never seen before is slower translated
+than interpreted; translation pays off in loops.  The compiled
+code is kept (by address, with the words it was translated from)
+for the rest of the process, so running the same program again,
+even in a new TranslatingCPU, compiles nothing.
+
+The translated code must leave the machine in exactly the state
+CPU.run would, including condition codes and the memory-mapped
+I/O hooks.  Inside a translated function the machine state is a
+plain list R:  R[0..15] are the register values, R[16] is the
+condition code as an int (the value of a CondFlag), and R[17] counts
+executed steps.
+"""
+
+from instr_format import OpCode, CondFlag, decode
+from memory import MemoryWrite, MemoryLoaded, wrap_word
+from mvc import MVCEvent, MVCListener
+from cpu import (CPU, TIME_CHECK_INTERVAL, StepLimitExceeded,
+                 TimeLimitExceeded, InfiniteLoop)
+
+from types import CodeType
+from typing import Callable, Dict, List, Optional, Tuple
+
+import sys
+import time
+
+import logging
+
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Longest block we will translate; longer straight-line
+# code is simply split into several blocks
+MAX_BLOCK_LEN = 64
+
+# Compiled code of every block translated so far, by starting
+# address and wrap mode, with the words it was translated from.
+# Running the same program again (in a new TranslatingCPU, say)
+# reuses the code instead of compiling it again.
+_compiled = {}   # type: Dict[Tuple[int, bool], Tuple[Tuple[int, ...], CodeType]]
+
+
+def clear_translations() -> None:
+    """Forget all compiled code, e.g., to measure a first run"""
+    _compiled.clear()
+
+# Slots in the state list beyond the 16 registers
+COND = 16
+STEPS = 17
+
+# Python expressions for ALU operations we translate inline.
+# Other operations are translated into a call on the ALU itself,
+# so they can't diverge from the interpreter.
+INLINE_OPS = {
+    OpCode.ADD: "{left} + {right}",
+    OpCode.SUB: "{left} - {right}",
+    OpCode.MUL: "{left} * {right}",
+    OpCode.AND: "{left} & {right}",
+    OpCode.OR: "{left} | {right}",
+    OpCode.XOR: "{left} ^ {right}",
+    OpCode.SHL: "{left} << ({right} & 31)",
+    OpCode.SHR: "{left} >> ({right} & 31)",
+    OpCode.CMP: "{left} - {right}",
+    OpCode.LOAD: "{left} + {right}",
+    OpCode.STORE: "{left} + {right}",
+}
+
+# The condition code of the result held in x, as ALU.exec computes it
+CC_EXPR = "R[{}] = {} if x < 0 else {} if x == 0 else {}".format(
+    COND, CondFlag.M.value, CondFlag.Z.value, CondFlag.P.value)
+
+
+class BlockCache(MVCListener):
+    """Translated blocks by starting address.  Listens to memory
+    and discards any block containing an address that is written.
+    """
+
+    def __init__(self, memory) -> None:
+        self.blocks = {}       # type: Dict[int, Callable[[List[int]], int]]
+        self._covering = {}    # type: Dict[int, List[int]]
+        memory.register_listener(self, MemoryWrite, MemoryLoaded)
+
+    def add(self, start: int, end: int, fn: Callable[[List[int]], int]) -> None:
+        """Remember the translation of addresses start..end-1"""
+        self.blocks[start] = fn
+        for addr in range(start, end):
+            self._covering.setdefault(addr, []).append(start)
+
+    def clear(self) -> None:
+        self.blocks.clear()
+        self._covering.clear()
+
+    def notify(self, event: MVCEvent) -> None:
+        if isinstance(event, MemoryLoaded):
+            if len(event.words) >= len(self._covering):
+                self.clear()
+            else:
+                for addr in range(event.addr, event.addr + len(event.words)):
+                    self._discard(addr)
+        else:
+            self._discard(event.addr)
+
+    def _discard(self, addr: int) -> None:
+        """Forget every block containing addr"""
+        for start in self._covering.pop(addr, []):
+            self.blocks.pop(start, None)
+
+
+class TranslatingCPU(CPU):
+    """A Duck Machine CPU that executes translated basic blocks.
+    Unless something wants CPUStep or MemoryRead events, run uses
+    translated blocks; otherwise (or in single-step mode) it
+    interprets one instruction at a time like CPU.run, so that
+    listeners see every event.
+    """
+
+    def __init__(self, memory, wrap: bool = False):
+        super().__init__(memory, wrap=wrap)
+        self.block_cache = BlockCache(memory)
+
+    def run(self, from_addr=0, single_step=False, max_steps: int = None,
+            time_limit: float = None, detect_loops: bool = False) -> None:
+        """Dispatch loop: run translated blocks until HALT.
+        Limits are as for CPU.run.  Within MAX_BLOCK_LEN steps of
+        max_steps we interpret one instruction at a time, so the
+        step limit is exact.
+        """
+        if single_step or not self._unobserved():
+            super().run(from_addr, single_step, max_steps=max_steps,
+                        time_limit=time_limit, detect_loops=detect_loops)
+            return
+        blocks = self.block_cache.blocks
+        # One bound method, so we can tell when a step was interpreted
+        interpret = self._interpret_one
+        R = [reg.get() for reg in self.registers]
+        R.append(self.condition.value)
+        R.append(0)
+        pc = from_addr
+        self.halted = False
+        limit = sys.maxsize if max_steps is None else max_steps
+        careful = max(0, limit - MAX_BLOCK_LEN)
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        next_check = careful if deadline is None else min(careful, TIME_CHECK_INTERVAL)
+        stopped = None
+        stuck = None
+        try:
+            while pc is not None:
+                R[15] = pc
+                steps = R[STEPS]
+                if steps >= next_check:
+                    if steps >= limit:
+                        stopped = StepLimitExceeded("No HALT after {} steps".format(max_steps))
+                        break
+                    if deadline is not None and time.monotonic() > deadline:
+                        stopped = TimeLimitExceeded("No HALT after {} seconds".format(time_limit))
+                        break
+                    if steps >= careful:
+                        next_check = steps + 1
+                    else:
+                        next_check = min(careful, steps + TIME_CHECK_INTERVAL)
+                if steps >= careful:
+                    block = interpret
+                else:
+                    block = blocks.get(pc)
+                    if block is None:
+                        block = self._translate(pc) or interpret
+                start = pc
+                try:
+                    pc = block(R)
+                except Exception:
+                    # A load or store faulted (a bad address, or a
+                    # device raised) partway through the block.  It
+                    # has already stepped R[15] past the faulting
+                    # instruction, so the steps before it are the
+                    # ones CPU.run would have counted.
+                    if block is not interpret:
+                        R[STEPS] += R[15] - 1 - start
+                    raise
+                if detect_loops:
+                    # Like CPU.run, only a single instruction jumping
+                    # to itself twice with nothing changed is stuck
+                    if pc == start and R[STEPS] == steps + 1:
+                        state = tuple(R[:15]) + (R[COND],)
+                        if state == stuck:
+                            stopped = InfiniteLoop("Jump to self at {}".format(pc))
+                            R[15] = pc
+                            break
+                        stuck = state
+                    else:
+                        stuck = None
+        finally:
+            for reg, value in zip(self.registers, R):
+                reg.put(value)
+            self.condition = CondFlag(R[COND])
+            self.step_count = R[STEPS]
+            self.halted = pc is None
+        if stopped is not None:
+            stopped.state = self.machine_state()
+            raise stopped
+
+    def _translate(self, start: int) -> Optional[Callable[[List[int]], int]]:
+        """Compile the block starting at start and cache it, or
+        None if even its first instruction can't be translated
+        """
+        key = (start, self.wrap)
+        saved = _compiled.get(key)
+        if saved is not None and self._unchanged(start, saved[0]):
+            words, code = saved
+        else:
+            instrs = self._block_instructions(start)
+            if not instrs:
+                return None
+            source = self._block_source(start, instrs)
+            log.debug("Translated block at {}:\n{}".format(start, source))
+            words = tuple(self.memory.peek(addr) for addr in range(start, start + len(instrs)))
+            code = compile(source, "<duck block {}>".format(start), "exec")
+            _compiled[key] = (words, code)
+        load, store = self._data_ports()
+        namespace = {"load": load,
+                     "store": store,
+                     "alu": self.alu.exec_int,
+                     "wrap": wrap_word}
+        exec(code, namespace)
+        fn = namespace["block"]
+        self.block_cache.add(start, start + len(words), fn)
+        return fn
+
+    def _unchanged(self, start: int, words: tuple) -> bool:
+        """Memory from start holds the words of a block compiled
+        before (perhaps for another CPU), and none of them is
+        memory-mapped input, so its code can be used again
+        """
+        end = start + len(words)
+        if end > self.memory.capacity:
+            return False
+        hooked = getattr(self.memory, "hooks_read", {})
+        peek = self.memory.peek
+        return all(addr not in hooked and peek(addr) == word
+                   for addr, word in zip(range(start, end), words))
+
+    def _block_instructions(self, start: int) -> list:
+        """Decoded instructions of the basic block starting at
+        start.  Empty if even the first instruction can't be
+        translated.
+        """
+        hooked = getattr(self.memory, "hooks_read", {})
+        instrs = []
+        addr = start
+        while len(instrs) < MAX_BLOCK_LEN:
+            if addr < 0 or addr >= self.memory.capacity or addr in hooked:
+                break
+            try:
+                instr = decode(self.memory.peek(addr))
+            except ValueError:
+                break
+            instrs.append(instr)
+            addr += 1
+            if (instr.cond is not CondFlag.ALWAYS
+                    or instr.op is OpCode.HALT
+                    or (instr.reg_target == 15
+                        and instr.op not in (OpCode.STORE, OpCode.CMP))):
+                break
+        return instrs
+
+    def _block_source(self, start: int, instrs: list) -> str:
+        """Python source for a function performing the block"""
+        end = start + len(instrs)
+        lines = ["def block(R):"]
+        for addr in range(start, end):
+            instr = instrs[addr - start]
+            last = addr == end - 1
+            if instr.cond is CondFlag.ALWAYS:
+                lines.extend("    " + line for line in
+                             self._instr_source(addr, instr, start, end))
+            else:
+                lines.append("    if R[{}] & {}:".format(COND, instr.cond.value))
+                lines.extend("        " + line for line in
+                             self._instr_source(addr, instr, start, end))
+            if last:
+                lines.append("    R[{}] += {}".format(STEPS, len(instrs)))
+                lines.append("    return {}".format(addr + 1))
+        return "\n".join(lines) + "\n"
+
+    def _instr_source(self, addr: int, instr, start: int, end: int) -> list:
+        """Python statements for one instruction at addr.  The
+        condition code is updated after every instruction, as
+        the interpreter does, because the next block may test it.
+        """
+        executed = addr - start + 1
+        left = self._operand(instr.reg_src1, addr)
+        right = self._operand(instr.reg_src2, addr)
+        if instr.offset:
+            right = "{} + {}".format(right, instr.offset) if right != "0" else str(instr.offset)
+        op = instr.op
+        target = instr.reg_target
+        lines = []
+        # In 32-bit mode only the ALU knows when to wrap
+        if op in INLINE_OPS and not self.wrap:
+            lines.append("x = " + INLINE_OPS[op].format(left=left, right="(" + right + ")"))
+            lines.append(CC_EXPR)
+        else:
+            lines.append("x, R[{}] = alu({}, {}, {})  # {}".format(
+                COND, op.value, left, right, op.name))
+        # Like the interpreter, the program counter has stepped
+        # by the time memory is accessed or a result is stored
+        if op is OpCode.LOAD:
+            lines.append("R[15] = {}".format(addr + 1))
+            lines.append("x = load(x)")
+            lines.extend(self._increment_source(instr))
+        elif op is OpCode.STORE:
+            value = str(addr + 1) if target == 15 else self._operand(target, addr)
+            lines.append("R[15] = {}".format(addr + 1))
+            lines.append("store(x, {})".format(value))
+            lines.extend(self._increment_source(instr))
+            # Storing into this block ends it; the rest is retranslated
+            if end - start > 1 and addr < end - 1:
+                lines.append("if {} <= x < {}:".format(start, end))
+                lines.append("    R[{}] += {}".format(STEPS, executed))
+                lines.append("    return {}".format(addr + 1))
+            return lines
+        elif op is OpCode.HALT:
+            lines.append("R[15] = {}".format(addr + 1))
+            lines.append("R[{}] += {}".format(STEPS, executed))
+            lines.append("return None")
+            return lines
+        elif op is OpCode.CMP:
+            return lines
+        if target == 15:
+            lines.append("R[{}] += {}".format(STEPS, executed))
+            lines.append("return x")
+        elif target != 0:
+            lines.append("R[{}] = x".format(target))
+        return lines
+
+    def _increment_source(self, instr) -> list:
+        """Statements to post-increment src1 of a LOAD or STORE,
+        if it does (r0 can't change, and r15 has already stepped)
+        """
+        reg = instr.reg_src1
+        if not instr.increment or reg in (0, 15):
+            return []
+        if self.wrap:
+            return ["R[{0}] = wrap(R[{0}] + 1)".format(reg)]
+        return ["R[{0}] += 1".format(reg)]
+
+    @staticmethod
+    def _operand(reg: int, addr: int) -> str:
+        """Expression for reading register reg in the instruction
+        at addr.  r0 is always zero, and r15 holds the address of
+        the instruction being executed, so both are constants.
+        """
+        if reg == 0:
+            return "0"
+        if reg == 15:
+            return str(addr)
+        return "R[{}]".format(reg)
+
+    def _interpret_one(self, R: List[int]) -> int:
+        """Execute one instruction with the interpreter, for
+        addresses we won't translate.  Returns the new program
+        counter, or None if the CPU halted.
+        """
+        for reg, value in zip(self.registers, R):
+            reg.put(value)
+        self.condition = CondFlag(R[COND])
+        try:
+            self.step()
+            R[STEPS] += 1
+        finally:
+            for i in range(16):
+                R[i] = self.registers[i].get()
+            R[COND] = self.condition.value
+        if self.halted:
+            return None
+        return R[15]
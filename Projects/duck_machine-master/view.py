@@ -1,14 +1,24 @@
 """
 Graphical display of the duck machine state. 
+
+By default the display is redrawn after every event, so
+the CPU runs only as fast as Tk can repaint.  With a frame
+rate (fps), the view instead notes which registers and memory
+cells have changed and repaints them all together, at most
+fps times a second, while the CPU runs on between frames.
 """
 
 from mvc import MVCEvent
 from cpu import CPU, CPUStep
-from memory import MemoryEvent, MemoryRead, MemoryWrite
+from memory import MemoryEvent, MemoryRead, MemoryWrite, MemoryLoaded
 
 import graphics.graphics
 from graphics.graphics import Rectangle, Point, Text
 
+import time
+
+from typing import Dict, Tuple
+
 import logging
 
 logging.basicConfig()
@@ -20,15 +30,28 @@ class MachineStateView(object):
     """View of the CPU and memory state"""
 
     def __init__(self, model: CPU,
-                 width: int, height: int):
-        """Create a view width x height"""
+                 width: int, height: int, fps: float = None):
+        """Create a view width x height.  If fps is given,
+        repaint at most fps times per second.
+        """
+        if fps is not None and fps <= 0:
+            raise ValueError("fps must be positive, not {}".format(fps))
         self.width = width
         self.height = height
         self.model = model
         model.register_listener(self)
         model.memory.register_listener(self)
 
-        self.window = graphics.graphics.GraphWin("Duck Machine", width, height)
+        # Throttled mode:  changes waiting for the next frame
+        self.frame_interval = None if fps is None else 1.0 / fps
+        self._next_frame = 0.0
+        self._pending_step = None        # type: CPUStep
+        self._pending_cells = {}         # type: Dict[int, Tuple[str, int]]
+        self._shown_registers = [None] * 16
+        self.frames = 0
+
+        self.window = graphics.graphics.GraphWin("Duck Machine", width, height,
+                                                 autoflush=fps is None)
 
         # CPU in left 1/3 of window
         cpu_region = Rectangle(Point(5, 5),
@@ -131,11 +154,55 @@ class MachineStateView(object):
 
     def notify(self, event: MVCEvent):
         """Something to depict"""
-        if isinstance(event, CPUStep):
+        if isinstance(event, MemoryLoaded):
+            # Depict as writes, for the cells we show
+            shown = max(0, min(len(event.words), len(self.mem_cells) - event.addr))
+            for offset in range(shown):
+                self.notify(MemoryWrite(event.subject, event.addr + offset, event.words[offset]))
+        elif self.frame_interval is not None:
+            self._note(event)
+        elif isinstance(event, CPUStep):
             self._cpu_step(event)
         elif isinstance(event, MemoryEvent):
             self._memory_event(event)
 
+    def _note(self, event: MVCEvent):
+        """Throttled mode:  remember the latest change to each
+        item, and repaint if a frame is due.
+        """
+        if isinstance(event, CPUStep):
+            self._pending_step = event
+            now = time.perf_counter()
+            if now >= self._next_frame:
+                self.repaint()
+                self._next_frame = now + self.frame_interval
+        elif isinstance(event, MemoryEvent) and event.addr < len(self.mem_cells):
+            color = "#DDFFDD" if isinstance(event, MemoryRead) else "#DDDDFF"
+            self._pending_cells[event.addr] = (color, event.value)
+
+    def repaint(self):
+        """Draw every change noted since the last frame, and let
+        Tk update the window once.  Call when the run ends, to
+        show the final state.
+        """
+        step = self._pending_step
+        if step is not None:
+            self.instr_raw.setText(str(step.instr_word))
+            self.instr_decoded.setText(str(step.instr))
+            self._pending_step = None
+        for reg_index in range(16):
+            reg_value = self.model.registers[reg_index].get()
+            if reg_value != self._shown_registers[reg_index]:
+                self.registers[reg_index].label.setText(str(reg_value))
+                self._shown_registers[reg_index] = reg_value
+        for address, (color, value) in self._pending_cells.items():
+            cell_display = self.mem_cells[address]
+            cell_display.setFill(color)
+            cell_display.label.setText(str(value))
+        self._pending_cells.clear()
+        self.frames += 1
+        graphics.graphics.update()
+
     def _cpu_step(self, event: CPUStep):
         self.instr_raw.setText(str(event.instr_word))
         self.instr_decoded.setText(str(event.instr))